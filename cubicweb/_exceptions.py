@@ -87,6 +87,12 @@ class UnknownEid(RepositoryError):
     msg = 'No entity with eid %s in the repository'
 
 
+class NoCnxSetAvailable(RepositoryError):
+    """raised when no connections set could be acquired from the repository's
+    pool in time
+    """
+
+
 class UniqueTogetherError(RepositoryError):
     """raised when a unique_together constraint caused an IntegrityError"""
 
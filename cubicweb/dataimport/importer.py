@@ -27,7 +27,7 @@ Utilities:
 .. autofunction:: cubicweb.dataimport.importer.use_extid_as_cwuri
 """
 
-from collections import defaultdict
+from collections import Counter, defaultdict, deque
 import logging
 
 from logilab.mtconverter import xml_escape
@@ -233,9 +233,10 @@ class ExtEntity(object):
                         deferred.append((target_extid, rtype, self.extid))
         return deferred
 
-    def is_ready(self, extid2eid):
-        """Return True if the ext entity is ready, i.e. has all the URIs used in inlined relations
-        currently existing.
+    def waits_for(self, extid2eid):
+        """Return one of the URIs used in inlined relations which is not existing yet, or None if
+        the ext entity is ready. This should not be called anymore once :meth:`is_ready` returned
+        True.
         """
         assert self._schema, 'prepare() method should be called first on %s' % self
         # as .prepare has been called, we know that .values only contains subject relation *type* as
@@ -248,7 +249,17 @@ class ExtEntity(object):
                 # .prepare() should drop other cases from the entity dict
                 assert rschema.inlined
                 if entity_dict[rtype] not in extid2eid:
-                    return False
+                    return entity_dict[rtype]
+        return None
+
+    def is_ready(self, extid2eid):
+        """Return True if the ext entity is ready, i.e. has all the URIs used in inlined relations
+        currently existing.
+        """
+        if self.waits_for(extid2eid) is not None:
+            return False
+        schema = self._schema
+        entity_dict = self.values
         # entity is ready, replace all relation's extid by eids
         for rtype in entity_dict:
             rschema = schema.rschema(rtype)
@@ -287,8 +298,8 @@ class ExtEntitiesImporter(object):
         on existing relations of a given type. You may want to use :class:`RelationMapping` to build
         it.
 
-    :param etypes_order_hint: optional ordered iterable on entity types, giving an hint on the
-        order in which they should be attempted to be imported
+    :param etypes_order_hint: not used anymore, entities being imported as soon as entities
+        they are linked to through inlined relations have been imported
 
     :param import_log: optional object implementing the :class:`SimpleImportLog` interface to
         record events occuring during the import
@@ -319,6 +330,9 @@ class ExtEntitiesImporter(object):
         # set of created/updated eids
         self.created = set()
         self.updated = set()
+        # scheduling counters: number of ext entities read from the stream, of readiness checks and
+        # of ext entities which had to wait for another one
+        self.counters = Counter()
 
     def import_entities(self, ext_entities):
         """Import given external entities (:class:`ExtEntity`) stream (usually a generator)."""
@@ -328,6 +342,9 @@ class ExtEntitiesImporter(object):
         deferred = self._import_entities(ext_entities, queue)
         # create deferred relations that don't exist already
         missing_relations = self.prepare_insert_deferred_relations(deferred)
+        self.import_log.record_debug(
+            '%(entities)s entities read, %(checks)s readiness checks, %(queued)s entities queued'
+            % self.counters)
         self._warn_about_missing_work(queue, missing_relations)
 
     def _import_entities(self, ext_entities, queue):
@@ -347,43 +364,39 @@ class ExtEntitiesImporter(object):
     def iter_ext_entities(self, ext_entities, deferred, queue):
         """Yield external entities in an order which attempts to satisfy
         schema constraints (inlined / cardinality) and to optimize the import.
+
+        External entities which can't be imported yet because of some inlined relation are kept
+        aside until the entity they are waiting for has been imported. Those remaining at the end
+        are put in the `queue` dictionary, grouped by entity type.
         """
         schema = self.schema
         extid2eid = self.extid2eid
-        order_hint = list(self.etypes_order_hint)
+        counters = self.counters
+        # {extid: [ext entities waiting for the entity with this extid to be imported]}
+        waiting = {}
+        ready = deque()
         for ext_entity in ext_entities:
+            counters['entities'] += 1
             # check data in the transitional representation and prepare it for
             # later insertion in the database
             for subject_uri, rtype, object_uri in ext_entity.prepare(schema):
                 deferred.setdefault(rtype, set()).add((subject_uri, object_uri))
-            if not ext_entity.is_ready(extid2eid):
+            ready.append(ext_entity)
+            while ready:
+                ext_entity = ready.popleft()
+                counters['checks'] += 1
+                missing = ext_entity.waits_for(extid2eid)
+                if missing is not None:
+                    counters['queued'] += 1
+                    waiting.setdefault(missing, []).append(ext_entity)
+                    continue
+                ext_entity.is_ready(extid2eid)
+                yield ext_entity
+                # the entity has been imported, check entities waiting for it
+                ready.extend(waiting.pop(ext_entity.extid, ()))
+        for ext_entities in waiting.values():
+            for ext_entity in ext_entities:
                 queue.setdefault(ext_entity.etype, []).append(ext_entity)
-                continue
-            yield ext_entity
-            if not queue:
-                continue
-            # check for some entities in the queue that may now be ready. We'll have to restart
-            # search for ready entities until no one is generated
-            for etype in queue:
-                if etype not in order_hint:
-                    order_hint.append(etype)
-            new = True
-            while new:
-                new = False
-                for etype in order_hint:
-                    if etype in queue:
-                        new_queue = []
-                        for ext_entity in queue[etype]:
-                            if ext_entity.is_ready(extid2eid):
-                                yield ext_entity
-                                # may unlock entity previously handled within this loop
-                                new = True
-                            else:
-                                new_queue.append(ext_entity)
-                        if new_queue:
-                            queue[etype][:] = new_queue
-                        else:
-                            del queue[etype]
 
     def prepare_insert_entity(self, ext_entity):
         """Call the store to prepare insertion of the given external entity"""
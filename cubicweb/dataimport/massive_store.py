@@ -18,8 +18,14 @@
 # with CubicWeb.  If not, see <http://www.gnu.org/licenses/>.
 
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from itertools import chain
 import logging
+import multiprocessing
+import queue
+import threading
+import traceback
 from uuid import uuid4
 
 from cubicweb.dataimport import stores, pgstore
@@ -56,25 +62,46 @@ class MassiveObjectStore(stores.RQLObjectStore):
 
     Full-text indexation is not handled, you'll have to reindex the proper entity types by yourself
     if desired.
+
+    When merging temporary tables, existing entities and relations are skipped according to one
+    of the following strategies:
+
+    - 'not-exists' (the default), using `NOT EXISTS` subqueries for each inserted row,
+
+    - 'anti-join', deduplicating temporary tables and using set based anti-joins against the target
+      tables (or `ON CONFLICT DO NOTHING` for the `entities` table, whose primary key is kept). New
+      entities are computed once for all metadata relations. Statistics of temporary tables are
+      collected before merging them, so that the planner may choose a hash anti-join.
     """
+    merge_strategies = ('not-exists', 'anti-join')
 
-    def __init__(self, cnx, slave_mode=False, eids_seq_range=10000, metagen=None):
+    def __init__(self, cnx, slave_mode=False, eids_seq_range=10000, metagen=None,
+                 merge_strategy='not-exists', binary_copy=False):
         """Create a MassiveObject store, with the following arguments:
 
         - `cnx`, a connection to the repository
         - `metagen`, optional :class:`MetadataGenerator` instance
         - `eids_seq_range`: size of eid range reserved by the store for each batch
+        - `merge_strategy`: 'not-exists' or 'anti-join', strategy used to skip existing entities
+          and relations when merging temporary tables
+        - `binary_copy`: if True, use binary format to copy data to temporary tables when all
+          columns types support it (i.e. no Decimal nor TZTime attribute), which saves
+          formatting of numbers and dates and allows to import Bytes attributes
         """
         super(MassiveObjectStore, self).__init__(cnx)
+        assert merge_strategy in self.merge_strategies, merge_strategy
 
         self.uuid = str(uuid4()).replace('-', '')
         self.slave_mode = slave_mode
+        self.merge_strategy = merge_strategy
+        self.binary_copy = binary_copy
         if metagen is None:
             metagen = stores.MetadataGenerator(cnx)
         self.metagen = metagen
 
         self.logger = logging.getLogger('dataimport.massive_store')
-        self.sql = cnx.system_sql
+        # connection bound to the current thread, if any (see `_own_connection`)
+        self._local = threading.local()
         self.schema = cnx.vreg.schema
         self.default_values = get_default_values(self.schema)
         self.get_next_eid = lambda g=self._get_eid_gen(eids_seq_range): next(g)
@@ -84,6 +111,8 @@ class MassiveObjectStore(stores.RQLObjectStore):
         self._data_entities = defaultdict(list)
         self._data_relations = defaultdict(list)
         self._initialized = {}
+        # {etype: sql types of the temporary table columns}
+        self._sqltypes = {}
 
     def _get_eid_gen(self, eids_seq_range):
         """ Function getting the next eid. This is done by preselecting
@@ -94,6 +123,41 @@ class MassiveObjectStore(stores.RQLObjectStore):
             for eid in range(last_eid - eids_seq_range + 1, last_eid + 1):
                 yield eid
 
+    def sql(self, sql, args=None):
+        """Execute `sql` on the connection bound to the current thread if any, else through the
+        repository connection, and return the cursor.
+        """
+        cursor = getattr(self._local, 'cursor', None)
+        if cursor is None:
+            return self._cnx.system_sql(sql, args)
+        cursor.execute(sql, args)
+        return cursor
+
+    def _cursor(self):
+        """Return the cursor to be used for COPY FROM statements."""
+        cursor = getattr(self._local, 'cursor', None)
+        if cursor is None:
+            cursor = self._cnx.cnxset.cu
+        return cursor
+
+    @contextmanager
+    def _own_connection(self):
+        """Context manager binding a new database connection to the current thread, so that
+        queries issued through :meth:`sql` are executed in a separated transaction, committed
+        on exit.
+        """
+        dbcnx = self._cnx.repo.system_source.get_connection()
+        self._local.cursor = dbcnx.cursor()
+        try:
+            yield dbcnx
+            dbcnx.commit()
+        except Exception:
+            dbcnx.rollback()
+            raise
+        finally:
+            del self._local.cursor
+            dbcnx.close()
+
     # master/slaves specific API
 
     def master_init(self, commit=True):
@@ -141,15 +205,7 @@ class MassiveObjectStore(stores.RQLObjectStore):
         if etype not in self._initialized:
             if not self.slave_mode:
                 self.master_init(commit=False)
-            tablename = 'cw_%s' % etype.lower()
-            tmp_tablename = '%s_%s' % (tablename, self.uuid)
-            self.sql("INSERT INTO cwmassive_initialized VALUES (%(e)s, 'etype', %(uuid)s)",
-                     {'e': etype, 'uuid': self.uuid})
-            attr_defs = eschema_sql_def(self._source_dbhelper, self.schema[etype])
-            self.sql('CREATE TABLE %s(%s);' % (tmp_tablename,
-                                               ', '.join('cw_%s %s' % (column, sqltype)
-                                                         for column, sqltype in attr_defs)))
-            self._initialized[etype] = [attr for attr, _ in attr_defs]
+            self._init_etype(etype)
 
         if 'eid' not in data:
             # If eid is not given and the eids sequence is set, use the value from the sequence
@@ -167,15 +223,32 @@ class MassiveObjectStore(stores.RQLObjectStore):
         if rtype not in self._initialized:
             if not self.slave_mode:
                 self.master_init(commit=False)
-            assert not self._cnx.vreg.schema.rschema(rtype).inlined
-            self._initialized[rtype] = None
-            tablename = '%s_relation' % rtype.lower()
-            tmp_tablename = '%s_%s' % (tablename, self.uuid)
-            self.sql("INSERT INTO cwmassive_initialized VALUES (%(r)s, 'rtype', %(uuid)s)",
-                     {'r': rtype, 'uuid': self.uuid})
-            self.sql('CREATE TABLE %s(eid_from integer, eid_to integer)' % tmp_tablename)
+            self._init_rtype(rtype)
         self._data_relations[rtype].append({'eid_from': eid_from, 'eid_to': eid_to})
 
+    def _init_etype(self, etype):
+        """Create the temporary table of this store for entities of type `etype`."""
+        tablename = 'cw_%s' % etype.lower()
+        tmp_tablename = '%s_%s' % (tablename, self.uuid)
+        self.sql("INSERT INTO cwmassive_initialized VALUES (%(e)s, 'etype', %(uuid)s)",
+                 {'e': etype, 'uuid': self.uuid})
+        attr_defs = eschema_sql_def(self._source_dbhelper, self.schema[etype])
+        self.sql('CREATE TABLE %s(%s);' % (tmp_tablename,
+                                           ', '.join('cw_%s %s' % (column, sqltype)
+                                                     for column, sqltype in attr_defs)))
+        self._initialized[etype] = [attr for attr, _ in attr_defs]
+        self._sqltypes[etype] = [sqltype for _, sqltype in attr_defs]
+
+    def _init_rtype(self, rtype):
+        """Create the temporary table of this store for relations of type `rtype`."""
+        assert not self._cnx.vreg.schema.rschema(rtype).inlined
+        self._initialized[rtype] = None
+        tablename = '%s_relation' % rtype.lower()
+        tmp_tablename = '%s_%s' % (tablename, self.uuid)
+        self.sql("INSERT INTO cwmassive_initialized VALUES (%(r)s, 'rtype', %(uuid)s)",
+                 {'r': rtype, 'uuid': self.uuid})
+        self.sql('CREATE TABLE %s(eid_from integer, eid_to integer)' % tmp_tablename)
+
     def flush(self):
         """Flush the data"""
         self.flush_entities()
@@ -211,36 +284,72 @@ class MassiveObjectStore(stores.RQLObjectStore):
             # if there is some entities to insert, delete constraint on metadata tables once for all
             if entities:
                 self._drop_metadata_constraints()
-            # get back entity data from the temporary tables
-            for etype, uuids in entities.items():
+            for etype in entities:
                 tablename = 'cw_%s' % etype.lower()
-                attr_defs = eschema_sql_def(self._source_dbhelper, self.schema[etype])
-                columns = ','.join('cw_%s' % attr for attr, _ in attr_defs)
                 self._dbh.drop_constraints(tablename)
                 self._dbh.drop_indexes(tablename)
-                for uuid in uuids:
-                    tmp_tablename = '%s_%s' % (tablename, uuid)
-                    self.sql('INSERT INTO %(table)s(%(columns)s) '
-                             'SELECT %(columns)s FROM %(tmp_table)s'
-                             % {'table': tablename, 'tmp_table': tmp_tablename,
-                                'columns': columns})
-                    self._insert_etype_metadata(etype, tmp_tablename)
-                    self._tmp_data_cleanup(tmp_tablename, etype, uuid)
-            # get back relation data from the temporary tables
-            for rtype, uuids in relations.items():
+            for rtype in relations:
                 tablename = '%s_relation' % rtype.lower()
                 self._dbh.drop_constraints(tablename)
                 self._dbh.drop_indexes(tablename)
-                for uuid in uuids:
-                    tmp_tablename = '%s_%s' % (tablename, uuid)
-                    self.fill_relation_table(tablename, tmp_tablename)
-                    self._tmp_data_cleanup(tmp_tablename, rtype, uuid)
+            # get back entity data from the temporary tables, then relation data once all
+            # entities have been inserted
+            self._run_merge_steps([(self._merge_etype, etype, uuids)
+                                   for etype, uuids in entities.items()])
+            self._run_merge_steps([(self._merge_rtype, rtype, uuids)
+                                   for rtype, uuids in relations.items()])
         # restore all deleted indexes and constraints
         self._dbh.restore_indexes_and_constraints()
 
+    def _run_merge_steps(self, steps):
+        """Run merge `steps`, given as a list of (function, entity or relation type, uuids)."""
+        for step, ertype, uuids in steps:
+            step(ertype, uuids)
+
+    def _merge_etype(self, etype, uuids):
+        """Insert entities of type `etype` from the temporary tables of stores in `uuids`."""
+        tablename = 'cw_%s' % etype.lower()
+        attr_defs = eschema_sql_def(self._source_dbhelper, self.schema[etype])
+        columns = ','.join('cw_%s' % attr for attr, _ in attr_defs)
+        for uuid in uuids:
+            tmp_tablename = '%s_%s' % (tablename, uuid)
+            if self.merge_strategy == 'anti-join':
+                self.sql('ANALYZE %s' % tmp_tablename)
+            self.sql('INSERT INTO %(table)s(%(columns)s) '
+                     'SELECT %(columns)s FROM %(tmp_table)s'
+                     % {'table': tablename, 'tmp_table': tmp_tablename,
+                        'columns': columns})
+            self._insert_etype_metadata(etype, tmp_tablename)
+            self._tmp_data_cleanup(tmp_tablename, etype, uuid)
+
+    def _merge_rtype(self, rtype, uuids):
+        """Insert relations of type `rtype` from the temporary tables of stores in `uuids`."""
+        tablename = '%s_relation' % rtype.lower()
+        for uuid in uuids:
+            tmp_tablename = '%s_%s' % (tablename, uuid)
+            if self.merge_strategy == 'anti-join':
+                self.sql('ANALYZE %s' % tmp_tablename)
+            self.fill_relation_table(tablename, tmp_tablename)
+            self._tmp_data_cleanup(tmp_tablename, rtype, uuid)
+
     def _insert_etype_metadata(self, etype, tmp_tablename):
         """Massive insertion of meta data for `etype`, with new entities in `tmp_tablename`.
         """
+        if self.merge_strategy == 'anti-join':
+            # compute eids of entities which don't exist yet once for all, metadata relations
+            # are then inserted for all of them
+            self.sql('CREATE TEMPORARY TABLE cwmassive_new_eids AS '
+                     'SELECT DISTINCT T.cw_eid FROM %s AS T '
+                     'LEFT JOIN entities AS E ON E.eid=T.cw_eid WHERE E.eid IS NULL'
+                     % tmp_tablename)
+            try:
+                self._insert_new_etype_metadata(etype, 'cwmassive_new_eids')
+            finally:
+                self.sql('DROP TABLE cwmassive_new_eids')
+        else:
+            self._insert_new_etype_metadata(etype, tmp_tablename)
+
+    def _insert_new_etype_metadata(self, etype, tmp_tablename):
         # insert standard metadata relations
         for rtype, eid in self.metagen.base_etype_rels(etype).items():
             self.fill_meta_relation_table(tmp_tablename, rtype, eid)
@@ -254,23 +363,43 @@ class MassiveObjectStore(stores.RQLObjectStore):
 
     def fill_entities_table(self, etype, tmp_tablename):
         # finally insert records into the entities table
-        self.sql("INSERT INTO entities(eid, type) "
-                 "SELECT cw_eid, '%s' FROM %s "
-                 "WHERE NOT EXISTS (SELECT 1 FROM entities WHERE eid=cw_eid)"
-                 % (etype, tmp_tablename))
+        if self.merge_strategy == 'anti-join':
+            # the primary key of the entities table is never dropped
+            self.sql("INSERT INTO entities(eid, type) "
+                     "SELECT cw_eid, '%s' FROM %s ON CONFLICT (eid) DO NOTHING"
+                     % (etype, tmp_tablename))
+        else:
+            self.sql("INSERT INTO entities(eid, type) "
+                     "SELECT cw_eid, '%s' FROM %s "
+                     "WHERE NOT EXISTS (SELECT 1 FROM entities WHERE eid=cw_eid)"
+                     % (etype, tmp_tablename))
 
     def fill_relation_table(self, tablename, tmp_tablename):
-        # XXX no index on the original relation table, EXISTS subquery may be sloooow
-        self.sql('INSERT INTO %(table)s(eid_from, eid_to) SELECT DISTINCT '
-                 'T.eid_from, T.eid_to FROM %(tmp_table)s AS T '
-                 'WHERE NOT EXISTS (SELECT 1 FROM %(table)s AS TT WHERE '
-                 'TT.eid_from=T.eid_from AND TT.eid_to=T.eid_to);'
-                 % {'table': tablename, 'tmp_table': tmp_tablename})
+        if self.merge_strategy == 'anti-join':
+            self.sql('INSERT INTO %(table)s(eid_from, eid_to) '
+                     'SELECT T.eid_from, T.eid_to FROM '
+                     '(SELECT DISTINCT eid_from, eid_to FROM %(tmp_table)s) AS T '
+                     'LEFT JOIN %(table)s AS TT '
+                     'ON TT.eid_from=T.eid_from AND TT.eid_to=T.eid_to '
+                     'WHERE TT.eid_from IS NULL'
+                     % {'table': tablename, 'tmp_table': tmp_tablename})
+        else:
+            # XXX no index on the original relation table, EXISTS subquery may be sloooow
+            self.sql('INSERT INTO %(table)s(eid_from, eid_to) SELECT DISTINCT '
+                     'T.eid_from, T.eid_to FROM %(tmp_table)s AS T '
+                     'WHERE NOT EXISTS (SELECT 1 FROM %(table)s AS TT WHERE '
+                     'TT.eid_from=T.eid_from AND TT.eid_to=T.eid_to);'
+                     % {'table': tablename, 'tmp_table': tmp_tablename})
 
     def fill_meta_relation_table(self, tmp_tablename, rtype, eid_to):
-        self.sql("INSERT INTO %s_relation(eid_from, eid_to) SELECT cw_eid, %s FROM %s "
-                 "WHERE NOT EXISTS (SELECT 1 FROM entities WHERE eid=cw_eid)"
-                 % (rtype, eid_to, tmp_tablename))
+        if self.merge_strategy == 'anti-join':
+            # `tmp_tablename` only contains new entities (see `_insert_etype_metadata`)
+            self.sql("INSERT INTO %s_relation(eid_from, eid_to) SELECT cw_eid, %s FROM %s"
+                     % (rtype, eid_to, tmp_tablename))
+        else:
+            self.sql("INSERT INTO %s_relation(eid_from, eid_to) SELECT cw_eid, %s FROM %s "
+                     "WHERE NOT EXISTS (SELECT 1 FROM entities WHERE eid=cw_eid)"
+                     % (rtype, eid_to, tmp_tablename))
 
     def _tmp_data_cleanup(self, tmp_tablename, ertype, uuid):
         """Drop temporary relation table and record from cwmassive_initialized."""
@@ -287,43 +416,235 @@ class MassiveObjectStore(stores.RQLObjectStore):
             if not data:
                 # There is no data for these etype for this flush round.
                 continue
-            buf = pgstore._create_copyfrom_buffer(data, ('eid_from', 'eid_to'))
-            cursor = self._cnx.cnxset.cu
             tablename = '%s_relation' % rtype.lower()
             tmp_tablename = '%s_%s' % (tablename, self.uuid)
-            cursor.copy_from(buf, tmp_tablename, null='NULL', columns=('eid_from', 'eid_to'))
+            pgstore._copy_from_stream(self._cursor(), tmp_tablename, data,
+                                      ('eid_from', 'eid_to'),
+                                      sqltypes=self.binary_copy and ('integer', 'integer'))
             # Clear data cache
             self._data_relations[rtype] = []
 
     def flush_entities(self):
         """Flush the entities data from in-memory structures to a temporary table."""
-        metagen = self.metagen
         for etype, data in self._data_entities.items():
             if not data:
                 # There is no data for these etype for this flush round.
                 continue
             attrs = self._initialized[etype]
-            _base_data = dict.fromkeys(attrs)
-            _base_data.update(self.default_values[etype])
-            _base_data.update(metagen.base_etype_attrs(etype))
-            _data = []
-            for d in data:
-                # do this first on `d`, because it won't fill keys associated to None as provided by
-                # `_base_data`
-                metagen.init_entity_attrs(etype, d['eid'], d)
-                # XXX warn/raise if there is some key not in attrs?
-                _d = _base_data.copy()
-                _d.update(d)
-                _data.append(_d)
-            buf = pgstore._create_copyfrom_buffer(_data, attrs)
             tablename = 'cw_%s' % etype.lower()
             tmp_tablename = '%s_%s' % (tablename, self.uuid)
             columns = ['cw_%s' % attr for attr in attrs]
-            cursor = self._cnx.cnxset.cu
-            cursor.copy_from(buf, tmp_tablename, null='NULL', columns=columns)
+            pgstore._copy_from_stream(self._cursor(), tmp_tablename,
+                                      self._iter_entities_data(etype, data), attrs, columns,
+                                      sqltypes=self.binary_copy and self._sqltypes[etype])
             # Clear data cache
             self._data_entities[etype] = []
 
+    def _iter_entities_data(self, etype, data):
+        """Yield attributes of entities of type `etype` in `data`, completed with default values
+        and metadata, while they are copied to the database.
+        """
+        metagen = self.metagen
+        _base_data = dict.fromkeys(self._initialized[etype])
+        _base_data.update(self.default_values[etype])
+        _base_data.update(metagen.base_etype_attrs(etype))
+        for d in data:
+            # do this first on `d`, because it won't fill keys associated to None as provided by
+            # `_base_data`
+            metagen.init_entity_attrs(etype, d['eid'], d)
+            # XXX warn/raise if there is some key not in attrs?
+            _d = _base_data.copy()
+            _d.update(d)
+            yield _d
+
+
+class ParallelMassiveObjectStore(MassiveObjectStore):
+    """Massive store spreading the load over several worker processes, for imports of tens of
+    millions of entities.
+
+    This store is used as a regular :class:`MassiveObjectStore`, for instance as the store of an
+    :class:`~cubicweb.dataimport.importer.ExtEntitiesImporter`:
+
+    .. code-block:: python
+
+       store = ParallelMassiveObjectStore(cnx, nb_workers=8)
+       importer = ExtEntitiesImporter(cnx.vreg.schema, store)
+       importer.import_entities(ext_entities)
+       store.flush()
+       store.commit()
+       store.finish()
+
+    Eids are allocated by this (master) store, from ranges of `eids_seq_range` eids reserved at
+    once in the database, so that they are known immediately by the caller. Upon :meth:`flush`,
+    pending entities and relations are dispatched to `nb_workers` worker processes, forked on
+    the first flush. Each worker runs a slave :class:`MassiveObjectStore`, with its own database
+    connection and temporary tables, turning data into COPY FROM statements and committing them.
+    At most `queue_size` batches may be waiting for a worker, flushing blocks beyond that limit.
+
+    Finally, :meth:`finish` waits for the workers, then merges temporary tables of each entity
+    type, then of each relation type, concurrently on up to `nb_workers` database connections.
+    Each merge step being committed separately, data merged by successful steps is kept if
+    another one fails.
+    """
+
+    def __init__(self, cnx, nb_workers=4, queue_size=None, eids_seq_range=10000,
+                 metagen=None, merge_strategy='not-exists', binary_copy=False):
+        super(ParallelMassiveObjectStore, self).__init__(
+            cnx, eids_seq_range=eids_seq_range, metagen=metagen,
+            merge_strategy=merge_strategy, binary_copy=binary_copy)
+        assert nb_workers > 0
+        self.nb_workers = nb_workers
+        self.queue_size = queue_size or 2 * nb_workers
+        self._workers = []
+        self._tasks = self._errors = None
+
+    def _init_etype(self, etype):
+        # temporary tables are created by workers
+        self._initialized[etype] = None
+
+    def _init_rtype(self, rtype):
+        assert not self._cnx.vreg.schema.rschema(rtype).inlined
+        self._initialized[rtype] = None
+
+    def _start_workers(self):
+        # workers must see the cwmassive_initialized and metadata tables, which
+        # may have been created but not committed yet by prepare_insert_entity
+        self.master_init(commit=False)
+        self._cnx.commit()
+        context = multiprocessing.get_context('fork')
+        self._tasks = context.Queue(self.queue_size)
+        self._errors = context.Queue()
+        for i in range(self.nb_workers):
+            worker = context.Process(target=_import_worker,
+                                     args=(self, self._tasks, self._errors),
+                                     name='cwmassive-worker-%s' % i)
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+        self.logger.info('started %s import workers', self.nb_workers)
+
+    def _check_workers(self):
+        """Raise an exception if some worker failed."""
+        errors = []
+        while True:
+            try:
+                errors.append(self._errors.get_nowait())
+            except queue.Empty:
+                break
+        if not errors:
+            for worker in self._workers:
+                if worker.exitcode not in (None, 0):
+                    errors.append('%s exited with code %s' % (worker.name, worker.exitcode))
+        if errors:
+            self._stop_workers(terminate=True)
+            raise Exception('massive import workers failed:\n' + '\n'.join(errors))
+
+    def _dispatch(self, task):
+        while True:
+            try:
+                self._tasks.put(task, timeout=1)
+                return
+            except queue.Full:
+                self._check_workers()
+
+    def _stop_workers(self, terminate=False):
+        """Stop workers, once they have processed dispatched data unless `terminate` is true."""
+        if terminate:
+            for worker in self._workers:
+                worker.terminate()
+        else:
+            for worker in self._workers:
+                self._dispatch(None)
+        for worker in self._workers:
+            worker.join()
+        if not terminate:
+            self._check_workers()
+        self._workers = []
+
+    def flush(self):
+        """Dispatch pending entities and relations to the workers."""
+        if not self._workers:
+            self._start_workers()
+        for etype, data in self._data_entities.items():
+            if data:
+                self._dispatch(('etype', etype, data))
+                self._data_entities[etype] = []
+        for rtype, data in self._data_relations.items():
+            if data:
+                self._dispatch(('rtype', rtype, data))
+                self._data_relations[rtype] = []
+
+    def commit(self):
+        if self._workers:
+            self._check_workers()
+        return super(ParallelMassiveObjectStore, self).commit()
+
+    def finish(self):
+        """Wait for workers to process dispatched data, then merge it."""
+        if self._workers:
+            self._stop_workers()
+        super(ParallelMassiveObjectStore, self).finish()
+
+    def _finish(self):
+        try:
+            super(ParallelMassiveObjectStore, self)._finish()
+        except Exception:
+            # indexes and constraints removal has been committed before merging data
+            self._cnx.rollback()
+            try:
+                self._dbh.restore_indexes_and_constraints()
+                self._cnx.commit()
+            except Exception:
+                self._cnx.rollback()
+                self.logger.exception("can't restore indexes and constraints, they are kept "
+                                      "in the cwmassive_constraints table")
+            raise
+
+    def _run_merge_steps(self, steps):
+        """Run merge `steps` concurrently, each one in a transaction on its own connection."""
+        if not steps:
+            return
+        # commit removal of indexes and constraints, else merge steps would be locked
+        self._cnx.commit()
+
+        def run_step(step, ertype, uuids):
+            with self._own_connection():
+                step(ertype, uuids)
+            self.logger.info('%s merged', ertype)
+
+        with ThreadPoolExecutor(max_workers=self.nb_workers) as executor:
+            futures = [executor.submit(run_step, *step) for step in steps]
+            for future in futures:
+                future.result()
+
+
+def _import_worker(master, tasks, errors):
+    """Main function of processes forked by a :class:`ParallelMassiveObjectStore`: flush batches of
+    entities or relations read from the `tasks` queue using a slave store, until None is read.
+    Errors are reported in the `errors` queue.
+    """
+    # the repository and its connections are inherited from the master process: don't use
+    # them to access the database, only to get the schema and configuration
+    store = MassiveObjectStore(master._cnx, slave_mode=True, metagen=master.metagen,
+                               binary_copy=master.binary_copy)
+    try:
+        with store._own_connection() as dbcnx:
+            for kind, ertype, data in iter(tasks.get, None):
+                if kind == 'etype':
+                    if ertype not in store._initialized:
+                        store._init_etype(ertype)
+                    store._data_entities[ertype] = data
+                    store.flush_entities()
+                else:
+                    if ertype not in store._initialized:
+                        store._init_rtype(ertype)
+                    store._data_relations[ertype] = data
+                    store.flush_relations()
+                dbcnx.commit()
+    except Exception:
+        errors.put(traceback.format_exc())
+        raise
+
 
 def get_default_values(schema):
     """analyzes yams ``schema`` and returns the list of default values.
@@ -20,10 +20,12 @@
 import warnings
 import os.path as osp
 from io import StringIO
+from itertools import islice
 from time import asctime
-from datetime import date, datetime, time
+from datetime import date, datetime, time, timezone
 from collections import defaultdict
 import pickle
+import struct
 
 from cubicweb.utils import make_uid
 from cubicweb.server.sqlutils import SQL_PREFIX
@@ -41,15 +43,16 @@ def _execmany_thread_copy_from(cu, statement, data, table,
                                columns, encoding='utf-8'):
     """ Execute thread with copy from
     """
+    # data is streamed to the database, so an unsupported value may only be
+    # found once the copy has started: use a savepoint to be able to fallback
+    cu.execute('SAVEPOINT cw_copy_from')
     try:
-        buf = _create_copyfrom_buffer(data, columns, encoding=encoding)
+        _copy_from_stream(cu, table, data, columns, encoding=encoding)
     except ValueError:
+        cu.execute('ROLLBACK TO SAVEPOINT cw_copy_from')
         _execmany_thread_not_copy_from(cu, statement, data)
     else:
-        if columns is None:
-            cu.copy_from(buf, table, null=u'NULL')
-        else:
-            cu.copy_from(buf, table, null=u'NULL', columns=columns)
+        cu.execute('RELEASE SAVEPOINT cw_copy_from')
 
 
 def _execmany_thread(sql_connect, statements, dump_output_dir=None,
@@ -98,9 +101,9 @@ def _execmany_thread(sql_connect, statements, dump_output_dir=None,
         cu.close()
 
 
-def _copyfrom_buffer_convert_None(value, **opts):
-    '''Convert None value to "NULL"'''
-    return u'NULL'
+def _copyfrom_buffer_convert_None(value, null=u'NULL', **opts):
+    '''Convert None value to "NULL", or to `null` if specified'''
+    return null
 
 def _copyfrom_buffer_convert_number(value, **opts):
     '''Convert a number into its string representation'''
@@ -143,18 +146,8 @@ _COPYFROM_BUFFER_CONVERTERS = [
     (time, _copyfrom_buffer_convert_time),
 ]
 
-def _create_copyfrom_buffer(data, columns=None, **convert_opts):
-    """
-    Create a StringIO buffer for 'COPY FROM' command.
-    Deals with Unicode, Int, Float, Date... (see ``converters``)
-
-    :data: a sequence/dict of tuples
-    :columns: list of columns to consider (default to all columns)
-    :converter_opts: keyword arguements given to converters
-    """
-    # Create a list rather than directly create a StringIO
-    # to correctly write lines separated by '\n' in a single step
-    rows = []
+def _copyfrom_columns(data, columns=None):
+    """Return `columns` if specified, else all columns of the first row of `data`."""
     if columns is None:
         if isinstance(data[0], (tuple, list)):
             columns = list(range(len(data[0])))
@@ -162,11 +155,13 @@ def _create_copyfrom_buffer(data, columns=None, **convert_opts):
             columns = data[0].keys()
         else:
             raise ValueError('Could not get columns: you must provide columns.')
+    return columns
+
+
+def _copyfrom_values(data, columns):
+    """Yield values of `columns` for each row of `data`."""
     for row in data:
-        # Iterate over the different columns and the different values
-        # and try to convert them to a correct datatype.
-        # If an error is raised, do not continue.
-        formatted_row = []
+        values = []
         for col in columns:
             try:
                 value = row[col]
@@ -178,6 +173,20 @@ def _create_copyfrom_buffer(data, columns=None, **convert_opts):
                 # Instead, the extra keys are set to NULL from the
                 # database point of view.
                 value = None
+            values.append(value)
+        yield values
+
+
+def _iter_copyfrom_lines(data, columns, **convert_opts):
+    """Yield lines of text format 'COPY FROM' data for `columns` of each row
+    of `data`, converted using ``_COPYFROM_BUFFER_CONVERTERS``.
+    """
+    for values in _copyfrom_values(data, columns):
+        # Iterate over the different columns and the different values
+        # and try to convert them to a correct datatype.
+        # If an error is raised, do not continue.
+        formatted_row = []
+        for value in values:
             for types, converter in _COPYFROM_BUFFER_CONVERTERS:
                 if isinstance(value, types):
                     value = converter(value, **convert_opts)
@@ -188,8 +197,238 @@ def _create_copyfrom_buffer(data, columns=None, **convert_opts):
             # We push the value to the new formatted row
             # if the value is not None and could be converted to a string.
             formatted_row.append(value)
-        rows.append('\t'.join(formatted_row))
-    return StringIO('\n'.join(rows))
+        yield '\t'.join(formatted_row)
+
+
+def _create_copyfrom_buffer(data, columns=None, **convert_opts):
+    """
+    Create a StringIO buffer for 'COPY FROM' command.
+    Deals with Unicode, Int, Float, Date... (see ``converters``)
+
+    :data: a sequence/dict of tuples
+    :columns: list of columns to consider (default to all columns)
+    :converter_opts: keyword arguements given to converters
+    """
+    columns = _copyfrom_columns(data, columns)
+    return StringIO('\n'.join(_iter_copyfrom_lines(data, columns, **convert_opts)))
+
+
+# binary 'COPY FROM' format, see
+# https://www.postgresql.org/docs/current/sql-copy.html#id-1.9.3.55.9.4
+
+_PG_EPOCH_DATE = date(2000, 1, 1)
+_PG_EPOCH = datetime(2000, 1, 1)
+
+
+def _copyfrom_binary_date(value, encoding):
+    if isinstance(value, datetime):
+        value = value.date()
+    return struct.pack('!i', (value - _PG_EPOCH_DATE).days)
+
+
+def _copyfrom_binary_timedelta(value):
+    return (value.days * 86400 + value.seconds) * 1000000 + value.microseconds
+
+
+def _copyfrom_binary_datetime(value, encoding):
+    if not isinstance(value, datetime):
+        value = datetime.combine(value, time())
+    # as for text format, time zone is ignored
+    value = value.replace(tzinfo=None)
+    return struct.pack('!q', _copyfrom_binary_timedelta(value - _PG_EPOCH))
+
+
+def _copyfrom_binary_tzdatetime(value, encoding):
+    # naive datetimes are considered to be UTC datetimes
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return _copyfrom_binary_datetime(value, encoding)
+
+
+def _copyfrom_binary_time(value, encoding):
+    return struct.pack('!q', ((value.hour * 60 + value.minute) * 60 + value.second)
+                       * 1000000 + value.microsecond)
+
+
+def _copyfrom_binary_interval(value, encoding):
+    # microseconds, days, months
+    return struct.pack('!qii', value.seconds * 1000000 + value.microseconds, value.days, 0)
+
+
+def _copyfrom_binary_string(value, encoding):
+    return value.encode(encoding)
+
+
+def _copyfrom_binary_bytes(value, encoding):
+    if hasattr(value, 'getvalue'):  # Binary
+        return value.getvalue()
+    return bytes(value)
+
+
+def _copyfrom_binary_struct(fmt):
+    packer = struct.Struct(fmt)
+    return lambda value, encoding: packer.pack(value)
+
+
+# {sql type: converter} dictionary, sql types with parameters or default
+# values are looked up without them.
+_COPYFROM_BINARY_CONVERTERS = {
+    'smallint': _copyfrom_binary_struct('!h'),
+    'integer': _copyfrom_binary_struct('!i'),
+    'bigint': _copyfrom_binary_struct('!q'),
+    'float': _copyfrom_binary_struct('!d'),
+    'double precision': _copyfrom_binary_struct('!d'),
+    'boolean': _copyfrom_binary_struct('!?'),
+    'text': _copyfrom_binary_string,
+    'varchar': _copyfrom_binary_string,
+    'character varying': _copyfrom_binary_string,
+    'bytea': _copyfrom_binary_bytes,
+    'date': _copyfrom_binary_date,
+    'time': _copyfrom_binary_time,
+    'timestamp': _copyfrom_binary_datetime,
+    'timestamp with time zone': _copyfrom_binary_tzdatetime,
+    'interval': _copyfrom_binary_interval,
+}
+
+
+def _copyfrom_binary_converters(sqltypes):
+    """Return the list of binary converters for the given sql types, or None if
+    some of them can't be copied using binary format.
+    """
+    converters = []
+    for sqltype in sqltypes:
+        sqltype = sqltype.split(' DEFAULT ')[0].split('(')[0].strip().lower()
+        converter = _COPYFROM_BINARY_CONVERTERS.get(sqltype)
+        if converter is None:
+            return None
+        converters.append(converter)
+    return converters
+
+
+def _iter_copyfrom_binary(data, columns, converters, encoding='utf-8'):
+    """Yield binary format 'COPY FROM' data for `columns` of each row of
+    `data`, converted using `converters`.
+    """
+    yield b'PGCOPY\n\xff\r\n\x00' + struct.pack('!ii', 0, 0)
+    header = struct.pack('!h', len(columns))
+    null = struct.pack('!i', -1)
+    for values in _copyfrom_values(data, columns):
+        fields = [header]
+        for col, converter, value in zip(columns, converters, values):
+            if value is None:
+                fields.append(null)
+                continue
+            try:
+                value = converter(value, encoding)
+            except (struct.error, TypeError, AttributeError) as exc:
+                raise ValueError('Unsupported value %r for column %s (%s)'
+                                 % (value, col, exc))
+            fields.append(struct.pack('!i', len(value)))
+            fields.append(value)
+        yield b''.join(fields)
+    yield struct.pack('!h', -1)
+
+
+class _CopyFromStream(object):
+    """File-like object reading 'COPY FROM' data from `chunks`, an iterator on
+    strings (or bytes), so that data is formatted while being sent to the
+    database.
+
+    Error raised by `chunks` is kept in the `error` attribute, since it may be
+    hidden by the database driver.
+    """
+
+    def __init__(self, chunks, empty=''):
+        self._chunks = chunks
+        self._empty = empty
+        self._chunk = empty
+        self._pos = 0
+        self.error = None
+
+    def _next_chunk(self):
+        try:
+            self._chunk = next(self._chunks)
+        except StopIteration:
+            return False
+        except Exception as exc:
+            self.error = exc
+            raise
+        self._pos = 0
+        return True
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            chunks = [self._chunk[self._pos:]]
+            while self._next_chunk():
+                chunks.append(self._chunk)
+            self._chunk, self._pos = self._empty, 0
+            return self._empty.join(chunks)
+        while self._pos >= len(self._chunk):
+            if not self._next_chunk():
+                return self._empty
+        data = self._chunk[self._pos:self._pos + size]
+        self._pos += len(data)
+        return data
+
+    readline = read
+
+
+def _chunked(parts, chunk_size, sep):
+    """Join items of `parts` by `chunk_size`."""
+    parts = iter(parts)
+    while True:
+        chunk = sep.join(islice(parts, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _copy_from_stream(cursor, table, data, columns=None, table_columns=None,
+                      sqltypes=None, encoding='utf-8', chunk_size=1000,
+                      null=u'NULL'):
+    """Execute 'COPY FROM' into `table` for `columns` of each row of `data`,
+    formatting data by chunks of `chunk_size` rows while it is sent to the
+    database, so that the whole data is never formatted in memory.
+
+    :data: a sequence or an iterator of tuples or dicts
+    :columns: list of columns to consider (default to all columns of the first
+              row, `data` must then be a sequence)
+    :table_columns: names of columns of `table` matching `columns` (default to
+                    `columns`)
+    :sqltypes: sql types of `columns`, if specified and if all of them are
+               supported, binary format is used
+    :null: string representing NULL values in text format, which should not
+           be a possible value of text columns
+
+    ValueError is raised if some value can't be converted.
+    """
+    if columns is None:
+        columns = _copyfrom_columns(data)
+        if isinstance(data[0], dict):
+            table_columns = table_columns or columns
+    elif table_columns is None:
+        table_columns = columns
+    if table_columns is not None:
+        table = '%s(%s)' % (table, ', '.join(table_columns))
+    converters = sqltypes and _copyfrom_binary_converters(sqltypes)
+    if converters:
+        stream = _CopyFromStream(
+            _chunked(_iter_copyfrom_binary(data, columns, converters, encoding),
+                     chunk_size, b''),
+            empty=b'')
+        sql = 'COPY %s FROM STDIN WITH BINARY' % table
+    else:
+        lines = _iter_copyfrom_lines(data, columns, encoding=encoding, null=null)
+        stream = _CopyFromStream(
+            (chunk + '\n' for chunk in _chunked(lines, chunk_size, '\n')))
+        sql = "COPY %s FROM STDIN WITH NULL AS '%s'" % (table, null.replace("'", "''"))
+    try:
+        cursor.copy_expert(sql, stream)
+    except Exception:
+        # the driver may not give back errors raised while reading data
+        if stream.error is not None:
+            raise stream.error
+        raise
 
 
 ###########################################################################
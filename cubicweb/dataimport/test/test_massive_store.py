@@ -22,7 +22,8 @@ from cubicweb.devtools import testlib, PostgresApptestConfiguration
 from cubicweb.devtools import startpgcluster, stoppgcluster
 from cubicweb.dataimport import ucsvreader, stores
 from cubicweb.server.schema2sql import build_index_name
-from cubicweb.dataimport.massive_store import MassiveObjectStore, PGHelper
+from cubicweb.dataimport.massive_store import (MassiveObjectStore, ParallelMassiveObjectStore,
+                                               PGHelper)
 
 import test_stores
 
@@ -232,6 +233,67 @@ where table_schema = %(s)s''', {'s': pgh.pg_schema}).fetchall()
             rset = cnx.execute('Any X WHERE X is Location, X timezone T')
             self.assertEqual(len(rset), 4000)
 
+    def test_binary_copy_insert(self):
+        with self.admin_access.repo_cnx() as cnx:
+            store = MassiveObjectStore(cnx, binary_copy=True)
+            self.push_geonames_data(self.datapath('geonames.csv'), store)
+            store.flush()
+            store.commit()
+            store.finish()
+        with self.admin_access.repo_cnx() as cnx:
+            rset = cnx.execute('Any X WHERE X is Location')
+            self.assertEqual(len(rset), 4000)
+            rset = cnx.execute('Any X WHERE X is Location, X timezone T')
+            self.assertEqual(len(rset), 4000)
+            rset = cnx.execute('Any X WHERE X is Location, X creation_date D, '
+                               'X owned_by U, X is_instance_of E')
+            self.assertEqual(len(rset), 4000)
+
+    def test_anti_join_insert(self):
+        with self.admin_access.repo_cnx() as cnx:
+            store = MassiveObjectStore(cnx, merge_strategy='anti-join')
+            self.push_geonames_data(self.datapath('geonames.csv'), store)
+            # relation also inserted as metadata, twice
+            loc = store.prepare_insert_entity('Location', name=u'loc')
+            for _ in range(2):
+                store.prepare_insert_relation(loc, 'owned_by', cnx.user.eid)
+            store.flush()
+            store.commit()
+            store.finish()
+        with self.admin_access.repo_cnx() as cnx:
+            rset = cnx.execute('Any X WHERE X is Location')
+            self.assertEqual(len(rset), 4001)
+            rset = cnx.execute('Any X WHERE X is Location, X timezone T')
+            self.assertEqual(len(rset), 4000)
+            rset = cnx.execute('Any X WHERE X is Location, X owned_by U, X is_instance_of E')
+            self.assertEqual(len(rset), 4001)
+
+    def test_parallel_insert(self):
+        with self.admin_access.repo_cnx() as cnx:
+            init_descr = self.get_db_descr(cnx)
+            store = ParallelMassiveObjectStore(cnx, nb_workers=2)
+            self.push_geonames_data(self.datapath('geonames.csv'), store)
+            store.flush()
+            store.commit()
+            store.finish()
+        with self.admin_access.repo_cnx() as cnx:
+            rset = cnx.execute('Any X WHERE X is Location')
+            self.assertEqual(len(rset), 4000)
+            rset = cnx.execute('Any X WHERE X is Location, X timezone T')
+            self.assertEqual(len(rset), 4000)
+            rset = cnx.execute('Any X WHERE X is Location, X owned_by U, X is_instance_of E')
+            self.assertEqual(len(rset), 4000)
+            self.assertEqual(self.get_db_descr(cnx), init_descr)
+
+    def test_parallel_worker_error(self):
+        with self.admin_access.repo_cnx() as cnx:
+            store = ParallelMassiveObjectStore(cnx, nb_workers=2)
+            store.prepare_insert_entity('Location', name=u'toto', feature_class=u'too long')
+            store.flush()
+            with self.assertRaises(Exception) as cm:
+                store.finish()
+            self.assertIn('massive import workers failed', str(cm.exception))
+
     def test_index_building(self):
         with self.admin_access.repo_cnx() as cnx:
             store = MassiveObjectStore(cnx)
@@ -19,6 +19,7 @@
 """unittest for cubicweb.dataimport.pgstore"""
 
 import datetime as DT
+import struct
 
 from logilab.common.testlib import TestCase, unittest_main
 
@@ -88,5 +89,68 @@ class CreateCopyFromBufferTC(TestCase):
         self.assertEqual(expected, results.getvalue())
 
 
+class FakeCursor(object):
+
+    def __init__(self, size=7):
+        self.size = size
+
+    def copy_expert(self, sql, stream):
+        self.sql = sql
+        chunks = []
+        while True:
+            chunk = stream.read(self.size)
+            if not chunk:
+                break
+            assert len(chunk) <= self.size
+            chunks.append(chunk)
+        self.data = chunks[0][:0].join(chunks)
+
+
+class CopyFromStreamTC(TestCase):
+
+    def test_text(self):
+        data = [{'eid': i, 'name': u'éléphant\t%s' % i, 'date': DT.date(2014, 1, i)}
+                for i in range(1, 6)]
+        cursor = FakeCursor()
+        pgstore._copy_from_stream(cursor, 'cw_test', iter(data), ('eid', 'name'),
+                                  ('cw_eid', 'cw_name'), chunk_size=2)
+        self.assertEqual(cursor.sql,
+                         "COPY cw_test(cw_eid, cw_name) FROM STDIN WITH NULL AS 'NULL'")
+        expected = pgstore._create_copyfrom_buffer(data, ('eid', 'name')).getvalue()
+        self.assertEqual(cursor.data, expected + '\n')
+
+    def test_binary(self):
+        data = [(1, u'é', DT.date(2000, 1, 2), None),
+                (2, u'b', DT.date(1999, 12, 31), DT.datetime(2000, 1, 1, 0, 0, 1))]
+        cursor = FakeCursor()
+        pgstore._copy_from_stream(cursor, 'test', data,
+                                  sqltypes=('integer', 'varchar(12)', 'date',
+                                            'timestamp with time zone'))
+        self.assertEqual(cursor.sql, 'COPY test FROM STDIN WITH BINARY')
+        expected = b''.join([
+            b'PGCOPY\n\xff\r\n\x00', struct.pack('!ii', 0, 0),
+            struct.pack('!hii', 4, 4, 1), struct.pack('!i', 2), u'é'.encode('utf-8'),
+            struct.pack('!iii', 4, 1, -1),
+            struct.pack('!hii', 4, 4, 2), struct.pack('!i', 1), b'b',
+            struct.pack('!iiiq', 4, -1, 8, 1000000),
+            struct.pack('!h', -1)])
+        self.assertEqual(cursor.data, expected)
+
+    def test_binary_unsupported_type(self):
+        data = [(1, 1.5)]
+        cursor = FakeCursor()
+        # decimal isn't supported in binary format, fallback to text
+        pgstore._copy_from_stream(cursor, 'test', data, sqltypes=('integer', 'decimal'))
+        self.assertEqual(cursor.data, '1\t1.5\n')
+
+    def test_bad_value(self):
+        data = [(1, object())]
+        with self.assertRaises(ValueError):
+            pgstore._copy_from_stream(FakeCursor(), 'test', data)
+        with self.assertRaises(ValueError):
+            pgstore._copy_from_stream(FakeCursor(), 'test', data,
+                                      sqltypes=('integer', 'integer'))
+
+
 if __name__ == '__main__':
     unittest_main()
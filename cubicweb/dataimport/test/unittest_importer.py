@@ -20,7 +20,7 @@ from logilab.common.testlib import TestCase, unittest_main
 
 from cubicweb import Binary, ValidationError
 from cubicweb.devtools.testlib import CubicWebTC
-from cubicweb.dataimport import RQLObjectStore, ucsvreader
+from cubicweb.dataimport import NullStore, RQLObjectStore, ucsvreader
 from cubicweb.dataimport.importer import (ExtEntity, ExtEntitiesImporter, RelationMapping,
                                           SimpleImportLog, use_extid_as_cwuri, drop_extra_values)
 
@@ -182,6 +182,60 @@ class ExtEntitiesImporterTC(CubicWebTC):
             self.assertEqual(entity.nom, u'Richelieu Cardinal')
 
 
+class ExtEntitiesSchedulingTC(CubicWebTC):
+    """Check the number of readiness checks done to import ext entities linked by inlined
+    relations is linear, whatever their order.
+    """
+    size = 2000
+
+    def import_entities(self, ext_entities):
+        importer = ExtEntitiesImporter(self.schema, NullStore(), raise_on_error=True)
+        imported = []
+        for ext_entity in importer.iter_ext_entities(ext_entities, {}, {}):
+            importer.prepare_insert_entity(ext_entity)
+            imported.append(ext_entity.extid)
+        return importer, imported
+
+    def chain(self):
+        """Yield ext entities of a chain where each entity is linked to the next one, the last one
+        coming first.
+        """
+        for i in range(self.size):
+            values = {'nom': set([u'p%s' % i])}
+            if i:
+                values['enfant'] = set([i - 1])
+            yield ExtEntity('Personne', i, values)
+
+    def test_chain(self):
+        importer, imported = self.import_entities(self.chain())
+        self.assertEqual(imported, list(range(self.size)))
+        self.assertEqual(importer.counters['queued'], 0)
+        importer, imported = self.import_entities(reversed(list(self.chain())))
+        self.assertEqual(imported, list(range(self.size)))
+        self.assertEqual(importer.counters['entities'], self.size)
+        self.assertEqual(importer.counters['queued'], self.size - 1)
+        self.assertEqual(importer.counters['checks'], 2 * self.size - 1)
+
+    def test_tree(self):
+        # binary tree whose leaves come first
+        ext_entities = [ExtEntity('Personne', i, {'nom': set([u'p%s' % i]),
+                                                  'enfant': set([(i - 1) // 2])})
+                        for i in range(self.size - 1, 0, -1)]
+        ext_entities.append(ExtEntity('Personne', 0, {'nom': set([u'root'])}))
+        importer, imported = self.import_entities(ext_entities)
+        self.assertEqual(sorted(imported), list(range(self.size)))
+        self.assertEqual(importer.counters['queued'], self.size - 1)
+        self.assertEqual(importer.counters['checks'], 2 * self.size - 1)
+
+    def test_missing(self):
+        queue = {}
+        importer = ExtEntitiesImporter(self.schema, NullStore())
+        ext_entities = [ExtEntity('Personne', 1, {'enfant': set([0])}),
+                        ExtEntity('Personne', 2, {'enfant': set([1])})]
+        self.assertEqual(list(importer.iter_ext_entities(ext_entities, {}, queue)), [])
+        self.assertEqual(queue, {'Personne': ext_entities})
+
+
 class UseExtidAsCwuriTC(TestCase):
 
     def test(self):
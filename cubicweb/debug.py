@@ -16,6 +16,9 @@
 # You should have received a copy of the GNU Lesser General Public License along
 # with CubicWeb.  If not, see <http://www.gnu.org/licenses/>.
 
+import sys
+import traceback
+from itertools import count
 from logging import getLogger
 
 logger = getLogger('cubicweb')
@@ -29,6 +32,10 @@ SUBSCRIBERS = {
     "registry_decisions": [],
 }
 
+# emit only one message out of N on a channel, see set_debug_channel_sampling
+SAMPLING_RATES = dict.fromkeys(SUBSCRIBERS, 1)
+_SAMPLING_COUNTERS = {channel: count() for channel in SUBSCRIBERS}
+
 
 def subscribe_to_debug_channel(channel, subscriber):
     """
@@ -75,3 +82,81 @@ def emit_to_debug_channel(channel, message):
             subscriber(message)
         except Exception:
             logger.error("Failed to send debug message '%s' to subscriber '%s'", message, subscriber, exc_info=True)
+
+
+def set_debug_channel_sampling(channel, rate):
+    """
+    Only emit one message out of `rate` on the given channel (1 means every
+    message is emitted).
+
+    It will raise Exception if the channel doesn't exist.
+    """
+    if channel not in SUBSCRIBERS.keys():
+        raise Exception("debug channel '%s' doesn't exist" % channel)
+
+    if rate < 1:
+        raise ValueError("sampling rate should be a positive integer, not %r" % rate)
+
+    SAMPLING_RATES[channel] = int(rate)
+    _SAMPLING_COUNTERS[channel] = count()
+
+
+def debug_channel_has_subscribers(channel):
+    """
+    Return True if someone is listening to the given debug channel.
+    """
+    return bool(SUBSCRIBERS[channel])
+
+
+def should_emit_to_debug_channel(channel):
+    """
+    Return True if a message should be built and sent to the given debug
+    channel, according to its subscribers and its sampling rate.
+
+    Since building debug messages is costly (call stack, tracing token...),
+    callers should check this before doing so.
+    """
+    if not SUBSCRIBERS[channel]:
+        return False
+
+    rate = SAMPLING_RATES[channel]
+    if rate == 1:
+        return True
+
+    return next(_SAMPLING_COUNTERS[channel]) % rate == 0
+
+
+class DebugMessage(dict):
+    """
+    Message sent to debug channel subscribers.
+
+    The call stack of the code creating the message (excluding the creating
+    frame itself) is recorded as (code, line number) pairs, which is cheap, and
+    is only formatted when the "callstack" item is first read.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(DebugMessage, self).__init__(*args, **kwargs)
+        frames = []
+        # skip this constructor and the frame calling it
+        frame = sys._getframe(2)
+        while frame is not None:
+            frames.append((frame.f_code, frame.f_lineno))
+            frame = frame.f_back
+        self._frames = frames
+
+    def __missing__(self, key):
+        if key != "callstack":
+            raise KeyError(key)
+
+        stack = traceback.StackSummary.from_list(
+            [(code.co_filename, lineno, code.co_name, None)
+             for code, lineno in reversed(self._frames)])
+        self["callstack"] = callstack = "".join(stack.format())
+        return callstack
+
+    def get(self, key, default=None):
+        if key == "callstack":
+            return self[key]
+
+        return super(DebugMessage, self).get(key, default)
@@ -40,18 +40,13 @@ class AnyEntity(Entity):
         return req.build_url('add/%s' % cls.__regid__, **kwargs)
 
     @classmethod
-    def cw_fti_index_rql_limit(cls, req, limit=1000):
-        """generate rsets of entities to FT-index
+    def cw_fti_index_rql_limit(cls, req, limit=1000, start=0):
+        """generate rsets of entities to FT-index, ordered by eid and starting
+        after eid `start`
 
         By default, each successive result set is limited to 1000 entities
         """
-        restrictions = ['X is %s' % cls.__regid__]
-        selected = ['X']
-        start = 0
-        for attrschema in sorted(cls.e_schema.indexable_attributes()):
-            varname = attrschema.type.upper()
-            restrictions.append('X %s %s' % (attrschema, varname))
-            selected.append(varname)
+        selected, restrictions = cls._cw_fti_index_rql_parts()
         while True:
             q_restrictions = restrictions + ['X eid > %s' % start]
             rset = req.execute('Any %s ORDERBY X LIMIT %s WHERE %s' %
@@ -64,6 +59,43 @@ class AnyEntity(Entity):
             else:
                 break
 
+    @classmethod
+    def cw_fti_index_rql_eids(cls, req, eids, limit=1000):
+        """generate rsets of entities to FT-index among `eids`, with their
+        indexable attributes
+
+        By default, each successive result set is limited to 1000 entities.
+        Eids are given as query arguments, their number being padded to the
+        next power of 10 (or `limit`) so that only a few distinct queries end
+        up in the RQL cache.
+        """
+        selected, restrictions = cls._cw_fti_index_rql_parts()
+        eids = sorted(eids)
+        for i in range(0, len(eids), limit):
+            batch = eids[i:i + limit]
+            size = 1
+            while size < len(batch):
+                size = min(size * 10, limit)
+            batch += batch[-1:] * (size - len(batch))
+            args = dict(('e%s' % j, eid) for j, eid in enumerate(batch))
+            q_restrictions = restrictions + [
+                'X eid IN (%s)' % ', '.join('%%(e%s)s' % j for j in range(size))]
+            rset = req.execute('Any %s WHERE %s' % (', '.join(selected),
+                                                    ', '.join(q_restrictions)),
+                               args)
+            if rset:
+                yield rset
+
+    @classmethod
+    def _cw_fti_index_rql_parts(cls):
+        restrictions = ['X is %s' % cls.__regid__]
+        selected = ['X']
+        for attrschema in sorted(cls.e_schema.indexable_attributes()):
+            varname = attrschema.type.upper()
+            restrictions.append('X %s %s' % (attrschema, varname))
+            selected.append(varname)
+        return selected, restrictions
+
     # meta data api ###########################################################
 
     def dc_title(self):
@@ -161,6 +161,11 @@ class Entity(AppObject):
        that should be skipped when copying this kind of entity. Note that some
        relations such as composite relations or relations that have '?1' as
        object cardinality are always skipped.
+
+    :type cw_complete_siblings: bool
+    :cvar cw_complete_siblings: if true, :meth:`complete` will by default
+       complete all entities of the same type found in the same column of the
+       entity's result set at once (see :meth:`ResultSet.prefetch`).
     """
     __registry__ = 'etypes'
     __select__ = yes()
@@ -169,6 +174,7 @@ class Entity(AppObject):
     rest_attr = None
     fetch_attrs = None
     cw_skip_copy_for = [('in_state', 'subject')]
+    cw_complete_siblings = False
     # class attributes set automatically at registration time
     e_schema = None
 
@@ -789,17 +795,32 @@ class Entity(AppObject):
             yield attr
 
     _cw_completed = False
-    def complete(self, attributes=None, skip_bytes=True, skip_pwd=True): # XXX cw_complete
+    def complete(self, attributes=None, skip_bytes=True, skip_pwd=True, # XXX cw_complete
+                 siblings=None):
         """complete this entity by adding missing attributes (i.e. query the
         repository to fill the entity)
 
         :type skip_bytes: bool
         :param skip_bytes:
           if true, attribute of type Bytes won't be considered
+
+        :type siblings: bool
+        :param siblings:
+          if true, entities of the same type in the same column of the
+          entity's result set are completed at once. Default to the
+          `cw_complete_siblings` class attribute.
         """
         assert self.has_eid()
         if self._cw_completed:
             return
+        if siblings is None:
+            siblings = self.cw_complete_siblings
+        if siblings and self.cw_rset is not None and self.cw_rset.req is not None:
+            self.cw_rset.prefetch(self.cw_col, attributes=attributes,
+                                  etypes=(self.cw_etype,),
+                                  skip_bytes=skip_bytes, skip_pwd=skip_pwd)
+            if self._cw_completed:
+                return
         if attributes is None:
             self._cw_completed = True
         varmaker = rqlvar_maker()
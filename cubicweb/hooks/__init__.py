@@ -22,6 +22,7 @@
 from datetime import timedelta, datetime
 
 from cubicweb.server import hook
+from cubicweb.statsd_logger import statsd_g
 
 class TransactionsCleanupStartupHook(hook.Hook):
     """start task to cleanup transaction data"""
@@ -88,3 +89,52 @@ class DataImportsCleanupStartupHook(hook.Hook):
                                     {'time': mindate})
                     cnx.commit()
         self.repo.looping_task(60*60*24, expire_dataimports, self.repo)
+
+
+class DeferredFTIStartupHook(hook.Hook):
+    """start task to index entities recorded in the deferred full-text
+    indexation queue"""
+    __regid__ = 'cw.looping-tasks.deferred-fti'
+    events = ('server_startup',)
+
+    def __call__(self):
+        if not self.repo.has_scheduler():
+            return
+        source = self.repo.system_source
+        if not (source.do_fti and source.fti_deferred):
+            return
+        batch_size = self.repo.config['deferred-full-text-indexation-batch-size']
+        def index_queued_entities(repo=self.repo, batch_size=batch_size):
+            source = repo.system_source
+            with repo.internal_cnx() as cnx:
+                while True:
+                    nb_indexed = source.fti_index_queued(cnx, batch_size)
+                    cnx.commit()
+                    if nb_indexed < batch_size:
+                        break
+                length, lag = source.fti_queue_stats(cnx)
+            statsd_g('fti_queue_length', length)
+            statsd_g('fti_queue_lag', lag)
+        self.repo.looping_task(
+            self.repo.config['deferred-full-text-indexation-interval'],
+            index_queued_entities, self.repo)
+
+
+class MailQueueStartupHook(hook.Hook):
+    """start task to send mails spooled in the mail queue"""
+    __regid__ = 'cw.looping-tasks.mail-queue'
+    events = ('server_startup',)
+
+    def __call__(self):
+        if not self.repo.has_scheduler():
+            return
+        if self.repo.mail_outbox is None:
+            return
+        def send_queued_mails(repo=self.repo):
+            outbox = repo.mail_outbox
+            outbox.send_queued()
+            length, lag = outbox.stats()
+            statsd_g('mail_queue_length', length)
+            statsd_g('mail_queue_lag', lag)
+        self.repo.looping_task(self.repo.config['mail-queue-interval'],
+                               send_queued_mails, self.repo)
@@ -114,11 +114,13 @@ class _EnsureSymmetricRelationsAdd(hook.Hook):
     __abstract__ = True
     category = 'activeintegrity'
     events = ('after_add_relation',)
+    bulk = True
     # __select__ is set in the registration callback
 
     def __call__(self):
-        self._cw.repo.system_source.add_relation(self._cw, self.eidto,
-                                                 self.rtype, self.eidfrom)
+        self._cw.repo.system_source.add_relations(
+            self._cw, self.rtype,
+            [(eidto, eidfrom) for eidfrom, eidto in self.eids_from_to])
 
 
 class _EnsureSymmetricRelationsDelete(hook.Hook):
@@ -127,32 +129,36 @@ class _EnsureSymmetricRelationsDelete(hook.Hook):
     __abstract__ = True
     category = 'activeintegrity'
     events = ('after_delete_relation',)
+    bulk = True
     # __select__ is set in the registration callback
 
     def __call__(self):
-        self._cw.repo.system_source.delete_relation(self._cw, self.eidto,
-                                                    self.rtype, self.eidfrom)
+        delete_relation = self._cw.repo.system_source.delete_relation
+        for eidfrom, eidto in self.eids_from_to:
+            delete_relation(self._cw, eidto, self.rtype, eidfrom)
 
 
 class CheckCardinalityHookBeforeDeleteRelation(IntegrityHook):
     """check cardinalities are satisfied"""
     __regid__ = 'checkcard_before_delete_relation'
     events = ('before_delete_relation',)
+    bulk = True
 
     def __call__(self):
         rtype = self.rtype
         if rtype in DONT_CHECK_RTYPES_ON_DEL:
             return
         cnx = self._cw
-        eidfrom, eidto = self.eidfrom, self.eidto
-        rdef = cnx.rtype_eids_rdef(rtype, eidfrom, eidto)
-        if (rdef.subject, rtype, rdef.object) in cnx.transaction_data.get('pendingrdefs', ()):
-            return
-        card = rdef.cardinality
-        if card[0] in '1+' and not cnx.deleted_in_transaction(eidfrom):
-            _CheckSRelationOp.get_instance(cnx).add_data((eidfrom, rtype))
-        if card[1] in '1+' and not cnx.deleted_in_transaction(eidto):
-            _CheckORelationOp.get_instance(cnx).add_data((eidto, rtype))
+        pendingrdefs = cnx.transaction_data.get('pendingrdefs', ())
+        for eidfrom, eidto in self.eids_from_to:
+            rdef = cnx.rtype_eids_rdef(rtype, eidfrom, eidto)
+            if (rdef.subject, rtype, rdef.object) in pendingrdefs:
+                continue
+            card = rdef.cardinality
+            if card[0] in '1+' and not cnx.deleted_in_transaction(eidfrom):
+                _CheckSRelationOp.get_instance(cnx).add_data((eidfrom, rtype))
+            if card[1] in '1+' and not cnx.deleted_in_transaction(eidto):
+                _CheckORelationOp.get_instance(cnx).add_data((eidto, rtype))
 
 
 class CheckCardinalityHookAfterAddEntity(IntegrityHook):
@@ -211,14 +217,17 @@ class CheckConstraintHook(IntegrityHook):
     """
     __regid__ = 'checkconstraint'
     events = ('after_add_relation',)
+    bulk = True
 
     def __call__(self):
-        # XXX get only RQL[Unique]Constraints?
-        rdef = self._cw.rtype_eids_rdef(self.rtype, self.eidfrom, self.eidto)
-        constraints = rdef.constraints
-        if constraints:
-            _CheckConstraintsOp.get_instance(self._cw).add_data(
-                (self.eidfrom, self.rtype, self.eidto, constraints))
+        cnx, rtype = self._cw, self.rtype
+        for eidfrom, eidto in self.eids_from_to:
+            # XXX get only RQL[Unique]Constraints?
+            rdef = cnx.rtype_eids_rdef(rtype, eidfrom, eidto)
+            constraints = rdef.constraints
+            if constraints:
+                _CheckConstraintsOp.get_instance(cnx).add_data(
+                    (eidfrom, rtype, eidto, constraints))
 
 
 class CheckAttributeConstraintHook(IntegrityHook):
@@ -247,16 +256,17 @@ class DontRemoveOwnersGroupHook(IntegrityHook):
     __regid__ = 'checkownersgroup'
     __select__ = IntegrityHook.__select__ & is_instance('CWGroup')
     events = ('before_delete_entity', 'before_update_entity')
+    bulk = True
 
     def __call__(self):
-        entity = self.entity
-        if self.event == 'before_delete_entity' and entity.name == 'owners':
-            raise validation_error(entity, {None: _("can't be deleted")})
-        elif self.event == 'before_update_entity' \
-                 and 'name' in entity.cw_edited:
-            oldname, newname = entity.cw_edited.oldnewvalue('name')
-            if oldname == 'owners' and newname != oldname:
-                raise validation_error(entity, {('name', 'subject'): _("can't be changed")})
+        for entity in self.entities:
+            if self.event == 'before_delete_entity' and entity.name == 'owners':
+                raise validation_error(entity, {None: _("can't be deleted")})
+            elif self.event == 'before_update_entity' \
+                     and 'name' in entity.cw_edited:
+                oldname, newname = entity.cw_edited.oldnewvalue('name')
+                if oldname == 'owners' and newname != oldname:
+                    raise validation_error(entity, {('name', 'subject'): _("can't be changed")})
 
 
 class TidyHtmlFields(IntegrityHook):
@@ -302,15 +312,17 @@ class DeleteCompositeOrphanHook(hook.Hook):
     category = 'activeintegrity'
     # give the application's before_delete_entity hooks a chance to run before we cascade
     order = 99
+    bulk = True
 
     def __call__(self):
-        eid = self.entity.eid
-        for rdef, role in self.entity.e_schema.composite_rdef_roles:
+        for rdef, role in self.entities[0].e_schema.composite_rdef_roles:
             rtype = rdef.rtype.type
             target = getattr(rdef, neg_role(role))
             expr = ('C %s X' % rtype) if role == 'subject' else ('X %s C' % rtype)
-            self._cw.execute('DELETE %s X WHERE C eid %%(c)s, %s' % (target, expr),
-                             {'c': eid})
+            # one query per entity, so that its plan is cached once for all
+            rql = 'DELETE %s X WHERE C eid %%(c)s, %s' % (target, expr)
+            for entity in self.entities:
+                self._cw.execute(rql, {'c': entity.eid})
 
 
 def registration_callback(vreg):
@@ -107,17 +107,19 @@ class SyncCompositeOwner(MetaDataHook):
     """
     __regid__ = 'synccompositeowner'
     events = ('after_add_relation',)
+    bulk = True
 
     def __call__(self):
         if self.rtype == 'wf_info_for':
             # skip this special composite relation # XXX (syt) why?
             return
-        eidfrom, eidto = self.eidfrom, self.eidto
-        composite = self._cw.rtype_eids_rdef(self.rtype, eidfrom, eidto).composite
-        if composite == 'subject':
-            SyncOwnersOp.get_instance(self._cw).add_data( (eidfrom, eidto) )
-        elif composite == 'object':
-            SyncOwnersOp.get_instance(self._cw).add_data( (eidto, eidfrom) )
+        cnx = self._cw
+        for eidfrom, eidto in self.eids_from_to:
+            composite = cnx.rtype_eids_rdef(self.rtype, eidfrom, eidto).composite
+            if composite == 'subject':
+                SyncOwnersOp.get_instance(cnx).add_data( (eidfrom, eidto) )
+            elif composite == 'object':
+                SyncOwnersOp.get_instance(cnx).add_data( (eidto, eidfrom) )
 
 
 class FixUserOwnershipHook(MetaDataHook):
@@ -136,14 +138,17 @@ class UpdateFTIHook(MetaDataHook):
     """
     __regid__ = 'updateftirel'
     events = ('after_add_relation', 'after_delete_relation')
+    bulk = True
 
     def __call__(self):
         rtype = self.rtype
         cnx = self._cw
         ftcontainer = cnx.vreg.schema.rschema(rtype).fulltext_container
         if ftcontainer == 'subject':
-            cnx.repo.system_source.index_entity(
-                cnx, cnx.entity_from_eid(self.eidfrom))
+            eids = [eidfrom for eidfrom, eidto in self.eids_from_to]
         elif ftcontainer == 'object':
-            cnx.repo.system_source.index_entity(
-                cnx, cnx.entity_from_eid(self.eidto))
+            eids = [eidto for eidfrom, eidto in self.eids_from_to]
+        else:
+            return
+        for eid in eids:
+            cnx.repo.system_source.index_entity(cnx, cnx.entity_from_eid(eid))
@@ -120,17 +120,19 @@ class RelationChangeHook(NotificationHook):
     __regid__ = 'notifyrelationchange'
     events = ('before_add_relation', 'after_add_relation',
               'before_delete_relation', 'after_delete_relation')
+    bulk = True
 
     def __call__(self):
         """if a notification view is defined for the event, send notification
         email defined by the view
         """
-        rset = self._cw.eid_rset(self.eidfrom)
-        view = self.select_view('notif_%s_%s' % (self.event,  self.rtype),
-                                rset=rset, row=0)
-        if view is None:
-            return
-        notify_on_commit(self._cw, view)
+        for eidfrom, eidto in self.eids_from_to:
+            rset = self._cw.eid_rset(eidfrom)
+            view = self.select_view('notif_%s_%s' % (self.event,  self.rtype),
+                                    rset=rset, row=0)
+            if view is None:
+                continue
+            notify_on_commit(self._cw, view)
 
 
 class EntityChangeHook(NotificationHook):
@@ -203,12 +205,21 @@ class SomethingChangedHook(NotificationHook):
     __select__ = NotificationHook.__select__ & hook.issued_from_user_query()
     events = ('before_add_relation', 'before_delete_relation',
               'after_add_entity', 'before_update_entity')
+    bulk = True
 
     def __call__(self):
         dest = self._cw.vreg.config['supervising-addrs']
         if not dest: # no supervisors, don't do this for nothing...
             return
-        if self._call():
+        # changes are recorded using one hook instance per entity / relation
+        if self.entities is not None:
+            hooks = [self.__class__(self._cw, self.event, entity=entity)
+                     for entity in self.entities]
+        else:
+            hooks = [self.__class__(self._cw, self.event, rtype=self.rtype,
+                                    eidfrom=eidfrom, eidto=eidto)
+                     for eidfrom, eidto in self.eids_from_to]
+        if [hook for hook in hooks if hook._call()]:
             SupervisionMailOp(self._cw)
 
     def _call(self):
@@ -0,0 +1,65 @@
+# copyright 2026 LOGILAB S.A. (Paris, FRANCE), all rights reserved.
+# contact http://www.logilab.fr/ -- mailto:contact@logilab.fr
+#
+# This file is part of CubicWeb.
+#
+# CubicWeb is free software: you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# CubicWeb is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License along
+# with CubicWeb.  If not, see <http://www.gnu.org/licenses/>.
+"""hooks invalidating the server-side render cache of views"""
+
+
+
+from cubicweb.server import hook
+
+
+class InvalidateRenderCacheOp(hook.DataOperationMixIn, hook.Operation):
+    """drop rendered views depending on modified entities once the transaction
+    is committed
+    """
+    rcache = None # make pylint happy
+
+    def postcommit_event(self):
+        self.rcache.invalidate(self.get_data())
+
+
+def invalidate_render_cache(cnx, eids):
+    """drop rendered views depending on entities of `eids` on commit"""
+    # the render cache only exists if it has been used by some view
+    rcache = getattr(cnx.vreg, '_render_cache', None)
+    if rcache is not None:
+        InvalidateRenderCacheOp.get_instance(cnx, rcache=rcache).union(eids)
+
+
+class RenderCacheHook(hook.Hook):
+    __abstract__ = True
+    category = 'rendercache'
+    bulk = True
+
+    def invalidate(self, eids):
+        invalidate_render_cache(self._cw, eids)
+
+
+class InvalidateEntityRenderCacheHook(RenderCacheHook):
+    __regid__ = 'rendercache.entity'
+    events = ('after_update_entity', 'after_delete_entity')
+
+    def __call__(self):
+        self.invalidate(set(entity.eid for entity in self.entities))
+
+
+class InvalidateRelationRenderCacheHook(RenderCacheHook):
+    __regid__ = 'rendercache.relation'
+    events = ('after_add_relation', 'after_delete_relation')
+
+    def __call__(self):
+        self.invalidate(set(eid for eids in self.eids_from_to for eid in eids))
@@ -124,9 +124,11 @@ class AfterUpdateEntitySecurityHook(SecurityHook):
 class BeforeDelEntitySecurityHook(SecurityHook):
     __regid__ = 'securitybeforedelentity'
     events = ('before_delete_entity',)
+    bulk = True
 
     def __call__(self):
-        self.entity.cw_check_perm('delete')
+        for entity in self.entities:
+            entity.cw_check_perm('delete')
 
 
 def skip_inlined_relation_security(cnx, rschema, eid):
@@ -148,55 +150,64 @@ def skip_inlined_relation_security(cnx, rschema, eid):
 class BeforeAddRelationSecurityHook(SecurityHook):
     __regid__ = 'securitybeforeaddrelation'
     events = ('before_add_relation',)
+    bulk = True
 
     def __call__(self):
         if self.rtype in BEFORE_ADD_RELATIONS:
-            nocheck = self._cw.transaction_data.get('skip-security', ())
-            if (self.eidfrom, self.rtype, self.eidto) in nocheck:
-                return
-            rschema = self._cw.repo.schema[self.rtype]
-            if rschema.inlined and skip_inlined_relation_security(
-                    self._cw, rschema, self.eidfrom):
-                return
-            rdef = rschema.rdef(self._cw.entity_type(self.eidfrom),
-                                self._cw.entity_type(self.eidto))
-            rdef.check_perm(self._cw, 'add', fromeid=self.eidfrom, toeid=self.eidto)
+            cnx = self._cw
+            nocheck = cnx.transaction_data.get('skip-security', ())
+            rschema = cnx.repo.schema[self.rtype]
+            for eidfrom, eidto in self.eids_from_to:
+                if (eidfrom, self.rtype, eidto) in nocheck:
+                    continue
+                if rschema.inlined and skip_inlined_relation_security(
+                        cnx, rschema, eidfrom):
+                    continue
+                rdef = rschema.rdef(cnx.entity_type(eidfrom),
+                                    cnx.entity_type(eidto))
+                rdef.check_perm(cnx, 'add', fromeid=eidfrom, toeid=eidto)
 
 
 class AfterAddRelationSecurityHook(SecurityHook):
     __regid__ = 'securityafteraddrelation'
     events = ('after_add_relation',)
+    bulk = True
 
     def __call__(self):
         if self.rtype not in BEFORE_ADD_RELATIONS:
-            nocheck = self._cw.transaction_data.get('skip-security', ())
-            if (self.eidfrom, self.rtype, self.eidto) in nocheck:
-                return
-            rschema = self._cw.repo.schema[self.rtype]
-            if rschema.inlined and skip_inlined_relation_security(
-                    self._cw, rschema, self.eidfrom):
-                return
-            if self.rtype in ON_COMMIT_ADD_RELATIONS:
-                CheckRelationPermissionOp.get_instance(self._cw).add_data(
-                    ('add', rschema, self.eidfrom, self.eidto) )
-            else:
-                rdef = rschema.rdef(self._cw.entity_type(self.eidfrom),
-                                    self._cw.entity_type(self.eidto))
-                rdef.check_perm(self._cw, 'add', fromeid=self.eidfrom, toeid=self.eidto)
+            cnx = self._cw
+            nocheck = cnx.transaction_data.get('skip-security', ())
+            rschema = cnx.repo.schema[self.rtype]
+            for eidfrom, eidto in self.eids_from_to:
+                if (eidfrom, self.rtype, eidto) in nocheck:
+                    continue
+                if rschema.inlined and skip_inlined_relation_security(
+                        cnx, rschema, eidfrom):
+                    continue
+                if self.rtype in ON_COMMIT_ADD_RELATIONS:
+                    CheckRelationPermissionOp.get_instance(cnx).add_data(
+                        ('add', rschema, eidfrom, eidto) )
+                else:
+                    rdef = rschema.rdef(cnx.entity_type(eidfrom),
+                                        cnx.entity_type(eidto))
+                    rdef.check_perm(cnx, 'add', fromeid=eidfrom, toeid=eidto)
 
 
 class BeforeDeleteRelationSecurityHook(SecurityHook):
     __regid__ = 'securitybeforedelrelation'
     events = ('before_delete_relation',)
+    bulk = True
 
     def __call__(self):
-        nocheck = self._cw.transaction_data.get('skip-security', ())
-        if (self.eidfrom, self.rtype, self.eidto) in nocheck:
-            return
-        rschema = self._cw.repo.schema[self.rtype]
-        if rschema.inlined and skip_inlined_relation_security(
-                self._cw, rschema, self.eidfrom):
-            return
-        rdef = rschema.rdef(self._cw.entity_type(self.eidfrom),
-                            self._cw.entity_type(self.eidto))
-        rdef.check_perm(self._cw, 'delete', fromeid=self.eidfrom, toeid=self.eidto)
+        cnx = self._cw
+        nocheck = cnx.transaction_data.get('skip-security', ())
+        rschema = cnx.repo.schema[self.rtype]
+        for eidfrom, eidto in self.eids_from_to:
+            if (eidfrom, self.rtype, eidto) in nocheck:
+                continue
+            if rschema.inlined and skip_inlined_relation_security(
+                    cnx, rschema, eidfrom):
+                continue
+            rdef = rschema.rdef(cnx.entity_type(eidfrom),
+                                cnx.entity_type(eidto))
+            rdef.check_perm(cnx, 'delete', fromeid=eidfrom, toeid=eidto)
@@ -19,16 +19,26 @@
 
 
 from collections import defaultdict
+from datetime import datetime
+
+from pytz import utc
 
 from rql import nodes
 
 from cubicweb.server import hook
+from cubicweb.hooks.rendercache import invalidate_render_cache
 
 
 class RecomputeAttributeOperation(hook.DataOperationMixIn, hook.Operation):
     """Operation to recompute caches of computed attribute at commit time,
     depending on what's have been modified in the transaction and avoiding to
-    recompute twice the same attribute
+    recompute twice the same attribute.
+
+    When possible, the attribute is recomputed for all entities at once by SQL
+    queries, without calling update hooks nor recording undo information,
+    else (e.g. if some hooks not from cubicweb are registered on update of the
+    entity type, see :func:`_bulk_update_allowed`) each entity is updated by a
+    RQL query.
     """
     containercls = dict
 
@@ -40,19 +50,112 @@ class RecomputeAttributeOperation(hook.DataOperationMixIn, hook.Operation):
 
     def precommit_event(self):
         for computed_attribute_rdef, eids in self.get_data().items():
-            attr = computed_attribute_rdef.rtype
-            formula = computed_attribute_rdef.formula
-            select = self.cnx.repo.vreg.rqlhelper.parse(formula).children[0]
-            xvar = select.get_variable('X')
-            select.add_selected(xvar, index=0)
-            select.add_group_var(xvar, index=0)
             if None in eids:
-                select.add_type_restriction(xvar, computed_attribute_rdef.subject)
-            else:
-                select.add_eid_restriction(xvar, eids)
-            update_rql = 'SET X %s %%(value)s WHERE X eid %%(x)s' % attr
-            for eid, value in self.cnx.execute(select.as_string()):
-                self.cnx.execute(update_rql, {'value': value, 'x': eid})
+                eids = None
+            if not (_bulk_update_allowed(self.cnx, computed_attribute_rdef)
+                    and self.bulk_recompute(computed_attribute_rdef, eids)):
+                self.recompute(computed_attribute_rdef, eids)
+
+    def recompute(self, computed_attribute_rdef, eids):
+        """recompute the attribute using RQL queries, one per entity"""
+        attr = computed_attribute_rdef.rtype
+        formula = computed_attribute_rdef.formula
+        select = self.cnx.repo.vreg.rqlhelper.parse(formula).children[0]
+        xvar = select.get_variable('X')
+        select.add_selected(xvar, index=0)
+        select.add_group_var(xvar, index=0)
+        if eids is None:
+            select.add_type_restriction(xvar, computed_attribute_rdef.subject)
+        else:
+            select.add_eid_restriction(xvar, eids)
+        update_rql = 'SET X %s %%(value)s WHERE X eid %%(x)s' % attr
+        for eid, value in self.cnx.execute(select.as_string()):
+            self.cnx.execute(update_rql, {'value': value, 'x': eid})
+
+    def bulk_recompute(self, computed_attribute_rdef, eids):
+        """recompute the attribute using a single SQL query, then do what hooks
+        would have done on update of modified entities. Return False if this
+        is not supported.
+        """
+        cnx = self.cnx
+        source = cnx.repo.system_source
+        if cnx.vreg.config.repairing:
+            mdate = None
+        else:
+            mdate = datetime.now(utc)
+        modified = source.update_computed_attribute(
+            cnx, computed_attribute_rdef, eids, modification_date=mdate)
+        if modified is None:
+            return False
+        if not modified:
+            return True
+        etype = str(computed_attribute_rdef.subject)
+        attr = str(computed_attribute_rdef.rtype)
+        for eid in modified:
+            try:
+                cnx.entity_cache(eid).cw_clear_all_caches()
+            except KeyError:
+                pass
+        # computed attributes depending on this one, as done by
+        # AttributeInvolvedInCAModifiedHook
+        registry = cnx.vreg.get('after_update_entity_hooks', {})
+        hooks = registry.get('computed_attribute.%s_updated' % etype, ())
+        for hookcls in hooks:
+            for rdef, used_attributes in hookcls.attributes_computed_attributes.items():
+                if attr in used_attributes:
+                    RecomputeAttributeOperation.get_instance(cnx).add_data(rdef)
+        if getattr(computed_attribute_rdef, 'fulltextindexed', False):
+            for eid in modified:
+                source.index_entity(cnx, cnx.entity_from_eid(eid, etype))
+        invalidate_render_cache(cnx, modified)
+        return True
+
+
+# modules of update hooks whose job is done by
+# RecomputeAttributeOperation.bulk_recompute
+BULK_UPDATE_HOOKS_MODULES = frozenset((
+    'cubicweb.hooks.integrity',
+    'cubicweb.hooks.metadata',
+    'cubicweb.hooks.rendercache',
+    'cubicweb.hooks.security',
+    'cubicweb.hooks.synccomputed',
+))
+
+
+def _bulk_update_allowed(cnx, rdef):
+    """return True if the computed attribute `rdef` may be updated without
+    calling update hooks nor recording undo information: it has no
+    constraints to check, its entity type doesn't support undo, and only
+    hooks whose job is done by
+    :meth:`RecomputeAttributeOperation.bulk_recompute` or notification hooks
+    which wouldn't notify anything are registered on update of its entity type
+    """
+    etype = str(rdef.subject)
+    if rdef.constraints or cnx.ertype_supports_undo(etype):
+        return False
+    entity = cnx.vreg['etypes'].etype_class(etype)(cnx)
+    for event in ('before_update_entity', 'after_update_entity'):
+        registry = cnx.vreg.get('%s_hooks' % event)
+        if registry is None:
+            continue
+        pruned = registry.get_pruned_hooks(cnx, event, [entity], [], {})
+        for hooks in registry.values():
+            for hookcls in hooks:
+                if hookcls in pruned or hookcls.__module__ in BULK_UPDATE_HOOKS_MODULES:
+                    continue
+                if hookcls.__module__ == 'cubicweb.hooks.notification' \
+                   and not _notifies_update(cnx):
+                    continue
+                return False
+    return True
+
+
+def _notifies_update(cnx):
+    """return True if notification hooks may send some notification on update
+    of an entity
+    """
+    return bool(cnx.vreg.config['supervising-addrs']
+                or 'notif_after_update_entity' in cnx.vreg.get('views', ()))
 
 
 class EntityWithCACreatedHook(hook.Hook):
@@ -82,6 +185,8 @@ class RelationInvolvedInCAModifiedHook(hook.Hook):
     """
     __abstract__ = True
     events = ('after_add_relation', 'before_delete_relation')
+    # not a bulk hook: it's selected according to the relation's subject and
+    # object types, which may differ among relations of a batch
     # list of (computed attribute rdef, optimize_on) that have to be recomputed
     optimized_computed_attributes = None
 
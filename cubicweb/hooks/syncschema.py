@@ -199,6 +199,11 @@ class MemSchemaNotifyChanges(hook.SingleLastOperation):
         hook.SingleLastOperation.__init__(self, cnx)
 
     def precommit_event(self):
+        self.clear_schema_caches()
+        # outdate snapshots of the schema
+        self.cnx.repo.system_source.incr_schema_version(self.cnx)
+
+    def clear_schema_caches(self):
         for eschema in self.cnx.repo.schema.entities():
             if not eschema.final:
                 clear_cache(eschema, 'ordered_relations')
@@ -222,7 +227,7 @@ class MemSchemaNotifyChanges(hook.SingleLastOperation):
             self.critical('error while setting schema', exc_info=True)
 
     def rollback_event(self):
-        self.precommit_event()
+        self.clear_schema_caches()
 
 
 class MemSchemaOperation(hook.Operation):
@@ -46,3 +46,14 @@ class mirror_of(RelationDefinition):
     object = ('Agent', 'Societe')
     cardinality = '?*'
     inlined = True
+
+
+class Team(EntityType):
+    nb_members = Int(formula='Any COUNT(P) GROUPBY X WHERE P works_on X')
+
+class Project(EntityType):
+    name = String()
+
+class works_on(RelationDefinition):
+    subject = 'Person'
+    object = ('Team', 'Project')
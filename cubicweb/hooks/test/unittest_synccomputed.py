@@ -17,12 +17,16 @@
 # with CubicWeb.  If not, see <http://www.gnu.org/licenses/>.
 """unit tests for computed attributes/relations hooks"""
 
-from unittest import TestCase
+from unittest import TestCase, mock
+
+from logilab.common import tempattr
 
 from yams.buildobjs import EntityType, String, Int, SubjectRelation
 
 from cubicweb.devtools.testlib import CubicWebTC
 from cubicweb.schema import build_schema_from_namespace
+from cubicweb.server import hook
+from cubicweb.hooks.synccomputed import RecomputeAttributeOperation, _bulk_update_allowed
 
 
 class FormulaDependenciesMatrixTC(TestCase):
@@ -140,6 +144,112 @@ class ComputedAttributeTC(CubicWebTC):
             societe = cnx.create_entity('Societe', nom=u'Foo')
             cnx.create_entity('MirrorEntity', mirror_of=societe, extid=u'1')
             cnx.commit()
+    def test_recompute_on_mixed_types_relations(self):
+        """check computed attributes are recomputed when relations added at once
+        have different object types"""
+        with self.admin_access.repo_cnx() as cnx:
+            person = cnx.create_entity('Person', name=u'Toto', birth_year=1990)
+            team = cnx.create_entity('Team')
+            project = cnx.create_entity('Project', name=u'Pouet')
+            cnx.commit()
+            # the hook isn't selected for the first relation of the batch
+            cnx.add_relations([('works_on', [(person.eid, project.eid),
+                                             (person.eid, team.eid)])])
+            cnx.commit()
+            rset = cnx.execute('Any N WHERE X nb_members N, X eid %(x)s',
+                               {'x': team.eid})
+            self.assertEqual(rset[0][0], 1)
+
+    def test_bulk_recompute(self):
+        """check computed attributes are recomputed by a single query when no
+        third party hook is registered"""
+        def recompute(self, computed_attribute_rdef, eids):
+            raise AssertionError('should be recomputed in bulk')
+        with tempattr(RecomputeAttributeOperation, 'recompute', recompute):
+            with self.admin_access.client_cnx() as cnx:
+                for i in range(20):
+                    cnx.create_entity('Person', name=u'P%s' % i,
+                                      birth_year=1990 + i)
+                cnx.commit()
+                rset = cnx.execute('Any A, D WHERE X age A, X birth_year D')
+                self.assertEqual(len(rset), 20)
+                for age, birth_year in rset:
+                    self.assertEqual(age, 2014 - birth_year)
+
+    def test_bulk_recompute_batches(self):
+        """check the formula is restricted to eids of modified entities, which
+        are handled by batches"""
+        source = self.repo.system_source
+        with self.admin_access.repo_cnx() as cnx:
+            rdef = self.schema['Person'].rdef('age')
+            sql = source.computed_attribute_sql(cnx, rdef, restricted=True)
+            self.assertIn('%(e0)s', sql)
+            self.assertIn('%%(e%s)s' % (source.computed_attribute_batch_size - 1), sql)
+        with tempattr(source, 'computed_attribute_batch_size', 3):
+            source._computed_attributes_sql.clear()
+            try:
+                with self.admin_access.repo_cnx() as cnx:
+                    for i in range(7):
+                        cnx.create_entity('Person', name=u'P%s' % i,
+                                          birth_year=1990 + i)
+                    cnx.commit()
+                    rset = cnx.execute('Any A, D WHERE X age A, X birth_year D')
+                    self.assertEqual(len(rset), 7)
+                    for age, birth_year in rset:
+                        self.assertEqual(age, 2014 - birth_year)
+            finally:
+                source._computed_attributes_sql.clear()
+
+    def test_recompute_old_sqlite(self):
+        """check RQL queries are used with sqlite < 3.35, which doesn't support
+        UPDATE ... FROM nor RETURNING"""
+        recomputed = []
+
+        def recompute(self, computed_attribute_rdef, eids):
+            recomputed.append(str(computed_attribute_rdef.rtype))
+            return recompute.orig(self, computed_attribute_rdef, eids)
+
+        recompute.orig = RecomputeAttributeOperation.recompute
+        with tempattr(RecomputeAttributeOperation, 'recompute', recompute), \
+                mock.patch('sqlite3.sqlite_version_info', (3, 34, 1)):
+            with self.admin_access.repo_cnx() as cnx:
+                cnx.create_entity('Person', name=u'Tata', birth_year=1990)
+                cnx.commit()
+                self.assertEqual(recomputed, ['age'])
+                rset = cnx.execute('Any A WHERE X age A, X name "Tata"')
+                self.assertEqual(rset[0][0], 2014 - 1990)
+
+    def test_recompute_undoable(self):
+        """check update hooks are called when the entity type supports undo"""
+        with self.admin_access.repo_cnx() as cnx:
+            with tempattr(cnx, 'undo_actions', True):
+                self.assertFalse(_bulk_update_allowed(
+                    cnx, self.schema['Person'].rdef('age')))
+            self.assertTrue(_bulk_update_allowed(
+                cnx, self.schema['Person'].rdef('age')))
+
+    def test_recompute_with_update_hooks(self):
+        """check update hooks are called when some third party hook is
+        registered on update of the entity type"""
+        updated = []
+
+        class PersonUpdatedHook(hook.Hook):
+            __regid__ = 'test.person_updated'
+            __select__ = hook.Hook.__select__ & hook.is_instance('Person')
+            events = ('after_update_entity',)
+
+            def __call__(self):
+                updated.append(self.entity.eid)
+
+        with self.temporary_appobjects(PersonUpdatedHook):
+            with self.admin_access.client_cnx() as cnx:
+                eid = cnx.create_entity('Person', name=u'Tata',
+                                        birth_year=1990).eid
+                cnx.commit()
+                self.assertEqual(updated, [eid])
+                rset = cnx.execute('Any A WHERE X age A, X eid %(x)s', {'x': eid})
+                self.assertEqual(rset[0][0], 2014 - 1990)
+
 
 if __name__ == '__main__':
     from logilab.common.testlib import unittest_main
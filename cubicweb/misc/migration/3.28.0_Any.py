@@ -0,0 +1,12 @@
+from uuid import uuid4
+
+# table of the deferred full-text indexation queue
+sql('CREATE TABLE fti_queue (eid INTEGER NOT NULL, queued %s NOT NULL)'
+    % repo.system_source.dbhelper.TYPE_MAPPING['Datetime'])
+sql('CREATE INDEX fti_queue_eid_idx ON fti_queue(eid)')
+commit()
+
+# table of the schema-change counter, keying schema snapshots
+sql('CREATE TABLE schema_version (version INTEGER NOT NULL, uuid CHAR(32) NOT NULL)')
+sql("INSERT INTO schema_version (version, uuid) VALUES (0, '%s')" % uuid4().hex)
+commit()
@@ -0,0 +1,177 @@
+# copyright 2026 LOGILAB S.A. (Paris, FRANCE), all rights reserved.
+# contact http://www.logilab.fr/ -- mailto:contact@logilab.fr
+#
+# This file is part of CubicWeb.
+#
+# CubicWeb is free software: you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# CubicWeb is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License along
+# with CubicWeb.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Serve a WSGI application from worker processes forked from a master process
+where the repository has been fully initialized.
+
+Registry, schema and caches loaded by the master process are then shared
+copy-on-write by worker processes, which only open their own connections to the
+database. To keep shared memory pages from being written by the garbage
+collector, the garbage collector should be disabled in the master process
+before the repository is initialized: objects existing when workers are forked
+are then moved to the permanent generation (see :func:`gc.freeze`), and the
+garbage collector enabled again in workers.
+"""
+
+import gc
+import logging
+import os
+import signal
+import socket
+import time
+
+log = logging.getLogger(__name__)
+
+
+def process_memory(pid='self'):
+    """return a dictionary giving in kB the resident memory of process `pid`
+    ('rss'), its proportional share of memory shared with other processes
+    ('pss'), and memory shared with ('shared') or private to it ('private'), or
+    None if this information isn't available (on non Linux systems)
+    """
+    try:
+        with open('/proc/%s/smaps_rollup' % pid) as stream:
+            lines = stream.readlines()
+    except OSError:
+        return None
+    values = {}
+    for line in lines:
+        parts = line.split()
+        if len(parts) == 3 and parts[2] == 'kB':
+            values[parts[0].rstrip(':')] = int(parts[1])
+    return {
+        'rss': values.get('Rss', 0),
+        'pss': values.get('Pss', 0),
+        'shared': values.get('Shared_Clean', 0) + values.get('Shared_Dirty', 0),
+        'private': values.get('Private_Clean', 0) + values.get('Private_Dirty', 0),
+    }
+
+
+def format_memory(memory):
+    if memory is None:
+        return 'unknown memory usage'
+    return ', '.join('%s %.1fMB' % (key, memory[key] / 1024.)
+                     for key in ('rss', 'pss', 'shared', 'private'))
+
+
+class PreforkServer(object):
+    """Serve `app` from `workers` processes forked from the current one.
+
+    :param repo: the repository `app` is bound to, already bootstrapped
+    :param serve: function serving a WSGI application given as first argument
+                  on a listening socket given by the `sockets` keyword argument,
+                  until it's interrupted
+    :param respawn_delay: minimal delay in seconds between two forks of a
+                          worker, so that a worker failing on startup isn't
+                          forked in a loop
+    """
+
+    def __init__(self, app, repo, host, port, workers, serve, respawn_delay=1):
+        self.app = app
+        self.repo = repo
+        self.host = host
+        self.port = port
+        self.nb_workers = workers
+        self.serve = serve
+        self.respawn_delay = respawn_delay
+        self.workers = {}  # pid: (index, fork time)
+        self.stopping = False
+        self.socket = None
+
+    def run(self):
+        """fork worker processes and respawn them until the master process is
+        stopped by SIGINT or SIGTERM
+        """
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((self.host, self.port))
+        self.socket.listen(1024)
+        self.repo.prepare_fork()
+        gc.collect()
+        gc.freeze()
+        log.info('master process %s forking %s workers, %s',
+                 os.getpid(), self.nb_workers, format_memory(process_memory()))
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        signal.signal(signal.SIGUSR1, self._report)
+        for index in range(self.nb_workers):
+            self.spawn(index)
+        try:
+            while self.workers:
+                try:
+                    pid, status = os.wait()
+                except ChildProcessError:
+                    break
+                index, forked = self.workers.pop(pid)
+                if self.stopping:
+                    continue
+                log.warning('worker %s exited with status %s, respawning it',
+                            pid, status)
+                time.sleep(max(0, forked + self.respawn_delay - time.time()))
+                if not self.stopping:
+                    self.spawn(index)
+        finally:
+            self.socket.close()
+
+    def spawn(self, index):
+        """fork worker number `index`"""
+        forked = time.time()
+        pid = os.fork()
+        if pid:
+            self.workers[pid] = (index, forked)
+            return
+        # worker process
+        status = 0
+        try:
+            # on ^C, workers are stopped by the master process
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.signal(signal.SIGUSR1, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, _raise_systemexit)
+            self.repo.after_fork()
+            gc.enable()
+            log.info('worker %s (%s) started in %.3fs, %s', index, os.getpid(),
+                     time.time() - forked, format_memory(process_memory()))
+            try:
+                self.serve(self.app, sockets=[self.socket])
+            finally:
+                self.repo.shutdown()
+        except (SystemExit, KeyboardInterrupt):
+            pass
+        except BaseException:
+            log.exception('worker %s (%s) failed', index, os.getpid())
+            status = 1
+        finally:
+            os._exit(status)
+
+    def _stop(self, signum, frame):
+        self.stopping = True
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+
+    def _report(self, signum, frame):
+        for pid, (index, forked) in sorted(self.workers.items(),
+                                           key=lambda item: item[1]):
+            log.info('worker %s (%s): %s', index, pid,
+                     format_memory(process_memory(pid)))
+
+
+def _raise_systemexit(signum, frame):
+    raise SystemExit
@@ -25,6 +25,7 @@ The reloading strategy is heavily inspired by (and partially copied from)
 the pyramid script 'pserve'.
 """
 
+import gc
 import os
 import signal
 import sys
@@ -37,6 +38,7 @@ from logilab.common.configuration import merge_options
 from cubicweb.cwctl import CWCTL, InstanceCommand, init_cmdline_log_threshold
 from cubicweb.pyramid import wsgi_application_from_cwconfig
 from cubicweb.pyramid.config import get_random_secret_key
+from cubicweb.pyramid.prefork import PreforkServer
 from cubicweb.view import inject_html_generating_call_on_w
 from cubicweb.server import serverctl
 from cubicweb.web.webctl import WebCreateHandler
@@ -124,6 +126,13 @@ class PyramidStartHandler(InstanceCommand):
           'metavar': 'N',
           'help': 'Dump profile stats to ouput every N requests '
                   '(default: 100)'}),
+        ('workers',
+         {'short': 'w', 'type': 'int', 'default': 1,
+          'help': 'number of worker processes serving requests. When greater '
+                  'than 1, the repository is initialized once by a master '
+                  'process, then shared by worker processes forked from it. '
+                  'Send SIGUSR1 to the master process to log memory usage of '
+                  'workers.'}),
         ('param',
          {'short': 'p',
           'type': 'named',
@@ -243,6 +252,11 @@ class PyramidStartHandler(InstanceCommand):
         if not os.path.exists(pyramid_ini_path):
             _generate_pyramid_ini_file(pyramid_ini_path)
 
+        if autoreload and self['workers'] > 1:
+            print('Error: --reload and --debug can not be used with several '
+                  'worker processes.')
+            return 1
+
         if autoreload and not os.environ.get(self._reloader_environ_key):
             return self.restart_with_reloader(filelist_path)
 
@@ -277,6 +291,17 @@ class PyramidStartHandler(InstanceCommand):
             # > cubicweb-generated-by="module.Class" cubicweb-from-source="/path/to/file.py:42"
             inject_html_generating_call_on_w()
 
+        if self['workers'] > 1:
+            # keep the garbage collector from touching objects shared by worker
+            # processes, it will be enabled again in them
+            gc.disable()
+            if cwconfig.get('render-cache-size'):
+                # the render cache is invalidated by changes committed by the
+                # process holding it, not by those of other workers
+                print('Warning: render cache disabled, since it is local to '
+                      'each worker process')
+                cwconfig.global_set_option('render-cache-size', 0)
+        started = time.time()
         app = wsgi_application_from_cwconfig(
             cwconfig, profile=self['profile'],
             profile_output=self['profile-output'],
@@ -289,6 +314,15 @@ class PyramidStartHandler(InstanceCommand):
         url_scheme = ('https' if cwconfig['base-url'].startswith('https')
                       else 'http')
         repo = app.application.registry['cubicweb.repository']
+        if self['workers'] > 1:
+            self.info('instance initialized in %.2fs' % (time.time() - started))
+
+            def serve(app, sockets):
+                waitress.serve(app, sockets=sockets, url_scheme=url_scheme,
+                               clear_untrusted_proxy_headers=True)
+            PreforkServer(app, repo, host or '0.0.0.0', port, self['workers'],
+                          serve).run()
+            return 0
         try:
             waitress.serve(app, host=host, port=port, url_scheme=url_scheme,
                            clear_untrusted_proxy_headers=True)
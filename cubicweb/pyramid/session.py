@@ -29,6 +29,25 @@ solution.
 However, for production systems, it is greatly advised to use such a
 storage solution for the sessions.
 
+The storage of session data is delegated to a :class:`SessionStore`, which may
+be chosen using the ``cubicweb.session.store`` setting:
+
+:entity: (default) store data in ``CWSession`` entities, using RQL,
+
+:sql: store data in a dedicated ``cw_session_data`` table of the system
+   database, using plain SQL upserts (bypassing RQL and hooks),
+
+:memory: store data in an in-process LRU cache, holding at most
+   ``cubicweb.session.store.maxsize`` sessions (default to 10000). Data are
+   lost on restart and not shared between processes,
+
+:file: store data as one file per session in the
+   ``cubicweb.session.store.directory`` directory, which suits single-host
+   deployments.
+
+Whatever the store, session data are only written back when they actually
+changed.
+
 The handling of the sessions is made by pyramid (see the
 `pyramid's documentation on sessions`_ for more details).
 
@@ -85,7 +104,14 @@ For the record, regarding session handling:
 """
 
 import logging
+import os
+import os.path as osp
+import re
+import tempfile
+import threading
+from collections import OrderedDict
 from contextlib import contextmanager
+from datetime import datetime
 
 from pyramid.compat import pickle
 from pyramid.session import SignedCookieSessionFactory, JSONSerializer, PickleSerializer
@@ -94,6 +120,7 @@ from cubicweb import (
     Binary,
     UnknownEid,
 )
+from cubicweb.utils import make_uid
 
 
 log = logging.getLogger(__name__)
@@ -146,6 +173,175 @@ class JSONSerializerWithPickleFallback(object):
             return self.pickle.loads(value)
 
 
+class SessionStore(object):
+    """Base class for storages of pickled session data, identified by a key
+    which is kept in the session cookie.
+    """
+
+    def load(self, request, key):
+        """Return pickled data stored for `key`, or None if there are none"""
+        raise NotImplementedError()
+
+    def save(self, request, key, data):
+        """Store pickled `data` for `key` and return the key, which is a newly
+        created one if `key` is None or unknown to the store.
+        """
+        raise NotImplementedError()
+
+
+class EntitySessionStore(SessionStore):
+    """Store session data in ``CWSession`` entities, the session key being the
+    entity's eid.
+    """
+
+    def load(self, request, key):
+        if not isinstance(key, int):
+            return None
+        with unsafe_cnx_context_manager(request) as cnx:
+            rset = cnx.execute('Any D WHERE X eid %(x)s, X cwsessiondata D',
+                               {'x': key})
+            if not rset or rset[0][0] is None:
+                return None
+            return rset[0][0].getvalue()
+
+    def save(self, request, key, data):
+        data = Binary(data)
+        with request.registry['cubicweb.repository'].internal_cnx() as cnx:
+            if not isinstance(key, int):
+                key = cnx.create_entity('CWSession', cwsessiondata=data).eid
+            else:
+                try:
+                    session = cnx.entity_from_eid(key)
+                except UnknownEid:
+                    # Might occur if CWSession entity got dropped (e.g.
+                    # the whole db got recreated) while user's cookie is
+                    # still valid. We recreate the CWSession in this case.
+                    key = cnx.create_entity('CWSession', cwsessiondata=data).eid
+                else:
+                    session.cw_set(cwsessiondata=data)
+            cnx.commit()
+        return key
+
+
+class SQLSessionStore(SessionStore):
+    """Store session data in the ``cw_session_data`` table of the system
+    database, which is created on first use.
+    """
+    table = 'cw_session_data'
+
+    def __init__(self):
+        self._table_created = False
+
+    def _create_table(self, repo):
+        source = repo.system_source
+        with repo.internal_cnx() as cnx:
+            cnx.system_sql(
+                'CREATE TABLE IF NOT EXISTS %s ('
+                'sessionid VARCHAR(64) PRIMARY KEY NOT NULL, '
+                'data %s NOT NULL, '
+                'modified %s NOT NULL)' % (
+                    self.table, source.dbhelper.TYPE_MAPPING['Bytes'],
+                    source.dbhelper.TYPE_MAPPING['Datetime']))
+            cnx.commit()
+        self._table_created = True
+
+    def load(self, request, key):
+        repo = request.registry['cubicweb.repository']
+        if not self._table_created:
+            self._create_table(repo)
+        with unsafe_cnx_context_manager(request) as cnx:
+            cu = cnx.system_sql('SELECT data FROM %s WHERE sessionid=%%(key)s'
+                                % self.table, {'key': str(key)})
+            row = cu.fetchone()
+        if row is None:
+            return None
+        return repo.system_source.binary_to_str(row[0])
+
+    def save(self, request, key, data):
+        repo = request.registry['cubicweb.repository']
+        if not self._table_created:
+            self._create_table(repo)
+        key = str(key) if key else make_uid()
+        with repo.internal_cnx() as cnx:
+            cnx.system_sql(
+                'INSERT INTO {0}(sessionid, data, modified) '
+                'VALUES (%(key)s, %(data)s, %(modified)s) '
+                'ON CONFLICT (sessionid) DO UPDATE '
+                'SET data=EXCLUDED.data, modified=EXCLUDED.modified'.format(self.table),
+                {'key': key, 'data': repo.system_source._binary(data),
+                 'modified': datetime.utcnow()})
+            cnx.commit()
+        return key
+
+
+class MemorySessionStore(SessionStore):
+    """Store session data in memory, keeping at most the `maxsize` most
+    recently used sessions.
+    """
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, request, key):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return None
+            return self._data[key]
+
+    def save(self, request, key, data):
+        if not key:
+            key = make_uid()
+        with self._lock:
+            self._data[key] = data
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return key
+
+
+class FileSessionStore(SessionStore):
+    """Store session data as one file per session in `directory`."""
+    _key_rgx = re.compile('^[0-9a-f]{32}$')
+
+    def __init__(self, directory):
+        self.directory = directory
+        if not osp.isdir(directory):
+            os.makedirs(directory)
+
+    def _path(self, key):
+        if not self._key_rgx.match(str(key)):
+            return None
+        return osp.join(self.directory, key)
+
+    def load(self, request, key):
+        path = self._path(key)
+        if path is None:
+            return None
+        try:
+            with open(path, 'rb') as stream:
+                return stream.read()
+        except FileNotFoundError:
+            return None
+
+    def save(self, request, key, data):
+        if not key or self._path(key) is None:
+            key = make_uid()
+        # write then rename so that readers never see partial data
+        fd, tmppath = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as stream:
+                stream.write(data)
+            os.replace(tmppath, self._path(key))
+        except Exception:
+            os.unlink(tmppath)
+            raise
+        return key
+
+
 def CWSessionFactory(
         secret,
         cookie_name='session',
@@ -159,22 +355,22 @@ def CWSessionFactory(
         reissue_time=120,
         hashalg='sha512',
         salt='pyramid.session.',
-        serializer=None):
-    """ A pyramid session factory that store session data in the CubicWeb
-    database.
+        serializer=None,
+        store=None):
+    """ A pyramid session factory that store session data using a
+    :class:`SessionStore`.
 
-    Storage is done with the 'CWSession' entity, which is provided by the
-    'pyramid' cube.
+    By default, storage is done in the CubicWeb database with the 'CWSession'
+    entity (see :class:`EntitySessionStore`).
 
     .. warning::
 
         Although it provides a sane default behavior, this session storage has
         a serious overhead because it uses RQL to access the database.
 
-        Using pure SQL would improve a bit (it is roughly twice faster), but it
-        is still pretty slow and thus not an immediate priority.
-
-        It is recommended to use faster session factory
+        :class:`SQLSessionStore` is roughly twice faster, and
+        :class:`MemorySessionStore` or :class:`FileSessionStore` avoid database
+        accesses, but it is recommended to use faster session factory
         (pyramid_redis_sessions_ for example) if you need speed.
 
     .. _pyramid_redis_sessions: http://pyramid-redis-sessions.readthedocs.org/
@@ -196,6 +392,9 @@ def CWSessionFactory(
         salt=salt,
         serializer=serializer if serializer else JSONSerializerWithPickleFallback())
 
+    if store is None:
+        store = EntitySessionStore()
+
     class CWSession(SignedCookieSession):
         def __init__(self, request):
             # _set_accessed will be called by the super __init__.
@@ -213,6 +412,9 @@ def CWSessionFactory(
             # We need to lazy-load only for existing sessions
             self._loaded = self.sessioneid is None
 
+        # pickled session data as loaded from the store, used to detect changes
+        _stored_data = None
+
         @logerrors(log)
         def _set_accessed(self, value):
             self._accessed = value
@@ -220,14 +422,12 @@ def CWSessionFactory(
             if self._loaded:
                 return
 
-            with unsafe_cnx_context_manager(self.request) as cnx:
-                value_rset = cnx.execute('Any D WHERE X eid %(x)s, X cwsessiondata D',
-                                         {'x': self.sessioneid})
-                value = value_rset[0][0]
-                if value:
-                    # Use directly dict.update to avoir _set_accessed to be
-                    # recursively called
-                    dict.update(self, pickle.load(value))
+            data = store.load(self.request, self.sessioneid)
+            if data:
+                # Use directly dict.update to avoir _set_accessed to be
+                # recursively called
+                dict.update(self, pickle.loads(data))
+                self._stored_data = data
 
             self._loaded = True
 
@@ -238,30 +438,16 @@ def CWSessionFactory(
 
         @logerrors(log)
         def _set_cookie(self, response):
-            # Save the value in the database
-            data = Binary(pickle.dumps(dict(self)))
+            # Save the value in the store, unless it didn't change
+            data = pickle.dumps(dict(self))
             sessioneid = self.sessioneid
-
-            with self.request.registry['cubicweb.repository'].internal_cnx() as cnx:
-                if not sessioneid:
-                    session = cnx.create_entity(
-                        'CWSession', cwsessiondata=data)
-                    sessioneid = session.eid
-                else:
-                    try:
-                        session = cnx.entity_from_eid(sessioneid)
-                    except UnknownEid:
-                        # Might occur if CWSession entity got dropped (e.g.
-                        # the whole db got recreated) while user's cookie is
-                        # still valid. We recreate the CWSession in this case.
-                        sessioneid = cnx.create_entity(
-                            'CWSession', cwsessiondata=data).eid
-                    else:
-                        session.cw_set(cwsessiondata=data)
-                cnx.commit()
+            if not sessioneid or data != self._stored_data:
+                sessioneid = store.save(self.request, sessioneid, data)
+                self._stored_data = data
 
             # Only if needed actually set the cookie
-            if self.new or self.accessed - self.renewed > self._reissue_time:
+            if (self.new or sessioneid != self.sessioneid
+                    or self.accessed - self.renewed > self._reissue_time):
                 dict.clear(self)
                 dict.__setitem__(self, 'sessioneid', sessioneid)
                 return super(CWSession, self)._set_cookie(response)
@@ -278,6 +464,19 @@ def includeme(config):
 
     See also :ref:`defaults_module`
     """
-    secret = config.registry.settings['cubicweb.session.secret']
-    session_factory = CWSessionFactory(secret)
+    settings = config.registry.settings
+    secret = settings['cubicweb.session.secret']
+    store = settings.get('cubicweb.session.store', 'entity')
+    if store == 'entity':
+        store = EntitySessionStore()
+    elif store == 'sql':
+        store = SQLSessionStore()
+    elif store == 'memory':
+        store = MemorySessionStore(
+            int(settings.get('cubicweb.session.store.maxsize', 10000)))
+    elif store == 'file':
+        store = FileSessionStore(settings['cubicweb.session.store.directory'])
+    else:
+        raise ValueError('unknown session store %r' % store)
+    session_factory = CWSessionFactory(secret, store=store)
     config.set_session_factory(session_factory)
@@ -0,0 +1,81 @@
+import os
+import shutil
+import signal
+import tempfile
+import threading
+import time
+import unittest
+
+from cubicweb.pyramid import prefork
+
+
+class FakeRepo(object):
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.events = []
+
+    def prepare_fork(self):
+        self.events.append('prepare_fork')
+
+    def after_fork(self):
+        self.record('after_fork')
+
+    def shutdown(self):
+        self.record('shutdown')
+
+    def record(self, event):
+        # events of worker processes are recorded in files
+        with open(os.path.join(self.directory, str(os.getpid())), 'a') as stream:
+            stream.write(event + '\n')
+
+
+class PreforkServerTest(unittest.TestCase):
+
+    def test_process_memory(self):
+        memory = prefork.process_memory()
+        if memory is None:
+            self.skipTest('memory usage not available')
+        self.assertGreater(memory['rss'], 0)
+        self.assertIn('rss', prefork.format_memory(memory))
+
+    def test_run(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        repo = FakeRepo(directory)
+
+        def serve(app, sockets):
+            repo.record('serve %s' % app)
+            signal.pause()
+
+        def stop_when_serving():
+            # stop the master process once both workers are serving
+            for i in range(100):
+                time.sleep(0.1)
+                serving = 0
+                for fname in os.listdir(directory):
+                    with open(os.path.join(directory, fname)) as stream:
+                        serving += 'serve' in stream.read()
+                if serving == 2:
+                    break
+            os.kill(os.getpid(), signal.SIGTERM)
+
+        previous = signal.getsignal(signal.SIGTERM)
+        try:
+            server = prefork.PreforkServer('app', repo, '127.0.0.1', 0, 2, serve)
+            threading.Thread(target=stop_when_serving).start()
+            server.run()
+        finally:
+            signal.signal(signal.SIGTERM, previous)
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+            signal.signal(signal.SIGUSR1, signal.SIG_DFL)
+        self.assertEqual(repo.events, ['prepare_fork'])
+        self.assertEqual(server.workers, {})
+        self.assertEqual(len(os.listdir(directory)), 2)
+        for fname in os.listdir(directory):
+            with open(os.path.join(directory, fname)) as stream:
+                self.assertEqual(stream.read().split('\n'),
+                                 ['after_fork', 'serve app', 'shutdown', ''])
+
+if __name__ == '__main__':
+    unittest.main()
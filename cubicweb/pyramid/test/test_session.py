@@ -0,0 +1,154 @@
+import shutil
+import tempfile
+from unittest import TestCase
+
+from cubicweb.pyramid.session import (
+    CWSessionFactory,
+    EntitySessionStore,
+    FileSessionStore,
+    MemorySessionStore,
+    SQLSessionStore,
+)
+from cubicweb.pyramid.test import PyramidCWTest
+
+
+def set_value(request):
+    request.session['value'] = request.params['value']
+    request.response.body = b'OK'
+    return request.response
+
+
+def get_value(request):
+    request.response.text = request.session.get('value', u'<none>')
+    return request.response
+
+
+class CountingStoreMixin(object):
+
+    def __init__(self, *args, **kwargs):
+        super(CountingStoreMixin, self).__init__(*args, **kwargs)
+        self.saved = []
+
+    def save(self, request, key, data):
+        key = super(CountingStoreMixin, self).save(request, key, data)
+        self.saved.append(key)
+        return key
+
+
+class MemorySessionStoreTC(TestCase):
+
+    def test_lru(self):
+        store = MemorySessionStore(maxsize=2)
+        key1 = store.save(None, None, b'1')
+        key2 = store.save(None, None, b'2')
+        self.assertEqual(store.load(None, key1), b'1')
+        key3 = store.save(None, None, b'3')
+        # key2 is the least recently used one
+        self.assertIsNone(store.load(None, key2))
+        self.assertEqual(store.load(None, key1), b'1')
+        self.assertEqual(store.load(None, key3), b'3')
+        self.assertEqual(store.save(None, key1, b'4'), key1)
+        self.assertEqual(store.load(None, key1), b'4')
+
+
+class FileSessionStoreTC(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_load_save(self):
+        store = FileSessionStore(self.directory)
+        key = store.save(None, None, b'data')
+        self.assertEqual(store.load(None, key), b'data')
+        self.assertEqual(store.save(None, key, b'other'), key)
+        self.assertEqual(store.load(None, key), b'other')
+        self.assertIsNone(store.load(None, 'f' * 32))
+
+    def test_bad_key(self):
+        store = FileSessionStore(self.directory)
+        self.assertIsNone(store.load(None, '../../etc/passwd'))
+        key = store.save(None, '../data', b'data')
+        self.assertNotEqual(key, '../data')
+        self.assertEqual(store.load(None, key), b'data')
+
+
+class SessionStoreTCMixin(object):
+    """Functional tests, to be mixed with a `store_class` attribute."""
+
+    def store_factory(self):
+        return type('CountingStore', (CountingStoreMixin, self.store_class), {})()
+
+    def includeme(self, config):
+        self.store = self.store_factory()
+        config.set_session_factory(CWSessionFactory('test', store=self.store))
+        config.add_route('set_value', '/set_value')
+        config.add_view(set_value, route_name='set_value')
+        config.add_route('get_value', '/get_value')
+        config.add_view(get_value, route_name='get_value')
+
+    def test_session_data(self):
+        self.webapp.get('/set_value', {'value': 'hello'})
+        self.assertEqual(len(self.store.saved), 1)
+        res = self.webapp.get('/get_value')
+        self.assertEqual(res.text, 'hello')
+        self.webapp.get('/set_value', {'value': 'world'})
+        self.assertEqual(len(self.store.saved), 2)
+        self.assertEqual(len(set(self.store.saved)), 1)
+        res = self.webapp.get('/get_value')
+        self.assertEqual(res.text, 'world')
+
+    def test_unchanged_data(self):
+        self.webapp.get('/set_value', {'value': 'hello'})
+        self.assertEqual(len(self.store.saved), 1)
+        # setting the same value again doesn't write the session data
+        self.webapp.get('/set_value', {'value': 'hello'})
+        self.assertEqual(len(self.store.saved), 1)
+        res = self.webapp.get('/get_value')
+        self.assertEqual(res.text, 'hello')
+
+
+class EntitySessionStoreTC(SessionStoreTCMixin, PyramidCWTest):
+    store_class = EntitySessionStore
+
+    def test_session_data(self):
+        super(EntitySessionStoreTC, self).test_session_data()
+        with self.admin_access.repo_cnx() as cnx:
+            self.assertEqual(len(cnx.find('CWSession')), 1)
+
+
+class SQLSessionStoreTC(SessionStoreTCMixin, PyramidCWTest):
+    store_class = SQLSessionStore
+
+    def test_session_data(self):
+        super(SQLSessionStoreTC, self).test_session_data()
+        with self.admin_access.repo_cnx() as cnx:
+            cu = cnx.system_sql('SELECT sessionid FROM cw_session_data')
+            self.assertEqual([row[0] for row in cu.fetchall()], self.store.saved[:1])
+
+
+class MemorySessionStoreFunctionalTC(SessionStoreTCMixin, PyramidCWTest):
+    store_class = MemorySessionStore
+
+
+class FileSessionStoreFunctionalTC(SessionStoreTCMixin, PyramidCWTest):
+    store_class = FileSessionStore
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        super(FileSessionStoreFunctionalTC, self).setUp()
+
+    def tearDown(self):
+        super(FileSessionStoreFunctionalTC, self).tearDown()
+        shutil.rmtree(self.directory)
+
+    def store_factory(self):
+        return type('CountingStore', (CountingStoreMixin, self.store_class),
+                    {})(self.directory)
+
+
+if __name__ == '__main__':
+    from unittest import main
+    main()
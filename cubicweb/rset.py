@@ -22,6 +22,9 @@ from rql import nodes, stmts
 
 from cubicweb import NotAnEntity, NoResultError, MultipleResultsError, UnknownEid
 
+# maximum number of eids given in a single `X eid IN (...)` prefetch query
+PREFETCH_CHUNK_SIZE = 500
+
 
 class ResultSet(object):
     """A result set wraps a RQL query result. This object implements
@@ -389,6 +392,139 @@ class ResultSet(object):
                     _row.append(col)
             yield _row
 
+    def prefetch(self, col=0, attributes=None, relations=(), etypes=None,
+                 skip_bytes=True, skip_pwd=True):
+        """fetch attributes and relations of all entities in the `col` column
+        of the result set using one query per entity type (and per relation),
+        instead of one query per entity as done by `Entity.complete` and
+        `Entity.related`.
+
+        :type attributes: list or None
+        :param attributes:
+          names of the attributes to fetch. If None, entities are fully
+          completed, as `Entity.complete()` would do.
+
+        :type relations: list
+        :param relations:
+          list of (relation type, role) couples whose related entities should
+          be fetched and put in entities' relation cache.
+
+        :type etypes: list or None
+        :param etypes: only prefetch entities of the given types
+        """
+        byetype = {}
+        for i in range(len(self)):
+            # may have None values in case of outer join
+            if self.rows[i][col] is None:
+                continue
+            if etypes is not None and self.description[i][col] not in etypes:
+                continue
+            entity = self.get_entity(i, col)
+            byetype.setdefault(entity.cw_etype, {})[entity.eid] = entity
+        for entities in byetype.values():
+            entities = list(entities.values())
+            for idx in range(0, len(entities), PREFETCH_CHUNK_SIZE):
+                chunk = entities[idx:idx + PREFETCH_CHUNK_SIZE]
+                self._prefetch_attributes(chunk, attributes, skip_bytes, skip_pwd)
+                for rtype, role in relations:
+                    self._prefetch_relation(chunk, rtype, role)
+
+    def _prefetch_attributes(self, entities, attributes, skip_bytes, skip_pwd):
+        """complete the given entities, which should all be of the same type"""
+        eschema = entities[0].e_schema
+        if attributes is None:
+            entities = [entity for entity in entities
+                        if not entity._cw_completed]
+            if not entities:
+                return
+            attrs = list(entities[0]._cw_to_complete_attributes(skip_bytes, skip_pwd))
+            # _cw_to_complete_attributes caches None for attributes which
+            # can't be read, which only depends on the entity type: do the
+            # same for other entities
+            unreadable = [rschema.type for rschema, attrschema
+                          in eschema.attribute_definitions()
+                          if rschema.type not in attrs and rschema.type != 'eid'
+                          and not (skip_bytes and attrschema.type == 'Bytes')]
+            for entity in entities[1:]:
+                for attr in unreadable:
+                    entity.cw_attr_cache[attr] = None
+            relations = [(rschema.type, role) for rschema, role
+                         in entities[0]._cw_to_complete_relations()]
+        else:
+            attrs = [attr for attr in attributes
+                     if eschema.has_relation(attr, 'subject')]
+            relations = []
+        attrs = [attr for attr in attrs
+                 if any(attr not in entity.cw_attr_cache for entity in entities)]
+        relations = [(rtype, role) for rtype, role in relations
+                     if any(not entity.cw_relation_cached(rtype, role)
+                            for entity in entities)]
+        completed = entities
+        if attrs or relations:
+            restrictions = ['X eid IN (%s)' % ','.join(str(entity.eid)
+                                                       for entity in entities)]
+            for i, attr in enumerate(attrs):
+                restrictions.append('X %s A%s' % (attr, i))
+            for i, (rtype, role) in enumerate(relations):
+                assert role == 'subject'
+                # keep outer join anyway, see Entity.complete
+                restrictions.append('X %s R%s?' % (rtype, i))
+            selection = (['X'] + ['A%s' % i for i in range(len(attrs))]
+                         + ['R%s' % i for i in range(len(relations))])
+            rql = 'Any %s WHERE %s' % (','.join(selection), ', '.join(restrictions))
+            rows = dict((row[0], row) for row in self.req.execute(rql, build_descr=False))
+            # entities may have been deleted in the meantime or not be readable,
+            # let the entity's own methods deal with them
+            completed = [entity for entity in entities if entity.eid in rows]
+            for entity in completed:
+                row = rows[entity.eid]
+                for i, attr in enumerate(attrs, 1):
+                    entity.cw_attr_cache.setdefault(attr, row[i])
+                for i, (rtype, role) in enumerate(relations, len(attrs) + 1):
+                    if entity.cw_relation_cached(rtype, role):
+                        continue
+                    value = row[i]
+                    if value is None:
+                        rrset = ResultSet([], rql)
+                        rrset.req = self.req
+                    else:
+                        rrset = self.req.eid_rset(value)
+                    entity.cw_set_relation_cache(rtype, role, rrset)
+        if attributes is None:
+            for entity in completed:
+                entity._cw_completed = True
+
+    def _prefetch_relation(self, entities, rtype, role):
+        """fill the relation cache of the given entities, which should all be
+        of the same type, for the given relation
+        """
+        entities = [entity for entity in entities
+                    if not entity.cw_relation_cached(rtype, role)]
+        if not entities:
+            return
+        # use the query that would be used by Entity.related, modified to
+        # select the entity along with related entities
+        select = entities[0].cw_related_rqlst(rtype, role)
+        related_rql = select.as_string()
+        evar = select.defined_vars['E']
+        for rel in select.where.iget_nodes(nodes.Relation):
+            if rel.r_type == 'eid' and rel.children[0].variable is evar:
+                select.remove_node(rel)
+                break
+        select.add_eid_restriction(evar, [entity.eid for entity in entities])
+        select.add_selected(evar, 0)
+        rset = self.req.execute(select.as_string())
+        rows = {}
+        for row, descr in zip(rset.rows, rset.description):
+            eid_rows = rows.setdefault(row[0], ([], []))
+            eid_rows[0].append(row[1:])
+            eid_rows[1].append(descr[1:])
+        for entity in entities:
+            erows, edescr = rows.get(entity.eid, ([], []))
+            rrset = ResultSet(erows, related_rql, {'x': entity.eid}, edescr)
+            rrset.req = self.req
+            entity.cw_set_relation_cache(rtype, role, rrset)
+
     def complete_entity(self, row, col=0, skip_bytes=True):
         """short cut to get an completed entity instance for a particular
         row (all instance's attributes have been fetched)
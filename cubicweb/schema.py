@@ -257,10 +257,15 @@ class RQLExpression(object):
         return self.__class__(self.expression, self.mainvars)
 
     def __getstate__(self):
-        return (self.expression, self.mainvars)
+        # syntax trees and caches are rebuilt on unpickling
+        return dict((attr, value) for attr, value in self.__dict__.items()
+                    if not attr.startswith('_')
+                    and attr not in ('snippet_rqlst', 'vargraph', 'rqlst'))
 
     def __setstate__(self, state):
-        self.__init__(*state)
+        self.__dict__.update(state)
+        self.snippet_rqlst = self._cached_parse(self.minimal_rql)
+        self.vargraph = vargraph(self.snippet_rqlst)
 
     @cachedproperty
     def rqlst(self):
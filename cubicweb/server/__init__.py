@@ -253,7 +253,8 @@ def init_repository(config, interactive=True, drop=False, vreg=None,
             print('The following SQL statements failed. You should check your schema.')
             print(failed)
             raise Exception('execution of the sql schema failed, you should check your schema')
-        sqlcursor.close()
+        # don't close the cursor, it belongs to the connections set which is
+        # given back to the pool and handed out again below
         sqlcnx.commit()
     with repo.internal_cnx() as cnx:
         # insert entity representing the system source
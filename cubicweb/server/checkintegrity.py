@@ -21,13 +21,17 @@
   checked.
 """
 
+import multiprocessing
+import queue
 import sys
+import traceback
 from datetime import datetime
 
 from logilab.common.shellutils import ProgressBar
 
 from yams.constraints import UniqueConstraint
 
+from cubicweb import ExecutionError
 from cubicweb.toolsutils import underline_title
 from cubicweb.schema import PURE_VIRTUAL_RTYPES, VIRTUAL_RTYPES, UNIQUE_CONSTRAINTS
 from cubicweb.server.sqlutils import SQL_PREFIX
@@ -89,6 +93,20 @@ def etype_fti_containers(eschema, _done=None):
         yield eschema
 
 
+def fti_etypes(schema):
+    """return the set of entity types schemas holding some full-text index"""
+    etypes = set()
+    for eschema in schema.entities():
+        if eschema.final:
+            continue
+        indexable_attrs = tuple(eschema.indexable_attributes()) # generator
+        if not indexable_attrs:
+            continue
+        for container in etype_fti_containers(eschema):
+            etypes.add(container)
+    return etypes
+
+
 def reindex_entities(schema, cnx, withpb=True, etypes=None):
     """reindex all entities in the repository"""
     # deactivate modification_date hook since we don't want them
@@ -102,15 +120,7 @@ def reindex_entities(schema, cnx, withpb=True, etypes=None):
     repo.system_source.do_fti = True  # ensure full-text indexation is activated
     if etypes is None:
         print('Reindexing entities')
-        etypes = set()
-        for eschema in schema.entities():
-            if eschema.final:
-                continue
-            indexable_attrs = tuple(eschema.indexable_attributes()) # generator
-            if not indexable_attrs:
-                continue
-            for container in etype_fti_containers(eschema):
-                etypes.add(container)
+        etypes = fti_etypes(schema)
         # clear fti table first
         cnx.system_sql('DELETE FROM %s' % dbhelper.fti_table)
     else:
@@ -139,6 +149,286 @@ def reindex_entities(schema, cnx, withpb=True, etypes=None):
         pb.finish()
 
 
+def rebuild_fti(schema, cnx, etypes=None, nb_workers=1, resume=False,
+                batch_size=1000, withpb=True):
+    """rebuild the full-text index (postgres only), keeping the current one
+    in use meanwhile.
+
+    Entities are indexed into a shadow table, by batches of `batch_size`
+    entities, which is swapped with the full-text index table once complete.
+    Meanwhile, a trigger records entities whose index is modified in the
+    current full-text index table, so that their index is taken from this table
+    before the swap.
+
+    Progress is recorded after each batch, so an interrupted rebuild may be
+    resumed using `resume`, in which case `etypes` is ignored. Otherwise, or if
+    what is left by the interrupted rebuild is incomplete, it is discarded and
+    a new rebuild is started. It may also be discarded using
+    :func:`abort_fti_rebuild`. Entity types are indexed by `nb_workers`
+    processes.
+    """
+    repo = cnx.repo
+    source = repo.system_source
+    if source.dbdriver != 'postgres':
+        raise ExecutionError('full-text index may only be rebuilt in a shadow '
+                             'table with postgres')
+    dbhelper = source.dbhelper
+    cursor = cnx.cnxset.cu
+    if not dbhelper.has_fti_table(cursor):
+        print('no text index table')
+        dbhelper.init_fti(cursor)
+    source.do_fti = True  # ensure full-text indexation is activated
+    fti_table = dbhelper.fti_table
+    shadow_table = fti_table + '_rebuild'
+    leftovers = _fti_rebuild_leftovers(cnx, fti_table, shadow_table)
+    # a rebuild may only be resumed if its 3 tables, trigger and function exist
+    if resume and len(leftovers) < 5:
+        if leftovers:
+            print('Interrupted full-text index rebuild is incomplete (only %s '
+                  'left), starting a new one' % ', '.join(leftovers))
+        else:
+            print('No full-text index rebuild to resume, starting a new one')
+        resume = False
+    elif not resume and leftovers:
+        print('Discarding interrupted full-text index rebuild')
+    if not resume:
+        if etypes is None:
+            etypes = fti_etypes(schema)
+        etypes = sorted(str(etype) for etype in etypes)
+        _fti_rebuild_init(cnx, fti_table, shadow_table, etypes,
+                          partial=etypes != sorted(map(str, fti_etypes(schema))))
+    pending = [etype for etype, in cnx.system_sql(
+        'SELECT etype FROM cw_fti_rebuild WHERE NOT done').fetchall()]
+    # index larger entity types first, for a better balance between workers
+    counts = dict(cnx.system_sql('SELECT type, COUNT(*) FROM entities '
+                                 'GROUP BY type').fetchall())
+    pending.sort(key=lambda etype: counts.get(etype, 0), reverse=True)
+    print('Rebuilding full-text index of entities of type %s'
+          % ', '.join(sorted(pending)))
+    if withpb:
+        pb = ProgressBar(len(pending) + 1)
+        pb.update()
+    else:
+        pb = None
+    if nb_workers > 1 and len(pending) > 1:
+        cnx.commit()
+        _fti_rebuild_parallel(repo, pending, shadow_table, nb_workers,
+                              batch_size, pb)
+    else:
+        for etype in pending:
+            _fti_rebuild_etype(cnx, etype, shadow_table, batch_size)
+            if pb is not None:
+                pb.update()
+    _fti_rebuild_swap(cnx, fti_table, shadow_table)
+    if pb is not None:
+        pb.finish()
+
+
+def abort_fti_rebuild(cnx):
+    """discard an interrupted full-text index rebuild (postgres only): drop the
+    trigger recording modifications of the full-text index, its function, the
+    shadow table and the progress tables. Return whether anything was left by
+    a rebuild.
+    """
+    fti_table = cnx.repo.system_source.dbhelper.fti_table
+    shadow_table = fti_table + '_rebuild'
+    if not _fti_rebuild_leftovers(cnx, fti_table, shadow_table):
+        return False
+    _fti_rebuild_drop(cnx, fti_table, shadow_table)
+    cnx.commit()
+    return True
+
+
+def _fti_rebuild_leftovers(cnx, fti_table, shadow_table):
+    """return the names of the objects of a full-text index rebuild existing in
+    the database, that is the ones left by an interrupted rebuild
+    """
+    tables = cnx.repo.system_source.dbhelper.list_tables(cnx.cnxset.cu)
+    leftovers = [table for table in (shadow_table, 'cw_fti_rebuild',
+                                     'cw_fti_rebuild_changes')
+                 if table in tables]
+    if cnx.system_sql("SELECT 1 FROM pg_trigger WHERE "
+                      "tgname='cw_fti_rebuild_record_change'").fetchall():
+        leftovers.append('trigger cw_fti_rebuild_record_change')
+    if cnx.system_sql("SELECT 1 FROM pg_proc WHERE "
+                      "proname='cw_fti_rebuild_record_change'").fetchall():
+        leftovers.append('function cw_fti_rebuild_record_change()')
+    return leftovers
+
+
+def _fti_rebuild_drop(cnx, fti_table, shadow_table):
+    """drop the objects of a full-text index rebuild, if they exist"""
+    cnx.system_sql('DROP TRIGGER IF EXISTS cw_fti_rebuild_record_change ON %s'
+                   % fti_table)
+    cnx.system_sql('DROP FUNCTION IF EXISTS cw_fti_rebuild_record_change()')
+    cnx.system_sql('DROP TABLE IF EXISTS %s' % shadow_table)
+    cnx.system_sql('DROP TABLE IF EXISTS cw_fti_rebuild')
+    cnx.system_sql('DROP TABLE IF EXISTS cw_fti_rebuild_changes')
+
+
+def _fti_rebuild_init(cnx, fti_table, shadow_table, etypes, partial):
+    """create the shadow full-text index table, the progress table and the
+    trigger recording entities whose index is modified in the current full-text
+    index table. The shadow table is filled with index of entities whose type
+    is not in `etypes` if `partial`.
+    """
+    _fti_rebuild_drop(cnx, fti_table, shadow_table)
+    # indexes are only created before the swap
+    cnx.system_sql('CREATE TABLE %s (LIKE %s)' % (shadow_table, fti_table))
+    cnx.system_sql('CREATE TABLE cw_fti_rebuild (etype VARCHAR(64) PRIMARY KEY, '
+                   'last_eid INTEGER NOT NULL, done BOOLEAN NOT NULL)')
+    for etype in etypes:
+        cnx.system_sql("INSERT INTO cw_fti_rebuild VALUES (%(e)s, 0, FALSE)",
+                       {'e': etype})
+    # modifications are recorded once their transaction is committed, whatever
+    # the time entities have been modified. Creating the trigger waits for
+    # transactions modifying the full-text index table to be over.
+    cnx.system_sql('CREATE TABLE cw_fti_rebuild_changes (uid INTEGER NOT NULL)')
+    cnx.system_sql('''CREATE OR REPLACE FUNCTION cw_fti_rebuild_record_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO cw_fti_rebuild_changes VALUES (OLD.uid);
+    ELSE
+        INSERT INTO cw_fti_rebuild_changes VALUES (NEW.uid);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql''')
+    cnx.system_sql('CREATE TRIGGER cw_fti_rebuild_record_change '
+                   'AFTER INSERT OR UPDATE OR DELETE ON %s FOR EACH ROW '
+                   'EXECUTE PROCEDURE cw_fti_rebuild_record_change()' % fti_table)
+    if partial:
+        cnx.system_sql('INSERT INTO %s SELECT A.* FROM %s AS A WHERE NOT EXISTS('
+                       'SELECT 1 FROM entities WHERE eid=A.uid AND type IN (%s))'
+                       % (shadow_table, fti_table,
+                          ','.join("'%s'" % etype for etype in etypes)))
+    cnx.commit()
+
+
+def _fti_rebuild_etype(cnx, etype, shadow_table, batch_size):
+    """index entities of type `etype` into the shadow full-text index table,
+    starting after the last recorded eid
+    """
+    source = cnx.repo.system_source
+    last_eid, = cnx.system_sql('SELECT last_eid FROM cw_fti_rebuild WHERE etype=%(e)s',
+                               {'e': etype}).fetchone()
+    etype_class = cnx.vreg['etypes'].etype_class(etype)
+    kwargs = {'start': last_eid} if last_eid else {}
+    for rset in etype_class.cw_fti_index_rql_limit(cnx, limit=batch_size, **kwargs):
+        source.fti_index_entities(cnx, rset.entities(), table=shadow_table)
+        cnx.system_sql('UPDATE cw_fti_rebuild SET last_eid=%(eid)s WHERE etype=%(e)s',
+                       {'eid': rset[-1][0], 'e': etype})
+        cnx.commit()
+        # clear entity cache to avoid high memory consumption on big tables
+        cnx.drop_entity_cache()
+    cnx.system_sql('UPDATE cw_fti_rebuild SET done=TRUE WHERE etype=%(e)s', {'e': etype})
+    cnx.commit()
+
+
+def _fti_rebuild_parallel(repo, etypes, shadow_table, nb_workers, batch_size, pb):
+    """index entities of types `etypes` using `nb_workers` processes"""
+    mpctx = multiprocessing.get_context('fork')
+    tasks = mpctx.Queue()
+    results = mpctx.Queue()
+    for etype in etypes:
+        tasks.put(etype)
+    workers = []
+    for i in range(min(nb_workers, len(etypes))):
+        tasks.put(None)
+        worker = mpctx.Process(target=_fti_rebuild_worker,
+                               args=(repo, tasks, results, shadow_table, batch_size))
+        worker.daemon = True
+        worker.start()
+        workers.append(worker)
+    errors = []
+    try:
+        remaining = len(etypes)
+        while remaining and not errors:
+            try:
+                etype, error = results.get(timeout=1)
+            except queue.Empty:
+                if any(worker.exitcode for worker in workers):
+                    errors.append('worker process died unexpectedly')
+                continue
+            if error is not None:
+                errors.append(error)
+            else:
+                remaining -= 1
+                if pb is not None:
+                    pb.update()
+    finally:
+        for worker in workers:
+            if errors:
+                worker.terminate()
+            worker.join()
+    if errors:
+        raise ExecutionError('full-text index rebuild failed, it may be resumed:\n%s'
+                             % '\n'.join(errors))
+
+
+def _fti_rebuild_worker(repo, tasks, results, shadow_table, batch_size):
+    """Main function of processes forked by :func:`_fti_rebuild_parallel`:
+    index entity types read from the `tasks` queue, until None is read.
+    """
+    from cubicweb.server.repository import _CnxSetPool
+    # connections inherited from the parent process must neither be used nor
+    # closed: keep a reference on them, process is exited without finalizers
+    inherited = repo.cnxsets  # noqa
+    repo.cnxsets = _CnxSetPool(repo.system_source, None)
+    etype = None
+    try:
+        with repo.internal_cnx() as cnx:
+            for etype in iter(tasks.get, None):
+                _fti_rebuild_etype(cnx, etype, shadow_table, batch_size)
+                results.put((etype, None))
+    except Exception:
+        results.put((etype, traceback.format_exc()))
+        raise
+
+
+def _fti_rebuild_catch_up(cnx, fti_table, shadow_table, chunk_size=1000):
+    """take index of entities recorded by the trigger as modified in the
+    current full-text index table from this table. Modifications committed
+    meanwhile are left for the next catch up.
+    """
+    uids = sorted(set(uid for uid, in cnx.system_sql(
+        'DELETE FROM cw_fti_rebuild_changes RETURNING uid').fetchall()))
+    for i in range(0, len(uids), chunk_size):
+        uids_sql = ','.join(str(uid) for uid in uids[i:i + chunk_size])
+        cnx.system_sql('DELETE FROM %s WHERE uid IN (%s)' % (shadow_table, uids_sql))
+        cnx.system_sql('INSERT INTO %s SELECT * FROM %s WHERE uid IN (%s)'
+                       % (shadow_table, fti_table, uids_sql))
+
+
+def _fti_rebuild_swap(cnx, fti_table, shadow_table):
+    """replace the full-text index table by the shadow one"""
+    # first catch up without lock, then under lock only for latest modifications
+    cnx.system_sql('DELETE FROM %s AS S WHERE NOT EXISTS('
+                   'SELECT 1 FROM entities WHERE eid=S.uid)' % shadow_table)
+    _fti_rebuild_catch_up(cnx, fti_table, shadow_table)
+    cnx.system_sql('ALTER TABLE %s ADD CONSTRAINT %s_pkey PRIMARY KEY (uid)'
+                   % (shadow_table, shadow_table))
+    cnx.system_sql('CREATE INDEX %s_words_idx ON %s USING gin(words)'
+                   % (shadow_table, shadow_table))
+    cnx.commit()
+    # prevent modifications of the full-text index while still allowing search.
+    # Acquiring the lock waits for transactions modifying it to be over, so
+    # that all modifications have been recorded.
+    cnx.system_sql('LOCK TABLE %s IN SHARE ROW EXCLUSIVE MODE' % fti_table)
+    _fti_rebuild_catch_up(cnx, fti_table, shadow_table)
+    # dropping the table drops the trigger
+    cnx.system_sql('DROP TABLE %s' % fti_table)
+    cnx.system_sql('ALTER TABLE %s RENAME TO %s' % (shadow_table, fti_table))
+    for suffix in ('pkey', 'words_idx'):
+        cnx.system_sql('ALTER INDEX %s_%s RENAME TO %s_%s'
+                       % (shadow_table, suffix, fti_table, suffix))
+    cnx.system_sql('DROP FUNCTION cw_fti_rebuild_record_change()')
+    cnx.system_sql('DROP TABLE cw_fti_rebuild_changes')
+    cnx.system_sql('DROP TABLE cw_fti_rebuild')
+    cnx.commit()
+
+
 _CHECKERS = {}
 
 
@@ -437,6 +727,7 @@ SYSTEM_INDEXES = {
     # see cw/server/sources/native.py
     'transactions_tx_time_idx': ('transactions', 'tx_time'),
     'transactions_tx_user_idx': ('transactions', 'tx_user'),
+    'fti_queue_eid_idx': ('fti_queue', 'eid'),
     'tx_entity_actions_txa_action_idx': ('tx_entity_actions', 'txa_action'),
     'tx_entity_actions_txa_public_idx': ('tx_entity_actions', 'txa_public'),
     'tx_entity_actions_eid_idx': ('tx_entity_actions', 'txa_eid'),
@@ -174,6 +174,24 @@ Specific selectors are shipped for these kinds of events, see in particular
 
 Also note that relations can be added or deleted, but not updated.
 
+Bulk hooks
+~~~~~~~~~~
+
+The repository usually fires entity and relation events for a batch of entities
+of the same type or of relations of the same type. Hooks having their `bulk`
+class attribute set to True handle the whole batch at once, through their
+`entities` (entity events) or `eids_from_to` (relation events, list of
+`(eidfrom, eidto)` tuples) attribute. When every hook that may be called for
+a batch is a bulk hook, they are selected and called only once for the whole
+batch, else they are called once per item with a single element list.
+
+Since bulk hooks are selected using the first item of the batch, their
+selector should only depend on the event, the entity or relation type and the
+connection's state. In particular, relation hooks selected according to the
+type of the relation's subject or object (e.g. using the `frometypes` /
+`toetypes` arguments of :class:`match_rtype`) must not be bulk hooks, since a
+batch may hold relations between entities of different types.
+
 Non data events
 ~~~~~~~~~~~~~~~
 
@@ -288,9 +306,32 @@ def _iter_kwargs(entities, eids_from_to, kwargs):
 
 class HooksRegistry(CWRegistry):
 
+    def __init__(self, vreg):
+        super(HooksRegistry, self).__init__(vreg)
+        # pruned hooks cache, shared by all connections and by the hooks
+        # registries of `vreg`, since its keys start with the event (see
+        # get_pruned_hooks)
+        try:
+            self._pruned_cache = vreg.pruned_hooks_cache
+        except AttributeError:
+            self._pruned_cache = vreg.pruned_hooks_cache = {}
+
     def register(self, obj, **kwargs):
         obj.check_events()
         super(HooksRegistry, self).register(obj, **kwargs)
+        self._pruned_cache.clear()
+
+    def unregister(self, obj):
+        super(HooksRegistry, self).unregister(obj)
+        self._pruned_cache.clear()
+
+    def clear(self):
+        super(HooksRegistry, self).clear()
+        self._pruned_cache.clear()
+
+    def initialization_completed(self):
+        super(HooksRegistry, self).initialization_completed()
+        self._pruned_cache.clear()
 
     def call_hooks(self, event, cnx=None, **kwargs):
         """call `event` hooks for an entity or a list of entities (passed
@@ -315,14 +356,29 @@ class HooksRegistry(CWRegistry):
             else:
                 entities = []
                 eids_from_to = []
-            pruned = self.get_pruned_hooks(cnx, event,
-                                           entities, eids_from_to, kwargs)
-
+            candidates, presorted, bulk = self._candidate_hooks(
+                cnx, event, entities, eids_from_to, kwargs)
+            select_best = self._select_best
+            if bulk and (len(entities) > 1 or len(eids_from_to) > 1):
+                # every candidate hook handles the whole batch at once: select
+                # and call them only once, with the first item of the batch
+                # along with the whole list
+                kwargs = next(_iter_kwargs(entities, eids_from_to, kwargs))
+                if entities:
+                    kwargs['entities'] = entities
+                else:
+                    kwargs['eids_from_to'] = eids_from_to
+                batches = (kwargs,)
+            else:
+                batches = _iter_kwargs(entities, eids_from_to, kwargs)
             # by default, hooks are executed with security turned off
             with cnx.security_enabled(read=False):
-                for _kwargs in _iter_kwargs(entities, eids_from_to, kwargs):
-                    hooks = sorted(self.filtered_possible_objects(pruned, cnx, **_kwargs),
-                                   key=lambda x: x.order)
+                for _kwargs in batches:
+                    hooks = [hook for hook in (select_best(appobjects, cnx, **_kwargs)
+                                               for appobjects in candidates)
+                             if hook is not None]
+                    if not presorted:
+                        hooks.sort(key=lambda x: x.order)
                     debug = server.DEBUG & server.DBG_HOOKS
                     with cnx.security_enabled(write=False):
                         with cnx.running_hooks_ops():
@@ -349,7 +405,21 @@ class HooksRegistry(CWRegistry):
         Only hooks with a simple predicate or an AndPredicate of simple
         predicates are considered for disabling.
 
+        Since this only depends on the event, rtype, etype and hooks categories
+        activated on the connection, the result is cached in the registry,
+        hence shared by all connections, until hooks are (un)registered.
         """
+        return self._pruned(cnx, event, entities, eids_from_to, kwargs)[0]
+
+    def _candidate_hooks(self, cnx, event, entities, eids_from_to, kwargs):
+        """return a list of lists of hooks, sharing the same identifier, among
+        which one may be selected, a boolean telling if hooks selected from
+        these lists are ordered by `order` (see :meth:`get_pruned_hooks`) and
+        another one telling if they are all :attr:`Hook.bulk` hooks
+        """
+        return self._pruned(cnx, event, entities, eids_from_to, kwargs)[1:]
+
+    def _pruned(self, cnx, event, entities, eids_from_to, kwargs):
         if 'entity' in kwargs:
             entities = [kwargs['entity']]
         if len(entities):
@@ -359,13 +429,17 @@ class HooksRegistry(CWRegistry):
             look_for_selector = match_rtype
             etype = None
         else: # nothing to prune, how did we get there ???
-            return set()
-        cache_key = (event, kwargs.get('rtype'), etype)
-        pruned = cnx.pruned_hooks_cache.get(cache_key)
-        if pruned is not None:
-            return pruned
+            look_for_selector = None
+        if look_for_selector is None:
+            cache_key = (event,)
+        else:
+            cache_key = (event, kwargs.get('rtype'), etype,
+                         cnx._hooks_mode, frozenset(cnx._hooks_categories))
+        try:
+            return self._pruned_cache[cache_key]
+        except KeyError:
+            pass
         pruned = set()
-        cnx.pruned_hooks_cache[cache_key] = pruned
         if look_for_selector is not None:
             for id, hooks in self.items():
                 for hook in hooks:
@@ -382,8 +456,25 @@ class HooksRegistry(CWRegistry):
                         first_kwargs = next(_iter_kwargs(entities, eids_from_to, kwargs))
                         if not main_filter(hook, cnx, **first_kwargs):
                             pruned.add(hook)
-        return pruned
-
+        candidates = []
+        presorted = bulk = True
+        for appobjects in self.values():
+            appobjects = [obj for obj in appobjects if obj not in pruned]
+            if not appobjects:
+                continue
+            if not all(obj.bulk for obj in appobjects):
+                bulk = False
+            # when all candidates have the same order, the order of the
+            # selected one is known beforehand
+            if len(set(obj.order for obj in appobjects)) > 1:
+                presorted = False
+            candidates.append(appobjects)
+        if presorted:
+            # stable sort, as done on selected hooks otherwise
+            candidates.sort(key=lambda x: x[0].order)
+        result = self._pruned_cache[cache_key] = (pruned, candidates, presorted,
+                                                  bulk)
+        return result
 
     def filtered_possible_objects(self, pruned, *args, **kwargs):
         for appobjects in self.values():
@@ -525,8 +616,12 @@ class Hook(AppObject):
     events: Union[None, Tuple[str], Tuple[str, str]] = None
     category: Union[None, str] = None
     order = 0
+    #: set to True if the hook handles a whole batch of entities or relations
+    #: at once, through its `entities` / `eids_from_to` attribute
+    bulk = False
     # stop pylint from complaining about missing attributes in Hooks classes
     eidfrom = eidto = entity = rtype = repo = None
+    entities = eids_from_to = None
 
     @classmethod
     @cached
@@ -561,13 +656,20 @@ class Hook(AppObject):
             return []
         return ['%s_hooks' % ev for ev in cls.events]
 
-    known_args = set(('entity', 'rtype', 'eidfrom', 'eidto', 'repo', 'timestamp'))
+    known_args = set(('entity', 'rtype', 'eidfrom', 'eidto', 'repo', 'timestamp',
+                      'entities', 'eids_from_to'))
     def __init__(self, req, event, **kwargs):
         for arg in self.known_args:
             if arg in kwargs:
                 setattr(self, arg, kwargs.pop(arg))
         super(Hook, self).__init__(req, **kwargs)
         self.event = event
+        if self.bulk:
+            # bulk hooks may be called for a single item
+            if self.entities is None and self.entity is not None:
+                self.entities = [self.entity]
+            elif self.eids_from_to is None and self.eidfrom is not None:
+                self.eids_from_to = [(self.eidfrom, self.eidto)]
 
 set_log_methods(Hook, getLogger('cubicweb.hook'))
 
@@ -956,7 +1058,12 @@ class SendMailOp(SingleLastOperation):
             self.to_send = previous.to_send + self.to_send
 
     def postcommit_event(self):
-        self.cnx.repo.threaded_task(self.sendmails)
+        outbox = self.cnx.repo.mail_outbox
+        if outbox is not None:
+            # mails will be sent by the mail queue looping task
+            outbox.enqueue(self.to_send)
+        else:
+            self.cnx.repo.threaded_task(self.sendmails)
 
     def sendmails(self):
         self.cnx.vreg.config.sendmails(self.to_send)
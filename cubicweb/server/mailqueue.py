@@ -0,0 +1,228 @@
+# copyright 2026 LOGILAB S.A. (Paris, FRANCE), all rights reserved.
+# contact http://www.logilab.fr/ -- mailto:contact@logilab.fr
+#
+# This file is part of CubicWeb.
+#
+# CubicWeb is free software: you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# CubicWeb is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License along
+# with CubicWeb.  If not, see <http://www.gnu.org/licenses/>.
+"""Persistent outbox of mails sent by the repository.
+
+Mails are spooled in a directory on commit, one file per mail, then sent by
+batches by a looping task of the repository scheduler, reusing its connection
+to the SMTP server from one run to another. Mails which could not be sent are
+retried with an exponential backoff, then moved to the `failed` sub-directory.
+
+Spooled files are named `<next try time>-<unique id>.mail`, so that mails ready
+to be sent may be found without reading them. A mail being sent is renamed
+with the `.sending` suffix first, hence several processes may share the same
+spool directory.
+"""
+
+import os
+import os.path as osp
+import pickle
+import smtplib
+import time
+import uuid
+from logging import getLogger
+from threading import Lock
+
+from logilab.common.logging_ext import set_log_methods
+
+from cubicweb import cwconfig
+
+
+class MailOutbox(object):
+    """Mail queue spooled in `directory`.
+
+    :param config: the instance configuration, giving SMTP settings
+    :param batch_size: number of mails sent using a SMTP connection before it
+                       is checked again
+    :param max_attempts: number of attempts to send a mail before it is moved
+                         to the `failed` sub-directory
+    :param retry_delay: delay in seconds before the first retry of a mail, which
+                        is doubled for each following attempt
+    """
+    suffix = '.mail'
+    # time in seconds after which a mail whose sending has been interrupted
+    # (e.g. by a process crash) is queued again
+    sending_timeout = 600
+
+    def __init__(self, config, directory, batch_size=100, max_attempts=10,
+                 retry_delay=60):
+        self.config = config
+        self.directory = directory
+        self.failed_directory = osp.join(directory, 'failed')
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._smtp = None
+        self._lock = Lock()
+        # some usage stats
+        self.sent, self.failed = 0, 0
+        for path in (directory, self.failed_directory):
+            if not osp.isdir(path):
+                os.makedirs(path)
+
+    def _filename(self, next_try, mailid):
+        return osp.join(self.directory, '%020d-%s%s' % (
+            int(next_try * 1000000), mailid, self.suffix))
+
+    def _write(self, filename, mail):
+        tmpfilename = filename + '.tmp'
+        with open(tmpfilename, 'wb') as stream:
+            pickle.dump(mail, stream, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmpfilename, filename)
+
+    def enqueue(self, msgs, fromaddr=None):
+        """msgs: list of 2-uple (message object, recipients) to be sent from
+        `fromaddr` (default to the configured sender)
+        """
+        if fromaddr is None:
+            config = self.config
+            fromaddr = '%s <%s>' % (config['sender-name'], config['sender-addr'])
+        now = time.time()
+        for i, (msg, recipients) in enumerate(msgs):
+            mail = {'fromaddr': fromaddr, 'recipients': list(recipients),
+                    'msg': msg.as_bytes(), 'queued': now, 'attempts': 0}
+            # keep mails of a transaction ordered
+            mailid = '%06d%s' % (i, uuid.uuid4().hex)
+            self._write(self._filename(now, mailid), mail)
+
+    def queued(self):
+        """return sorted names of spooled mails, including those waiting for a
+        retry"""
+        return sorted(fname for fname in os.listdir(self.directory)
+                      if fname.endswith(self.suffix))
+
+    def stats(self):
+        """return (number of queued mails, age in seconds of the oldest one)"""
+        queued = self.queued()
+        oldest = None
+        for fname in queued:
+            try:
+                with open(osp.join(self.directory, fname), 'rb') as stream:
+                    queuedtime = pickle.load(stream)['queued']
+            except (OSError, EOFError, pickle.UnpicklingError):
+                continue  # being sent
+            if oldest is None or queuedtime < oldest:
+                oldest = queuedtime
+        lag = 0 if oldest is None else time.time() - oldest
+        return len(queued), lag
+
+    def send_queued(self):
+        """send mails ready to be sent, by batches of `batch_size`, and return
+        the number of mails sent"""
+        with self._lock:
+            self._requeue_interrupted()
+            nb_sent = 0
+            while True:
+                now = '%020d' % int(time.time() * 1000000)
+                batch = [fname for fname in self.queued() if fname < now]
+                batch = batch[:self.batch_size]
+                if not batch:
+                    break
+                nb_batch_sent = self._send_batch(batch)
+                if nb_batch_sent is None:
+                    break
+                nb_sent += nb_batch_sent
+                if len(batch) < self.batch_size:
+                    break
+            return nb_sent
+
+    def close(self):
+        """close the connection to the SMTP server"""
+        with self._lock:
+            self._close_smtp()
+
+    def _send_batch(self, fnames):
+        """send mails of `fnames` and return the number of mails sent, None if
+        the SMTP server is not reachable"""
+        nb_sent = 0
+        for fname in fnames:
+            filename = osp.join(self.directory, fname)
+            sendingfilename = filename + '.sending'
+            try:
+                # claim the mail, which may be sent by another process
+                os.rename(filename, sendingfilename)
+            except OSError:
+                continue
+            os.utime(sendingfilename)
+            with open(sendingfilename, 'rb') as stream:
+                mail = pickle.load(stream)
+            try:
+                self._sendmail(mail)
+            except Exception as ex:
+                self._close_smtp()
+                self._retry_later(fname, sendingfilename, mail, ex)
+                if isinstance(ex, (OSError, smtplib.SMTPServerDisconnected,
+                                   smtplib.SMTPConnectError)):
+                    # don't try other mails if the server isn't reachable
+                    return None
+            else:
+                os.unlink(sendingfilename)
+                self.sent += 1
+                nb_sent += 1
+        return nb_sent
+
+    def _sendmail(self, mail):
+        smtp = self._smtp
+        if smtp is None:
+            smtp = self._smtp = cwconfig.SMTP(self.config['smtp-host'],
+                                              self.config['smtp-port'])
+        try:
+            smtp.sendmail(mail['fromaddr'], mail['recipients'], mail['msg'])
+        except smtplib.SMTPServerDisconnected:
+            # connection reused from a previous run may have been closed by
+            # the server
+            self._close_smtp()
+            self._smtp = smtp = cwconfig.SMTP(self.config['smtp-host'],
+                                              self.config['smtp-port'])
+            smtp.sendmail(mail['fromaddr'], mail['recipients'], mail['msg'])
+
+    def _close_smtp(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.close()
+            except Exception:
+                pass
+            self._smtp = None
+
+    def _retry_later(self, fname, sendingfilename, mail, ex):
+        mail['attempts'] += 1
+        if mail['attempts'] >= self.max_attempts:
+            self.error('giving up sending mail to %s after %s attempts (%s)',
+                       mail['recipients'], mail['attempts'], ex)
+            self._write(osp.join(self.failed_directory, fname), mail)
+            self.failed += 1
+        else:
+            delay = self.retry_delay * 2 ** (mail['attempts'] - 1)
+            self.warning('error sending mail to %s (%s), retrying in %ss',
+                         mail['recipients'], ex, delay)
+            mailid = fname[:-len(self.suffix)].split('-', 1)[1]
+            self._write(self._filename(time.time() + delay, mailid), mail)
+        os.unlink(sendingfilename)
+
+    def _requeue_interrupted(self):
+        mintime = time.time() - self.sending_timeout
+        for fname in os.listdir(self.directory):
+            if not fname.endswith(self.suffix + '.sending'):
+                continue
+            filename = osp.join(self.directory, fname)
+            try:
+                if osp.getmtime(filename) < mintime:
+                    os.rename(filename, filename[:-len('.sending')])
+            except OSError:
+                continue
+
+set_log_methods(MailOutbox, getLogger('cubicweb.mailqueue'))
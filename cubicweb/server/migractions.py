@@ -181,7 +181,8 @@ class ServerMigrationHelper(MigrationHelper):
 
     # server specific migration methods ########################################
 
-    def backup_database(self, backupfile=None, askconfirm=True, format='native'):
+    def backup_database(self, backupfile=None, askconfirm=True, format='native',
+                        workers=1):
         config = self.config
         repo = self.repo
         # paths
@@ -207,7 +208,8 @@ class ServerMigrationHelper(MigrationHelper):
         try:
             failed = False
             try:
-                source.backup(osp.join(tmpdir, source.uri), self.confirm, format=format)
+                source.backup(osp.join(tmpdir, source.uri), self.confirm, format=format,
+                              workers=workers)
             except Exception as ex:
                 print('-> error trying to backup %s [%s]' % (source.uri, ex))
                 if not self.confirm('Continue anyway?', default='n'):
@@ -232,7 +234,8 @@ class ServerMigrationHelper(MigrationHelper):
         finally:
             shutil.rmtree(tmpdir)
 
-    def restore_database(self, backupfile, drop=True, askconfirm=True, format='native'):
+    def restore_database(self, backupfile, drop=True, askconfirm=True, format='native',
+                         workers=1):
         # check
         if not osp.exists(backupfile):
             raise ExecutionError("Backup file %s doesn't exist" % backupfile)
@@ -262,7 +265,8 @@ class ServerMigrationHelper(MigrationHelper):
         repo = self.repo = repository.Repository(self.config)
         source = repo.system_source
         try:
-            source.restore(osp.join(tmpdir, source.uri), self.confirm, drop, format)
+            source.restore(osp.join(tmpdir, source.uri), self.confirm, drop, format,
+                           workers=workers)
         except Exception:
             _, exc, traceback_ = sys.exc_info()
             print('-> error trying to restore %s [%s]' % (source.uri, exc))
@@ -20,7 +20,6 @@ security checking and data aggregation.
 """
 import uuid
 import time
-import traceback
 from itertools import repeat
 
 from rql import RQLSyntaxError, CoercionError
@@ -32,13 +31,14 @@ from cubicweb import ValidationError, Unauthorized, UnknownEid, QueryError
 from cubicweb.rqlrewrite import RQLRelationRewriter
 from cubicweb import Binary, server
 from cubicweb.rset import ResultSet
-from cubicweb.debug import emit_to_debug_channel
+from cubicweb.debug import (emit_to_debug_channel, should_emit_to_debug_channel,
+                            debug_channel_has_subscribers, DebugMessage)
 
 from cubicweb.utils import QueryCache, RepeatList
 from cubicweb.misc.source_highlight import highlight_terminal
 from cubicweb.server.rqlannotation import SQLGenAnnotator, set_qdata
 from cubicweb.server.ssplanner import (READ_ONLY_RTYPES, add_types_restriction,
-                                       SSPlanner)
+                                       SSPlanner, OneFetchStep)
 from cubicweb.server.edition import EditedEntity
 from cubicweb.statsd_logger import statsd_timeit, statsd_c
 
@@ -170,6 +170,9 @@ class ExecutionPlan(object):
         self.rqlhelper = cnx.vreg.rqlhelper
         # tracing token for debugging
         self.rql_query_tracing_token = None
+        # set to True if security insertion used eids given in args, in which
+        # case the rewritten syntax tree can't be reused for other eids
+        self.eid_dependant_security = False
 
     def add_step(self, step):
         """add a step to the plan"""
@@ -281,6 +284,8 @@ class ExecutionPlan(object):
                         rqlexprs = localcheck.pop(varname)
                     except KeyError:
                         continue
+                    # resulting syntax tree depends on the eid given in args
+                    self.eid_dependant_security = True
                     # if entity has been added in the current transaction, the
                     # user can read it whatever rql expressions are associated
                     # to its type
@@ -486,6 +491,7 @@ class QuerierHelper(object):
     def clear_caches(self, eids=None, etypes=None):
         if eids is None:
             self.rql_cache = RQLCache(self._repo, self.schema)
+            self.plan_cache = PlanCache(self._repo)
         else:
             cache = self.rql_cache
             for eid, etype in zip(eids, etypes):
@@ -529,48 +535,37 @@ class QuerierHelper(object):
             # we want queries such as "Any X WHERE X eid 9999"
             # return an empty result instead of raising UnknownEid
             return empty_rset(rql, args)
+        compiled = None
         if rqlst.TYPE != 'select':
             if cnx.read_security:
                 check_no_password_selected(rqlst)
             cachekey = None
         else:
-            if cnx.read_security:
-                for select in rqlst.children:
-                    check_no_password_selected(select)
-                    check_relations_read_access(cnx, select, args)
-            # on select query, always copy the cached rqlst so we don't have to
-            # bother modifying it. This is not necessary on write queries since
-            # a new syntax tree is built from them.
-            rqlst = rqlst.copy()
-            # Rewrite computed relations
-            rewriter = RQLRelationRewriter(cnx)
-            rewriter.rewrite(rqlst, args)
-            self._repo.vreg.rqlhelper.annotate(rqlst)
-            if args:
-                # different SQL generated when some argument is None or not (IS
-                # NULL). This should be considered when computing sql cache key
-                cachekey += tuple(sorted([k for k, v in args.items()
-                                          if v is None]))
-        # make an execution plan
-        plan = self.plan_factory(rqlst, args, cnx)
-        plan.cache_key = cachekey
-        plan.rql_query_tracing_token = str(uuid.uuid4())
-        self._planner.build_plan(plan)
-
-        query_debug_informations = {
-            "rql": rql,
-            "rql_query_tracing_token": plan.rql_query_tracing_token,
-            "args": args,
-            # remove the last part of the stack which is: this line
-            "callstack": "".join(traceback.format_stack()[:-1]),
-            "description": "",
-        }
+            argkeys = frozenset(args or ())
+            rqlst, cachekey, compiled = self._prepare_select(cnx, rqlst, cachekey, args)
+        # only pay for debug informations if someone is listening
+        emit_debug = should_emit_to_debug_channel("rql")
+        if emit_debug or debug_channel_has_subscribers("sql"):
+            tracing_token = str(uuid.uuid4())
+        else:
+            tracing_token = None
+        if compiled is None:
+            # make an execution plan
+            plan = self.plan_factory(rqlst, args, cnx)
+            plan.cache_key = cachekey
+            plan.rql_query_tracing_token = tracing_token
+            self._planner.build_plan(plan)
 
         start = time.time()
 
         # execute the plan
         try:
-            results = plan.execute()
+            if compiled is not None:
+                results = compiled.execute(cnx, args, tracing_token)
+            else:
+                results = plan.execute()
+                if rqlst.TYPE == 'select':
+                    self.plan_cache.compile(cnx, plan, argkeys)
         except (Unauthorized, ValidationError):
             # getting an Unauthorized/ValidationError exception means the
             # transaction must be rolled back
@@ -584,23 +579,13 @@ class QuerierHelper(object):
                 cnx.commit_state = 'uncommitable'
             raise
 
-        query_debug_informations["time"] = ((time.time() - start) * 1000)
-        query_debug_informations["result"] = results
+        query_time = (time.time() - start) * 1000
 
         # build a description for the results if necessary
         descr = ()
         if build_descr:
             if rqlst.TYPE == 'select':
-                # sample selection
-                if len(rqlst.children) == 1 and len(rqlst.children[0].solutions) == 1:
-                    # easy, all lines are identical
-                    selected = rqlst.children[0].selection
-                    solution = rqlst.children[0].solutions[0]
-                    description = _make_description(selected, args, solution)
-                    descr = RepeatList(len(results), tuple(description))
-                else:
-                    # hard, delegate the work :o)
-                    descr = manual_build_descr(cnx, rqlst, args, results)
+                descr = _select_descr(cnx, rqlst, args, results)
             elif rqlst.TYPE == 'insert':
                 # on insert plan, some entities may have been auto-casted,
                 # so compute description manually even if there is only
@@ -610,13 +595,111 @@ class QuerierHelper(object):
                 descr = _build_descr(cnx, results, basedescr, todetermine)
             # FIXME: get number of affected entities / relations on non
             # selection queries ?
-            query_debug_informations["description"] = descr
 
-        emit_to_debug_channel("rql", query_debug_informations)
+        if emit_debug:
+            emit_to_debug_channel("rql", DebugMessage(
+                rql=rql,
+                rql_query_tracing_token=tracing_token,
+                args=args,
+                description=descr if build_descr else "",
+                time=query_time,
+                result=results,
+            ))
 
         # return a result set object
         return ResultSet(results, rql, args, descr)
 
+    def execute_iter(self, cnx, rql, args=None, build_descr=True, chunk_size=1000):
+        """execute a rql SELECT query and return an iterator on `ResultSet`
+        objects holding at most `chunk_size` rows each, so that large results
+        may be processed without loading all of them in memory. When the
+        database supports it, rows are fetched using a server-side cursor.
+
+        Arguments are the same as for :meth:`execute`. Other queries should
+        not be executed on the connection while iterating on results, unless
+        the database supports server-side cursors. The transaction may be
+        committed while iterating, but not rolled back.
+        """
+        try:
+            rqlst, cachekey = self.rql_cache.get(cnx, rql, args)
+        except UnknownEid:
+            # we want queries such as "Any X WHERE X eid 9999" to return no
+            # result instead of raising UnknownEid
+            return
+        if rqlst.TYPE != 'select':
+            raise QueryError('only select queries may be iterated on')
+        argkeys = frozenset(args or ())
+        rqlst, cachekey, compiled = self._prepare_select(cnx, rqlst, cachekey, args)
+        # only pay for debug informations if someone is listening
+        emit_debug = should_emit_to_debug_channel("rql")
+        if emit_debug or debug_channel_has_subscribers("sql"):
+            tracing_token = str(uuid.uuid4())
+        else:
+            tracing_token = None
+        if compiled is None:
+            plan = self.plan_factory(rqlst, args, cnx)
+            plan.cache_key = cachekey
+            plan.rql_query_tracing_token = tracing_token
+            self._planner.build_plan(plan)
+            compiled = (self.plan_cache.compile(cnx, plan, argkeys)
+                        or compile_plan(cnx, plan, argkeys))
+            rqlst = compiled.rqlst
+        # time spent fetching results, not processing them
+        query_time = 0
+        nbrows = 0
+        try:
+            start = time.time()
+            for results in compiled.execute_iter(cnx, args, chunk_size,
+                                                 tracing_token):
+                query_time += (time.time() - start) * 1000
+                nbrows += len(results)
+                descr = _select_descr(cnx, rqlst, args, results) if build_descr else ()
+                yield ResultSet(results, rql, args, descr)
+                start = time.time()
+        finally:
+            if emit_debug:
+                emit_to_debug_channel("rql", DebugMessage(
+                    rql=rql,
+                    rql_query_tracing_token=tracing_token,
+                    args=args,
+                    description="",
+                    time=query_time,
+                    result="%s rows fetched by chunks of %s" % (nbrows, chunk_size),
+                ))
+
+    def _prepare_select(self, cnx, rqlst, cachekey, args):
+        """check read access for a SELECT syntax tree from the RQL cache and
+        return a (syntax tree, cache key, compiled plan) tuple, with the cache
+        key completed according to arguments.
+
+        The compiled plan is None if it's not in the plan cache, in which case
+        the syntax tree is a copy ready to be planned, else it's the syntax
+        tree with security inserted used to compile the plan.
+        """
+        if cnx.read_security:
+            for select in rqlst.children:
+                check_no_password_selected(select)
+                check_relations_read_access(cnx, select, args)
+        if args:
+            # different SQL generated when some argument is None or not (IS
+            # NULL). This should be considered when computing sql cache key
+            cachekey += tuple(sorted([k for k, v in args.items()
+                                      if v is None]))
+        compiled = self.plan_cache.get(cnx, cachekey)
+        if compiled is None:
+            # on select query, always copy the cached rqlst so we don't
+            # have to bother modifying it. This is not necessary on write
+            # queries since a new syntax tree is built from them.
+            rqlst = rqlst.copy()
+            # Rewrite computed relations
+            rewriter = RQLRelationRewriter(cnx)
+            rewriter.rewrite(rqlst, args)
+            self._repo.vreg.rqlhelper.annotate(rqlst)
+        else:
+            # use the syntax tree with security inserted for description
+            rqlst = compiled.rqlst
+        return rqlst, cachekey, compiled
+
     # these are overridden by set_log_methods below
     # only defining here to prevent pylint from complaining
     info = warning = error = critical = exception = debug = lambda msg,*a,**kw: None
@@ -690,6 +773,125 @@ class RQLCache(object):
         self._cache.pop(key, *args)
 
 
+class CompiledPlan(object):
+    """SQL query generated for a SELECT query once security has been inserted,
+    along with what is needed to execute it and describe its results.
+    """
+
+    def __init__(self, rqlst, sql, qargs, cbs, args, user_args):
+        # syntax tree with security inserted, must not be modified
+        self.rqlst = rqlst
+        self.sql = sql
+        self.qargs = qargs
+        self.cbs = cbs
+        # arguments added by security insertion
+        self.args = args
+        # name of arguments added by security insertion which should be given
+        # the user's eid
+        self.user_args = user_args
+
+    def execute(self, cnx, args, rql_query_tracing_token=None):
+        """execute the query and return resulting rows"""
+        return cnx.repo.system_source.sql_search(
+            cnx, self.sql, self.qargs, self.cbs, self._args(cnx, args),
+            rql_query_tracing_token=rql_query_tracing_token)
+
+    def execute_iter(self, cnx, args, chunk_size, rql_query_tracing_token=None):
+        """execute the query and return an iterator on lists of at most
+        `chunk_size` resulting rows
+        """
+        return cnx.repo.system_source.sql_search_iter(
+            cnx, self.sql, self.qargs, self.cbs, self._args(cnx, args),
+            chunk_size, rql_query_tracing_token=rql_query_tracing_token)
+
+    def _args(self, cnx, args):
+        if self.args or self.user_args:
+            args = dict(args or ())
+            args.update(self.args)
+            for argname in self.user_args:
+                args[argname] = cnx.user.eid
+        return args
+
+
+class PlanCache(object):
+    """Cache of compiled SELECT queries, shared by all connections.
+
+    Since the SQL depends on security inserted in the syntax tree, cache keys
+    are built from the RQL cache key (RQL, type of eids and None arguments)
+    and the user's groups, which determine read permissions and RQL
+    expressions to insert.
+    """
+
+    def __init__(self, repo):
+        self._cache = QueryCache(repo.config['rql-cache-size'])
+        # some cache usage stats
+        self.cache_hit, self.cache_miss = 0, 0
+
+    def __len__(self):
+        return len(self._cache)
+
+    @staticmethod
+    def _key(cnx, cachekey):
+        if cnx.read_security:
+            return cachekey, frozenset(cnx.user.groups)
+        return cachekey, None
+
+    def get(self, cnx, cachekey):
+        """Return the compiled plan for the given RQL cache key, or None"""
+        try:
+            compiled = self._cache[self._key(cnx, cachekey)]
+        except KeyError:
+            self.cache_miss += 1
+            statsd_c('plan_cache_miss')
+            return None
+        self.cache_hit += 1
+        statsd_c('plan_cache_hit')
+        return compiled
+
+    def compile(self, cnx, plan, argkeys):
+        """Cache a compiled version of the given, already planned, SELECT
+        execution plan and return it, or return None if the plan can't be
+        compiled.
+
+        `argkeys` are the names of the arguments given to the query, before
+        security insertion.
+        """
+        if plan.cache_key is None or plan.eid_dependant_security:
+            return None
+        compiled = compile_plan(cnx, plan, argkeys)
+        if compiled is not None:
+            self._cache[self._key(cnx, plan.cache_key)] = compiled
+        return compiled
+
+
+def compile_plan(cnx, plan, argkeys):
+    """Return a `CompiledPlan` for the given SELECT execution plan, or None
+    if the plan can't be compiled.
+
+    `argkeys` are the names of the arguments given to the query, before
+    security insertion.
+    """
+    if len(plan.steps) != 1:
+        return None
+    step = plan.steps[0]
+    if (not isinstance(step, OneFetchStep) or step.children
+            or step.union is not plan.rqlst):
+        return None
+    sql, qargs, cbs = cnx.repo.system_source.compile_syntax_tree(
+        step.union, plan.args, step.sql_cache_key())
+    args, user_args = {}, []
+    for argname, value in plan.args.items():
+        if argname in argkeys:
+            continue
+        # security insertion gives the user's eid for the U variable of
+        # RQL expressions
+        if value == cnx.user.eid:
+            user_args.append(argname)
+        else:
+            args[argname] = value
+    return CompiledPlan(plan.rqlst, sql, qargs, cbs, args, tuple(user_args))
+
+
 def _rql_cache_key(cnx, rql, args, eidkeys):
     cachekey = [rql]
     type_from_eid = cnx.repo.type_from_eid
@@ -713,6 +915,19 @@ LOGGER = getLogger('cubicweb.querier')
 set_log_methods(QuerierHelper, LOGGER)
 
 
+def _select_descr(cnx, rqlst, args, result):
+    """build a description for the result of a SELECT query"""
+    # sample selection
+    if len(rqlst.children) == 1 and len(rqlst.children[0].solutions) == 1:
+        # easy, all lines are identical
+        selected = rqlst.children[0].selection
+        solution = rqlst.children[0].solutions[0]
+        description = _make_description(selected, args, solution)
+        return RepeatList(len(result), tuple(description))
+    # hard, delegate the work :o)
+    return manual_build_descr(cnx, rqlst, args, result)
+
+
 def manual_build_descr(cnx, rqlst, args, result):
     """build a description for a given result by analysing each row
 
@@ -741,7 +956,13 @@ def manual_build_descr(cnx, rqlst, args, result):
 
 def _build_descr(cnx, result, basedescription, todetermine):
     description = []
-    entity_type = cnx.entity_type
+    # resolve types of all entities at once
+    eids = set()
+    for index, isfinal in todetermine:
+        if not isfinal:
+            eids.update(row[index] for row in result)
+    eids.discard(None)
+    etypes = cnx.repo.types_from_eids(eids, cnx) if eids else {}
     todel = []
     for i, row in enumerate(result):
         row_descr = basedescription[:]
@@ -755,8 +976,8 @@ def _build_descr(cnx, result, basedescription, todetermine):
                 row_descr[index] = etype_from_pyobj(value)
             else:
                 try:
-                    row_descr[index] = entity_type(value)
-                except UnknownEid:
+                    row_descr[index] = etypes[int(value)]
+                except (KeyError, ValueError):
                     cnx.error('wrong eid %s in repository, you should '
                              'db-check the database' % value)
                     todel.append(i)
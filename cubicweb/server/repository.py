@@ -26,10 +26,13 @@ repository mainly:
 * handles session management
 """
 
+from collections import OrderedDict, deque
 from itertools import chain
 from contextlib import contextmanager
 from logging import getLogger
-import queue
+import os.path as osp
+from threading import Condition, Lock
+from time import time
 
 from logilab.common.decorators import cached, clear_cache
 
@@ -38,11 +41,14 @@ from rql.utils import rqlvar_maker
 
 from cubicweb import (CW_MIGRATION_MAP,
                       UnknownEid, AuthenticationError, ExecutionError,
+                      NoCnxSetAvailable,
                       UniqueTogetherError, ViolatedConstraint)
 from cubicweb import set_log_methods
 from cubicweb import cwvreg, schema, server
 from cubicweb.server import utils, hook, querier, sources
+from cubicweb.server.mailqueue import MailOutbox
 from cubicweb.server.session import InternalManager, Connection
+from cubicweb.statsd_logger import statsd_c, statsd_g, statsd_t
 
 
 NO_CACHE_RELATIONS = set([
@@ -144,61 +150,226 @@ class NullEventBus(object):
 
 
 class _CnxSetPool:
+    """Pool of connections sets to the system source.
 
-    def __init__(self, source, size):
-        self._cnxsets = []
-
-        if size is not None:
-            self._queue = queue.Queue()
+    If `size` is None, connections sets aren't pooled: a new one is opened by
+    each call to :meth:`get` and closed on :meth:`release`.
 
-            for i in range(size):
-                cnxset = source.wrapped_connection()
-                self._cnxsets.append(cnxset)
-                self._queue.put_nowait(cnxset)
+    Else at most `size` connections sets are opened. `min_size` of them are
+    opened at once and always kept, others are opened on demand and closed
+    once they have been idle for more than `idle_timeout` seconds (never if
+    None). :meth:`get` waits at most `timeout` seconds for a connections set
+    to be available. When `pre_ping` is true, connections are checked before
+    being handed out and reopened if broken.
+    """
 
-        else:
-            self._queue = None
-            self._source = source
+    def __init__(self, source, size, min_size=None, timeout=5,
+                 idle_timeout=None, pre_ping=False):
+        self._source = source
+        self._cnxsets = []
+        self.size = size
+        # number of acquisitions which failed for lack of connections set
+        self.timeouts = 0
+        if size is None:
+            self._idle = None
+            return
+        if min_size is None or min_size > size:
+            min_size = size
+        self.min_size = min_size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.pre_ping = pre_ping
+        self._cond = Condition()
+        # number of connections sets being opened, outside of the lock
+        self._opening = 0
+        # idle connections sets with the time they've been released, the most
+        # recently released one last
+        self._idle = deque()
+        now = time()
+        for i in range(min_size):
+            cnxset = source.wrapped_connection()
+            self._cnxsets.append(cnxset)
+            self._idle.append((cnxset, now))
 
     def qsize(self):
-        if self._queue is None:
+        """return the number of connections sets which may be acquired without
+        waiting
+        """
+        if self._idle is None:
             return None
+        with self._cond:
+            return len(self._idle) + self.size - len(self._cnxsets) - self._opening
 
-        return self._queue.qsize()
+    def in_use(self):
+        """return the number of acquired connections sets"""
+        if self._idle is None:
+            return None
+        return len(self._cnxsets) + self._opening - len(self._idle)
 
     def get(self):
-        if self._queue is None:
+        if self._idle is None:
             return self._source.wrapped_connection()
-
-        try:
-            return self._queue.get(True, timeout=5)
-        except queue.Empty:
-            raise Exception('no connections set available after 5 secs, probably either a '
-                            'bug in code (too many uncommited/rolled back '
-                            'connections) or too much load on the server (in '
-                            'which case you can try to set a bigger '
-                            'connections pool size)')
+        t0 = time()
+        with self._cond:
+            reaped = self._reap(t0)
+            while True:
+                if self._idle:
+                    cnxset = self._idle.pop()[0]
+                    break
+                if len(self._cnxsets) + self._opening < self.size:
+                    cnxset = None
+                    self._opening += 1
+                    break
+                remaining = t0 + self.timeout - time()
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    self.timeouts += 1
+                    statsd_c('cnxset_acquire_timeout')
+                    raise NoCnxSetAvailable(
+                        'no connections set available after %s secs, probably '
+                        'either a bug in code (too many uncommited/rolled back '
+                        'connections) or too much load on the server (in '
+                        'which case you can try to set a bigger connections '
+                        'pool size)' % self.timeout)
+        self._close(reaped)
+        if cnxset is None:
+            cnxset = self._open()
+        elif self.pre_ping:
+            try:
+                cnxset.ping()
+            except Exception:
+                # the database can't be reached, forget about this connections
+                # set so that it doesn't occupy a slot of the pool
+                self._discard(cnxset)
+                raise
+        statsd_t('cnxset_acquire_wait', 1000 * (time() - t0))
+        statsd_g('cnxset_in_use', self.in_use())
+        return cnxset
 
     def release(self, cnxset):
-        if self._queue is None:
+        if self._idle is None:
             cnxset.close(True)
-        else:
-            self._queue.put_nowait(cnxset)
+            return
+        now = time()
+        with self._cond:
+            self._idle.append((cnxset, now))
+            reaped = self._reap(now)
+            self._cond.notify()
+        self._close(reaped)
+        statsd_g('cnxset_in_use', self.in_use())
 
     def __iter__(self):
-        for cnxset in self._cnxsets:
+        for cnxset in list(self._cnxsets):
             yield cnxset
 
     def close(self):
         # XXX we don't close the connection when there is no queue?
-        if self._queue is not None:
-            while not self._queue.empty():
-                cnxset = self._queue.get_nowait()
+        if self._idle is not None:
+            with self._cond:
+                idle = [cnxset for cnxset, _ in self._idle]
+                self._idle.clear()
+            self._close(idle)
 
-                try:
-                    cnxset.close(True)
-                except Exception as e:
-                    self.exception('error while closing %s, error: %s' % (cnxset, e))
+    # internals ###############################################################
+
+    def _open(self):
+        """open a new connections set, a slot having been reserved for it by
+        incrementing `_opening`
+        """
+        try:
+            cnxset = self._source.wrapped_connection()
+        except Exception:
+            with self._cond:
+                self._opening -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._opening -= 1
+            self._cnxsets.append(cnxset)
+        return cnxset
+
+    def _discard(self, cnxset):
+        with self._cond:
+            self._cnxsets.remove(cnxset)
+            self._cond.notify()
+        self._close([cnxset])
+
+    def _reap(self, now):
+        """remove from the pool connections sets idle for more than
+        `idle_timeout` seconds and return them, while keeping at least
+        `min_size` connections sets. Must be called with the lock held.
+        """
+        reaped = []
+        if self.idle_timeout is None:
+            return reaped
+        while (self._idle and len(self._cnxsets) > self.min_size
+               and now - self._idle[0][1] > self.idle_timeout):
+            cnxset = self._idle.popleft()[0]
+            self._cnxsets.remove(cnxset)
+            reaped.append(cnxset)
+        if reaped:
+            statsd_c('cnxset_reaped', len(reaped))
+        return reaped
+
+    def _close(self, cnxsets):
+        for cnxset in cnxsets:
+            try:
+                cnxset.close(True)
+            except Exception as e:
+                self.exception('error while closing %s, error: %s' % (cnxset, e))
+
+    # these are overridden by set_log_methods below
+    # only defining here to prevent pylint from complaining
+    info = warning = error = critical = exception = debug = lambda msg, *a, **kw: None
+
+
+class _EidTypeCache:
+    """Cache of entity types by eid, holding at most `maxsize` entries (no
+    limit if None). The least recently used entries are dropped first.
+    """
+
+    def __init__(self, maxsize=None):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = Lock()
+        # some cache usage stats
+        self.cache_hit, self.cache_miss = 0, 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, eid):
+        return eid in self._data
+
+    def __getitem__(self, eid):
+        with self._lock:
+            try:
+                etype = self._data[eid]
+            except KeyError:
+                self.cache_miss += 1
+                raise
+            self._data.move_to_end(eid)
+            self.cache_hit += 1
+            return etype
+
+    def __setitem__(self, eid, etype):
+        with self._lock:
+            self._data[eid] = etype
+            self._data.move_to_end(eid)
+            if self.maxsize is not None and len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, eid, *args):
+        with self._lock:
+            return self._data.pop(eid, *args)
+
+    def items(self):
+        """Return a list of (eid, etype) couples in the cache"""
+        with self._lock:
+            return list(self._data.items())
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
 
 
 class Repository(object):
@@ -229,9 +400,18 @@ class Repository(object):
         # querier helper, need to be created after sources initialization
         self.querier = querier.QuerierHelper(self, self.schema)
         # cache eid -> type
-        self._type_cache = {}
+        self._type_cache = _EidTypeCache(config['type-cache-size'])
         # the hooks manager
         self.hm = hook.HooksManager(self.vreg)
+        # persistent mail queue, if configured
+        if config['mail-queue-dir']:
+            self.mail_outbox = MailOutbox(
+                config, config['mail-queue-dir'],
+                batch_size=config['mail-queue-batch-size'],
+                max_attempts=config['mail-queue-max-attempts'],
+                retry_delay=config['mail-queue-retry-delay'])
+        else:
+            self.mail_outbox = None
 
     def bootstrap(self):
         self.info('starting repository from %s', self.config.apphome)
@@ -295,10 +475,40 @@ class Repository(object):
         # 4. close initialization connection set and reopen fresh ones for
         #    proper initialization
         self.cnxsets.close()
-        self.cnxsets = _CnxSetPool(self.system_source, pool_size)
+        self._cnxsets_size = pool_size
+        self.cnxsets = self._open_cnxsets()
         # 5. call instance level initialisation hooks
         self.hm.call_hooks('server_startup', repo=self)
 
+    def _open_cnxsets(self):
+        config = self.config
+        return _CnxSetPool(
+            self.system_source, self._cnxsets_size,
+            min_size=config['connections-pool-min-size'],
+            timeout=config['connections-pool-timeout'],
+            idle_timeout=config['connections-pool-idle-timeout'],
+            pre_ping=config['connections-pool-pre-ping'])
+
+    def prepare_fork(self):
+        """prepare the bootstrapped repository to be shared by processes forked
+        from the current one, by closing its connections to the database and
+        to the SMTP server. The current process should then not use the
+        repository anymore.
+        """
+        self.cnxsets.close()
+        self.system_source.eid_generator.close()
+        if self.mail_outbox is not None:
+            self.mail_outbox.close()
+
+    def after_fork(self):
+        """reinitialize the repository in a process forked after
+        :meth:`prepare_fork`, opening its own connections to the database
+        """
+        # threads of the parent process don't exist in forked processes
+        del self._running_threads[:]
+        self.system_source.init_eid_generator()
+        self.cnxsets = self._open_cnxsets()
+
     def source_by_uri(self, uri):
         with self.internal_cnx() as cnx:
             rset = cnx.find('CWSource', name=uri)
@@ -375,11 +585,31 @@ class Repository(object):
         self.schema = schema
 
     def deserialize_schema(self):
-        """load schema from the database"""
-        from cubicweb.server.schemaserial import deserialize_schema
-        appschema = schema.CubicWebSchema(self.config.appid)
-        self.debug('deserializing db schema into %s %#x', appschema.name, id(appschema))
+        """load schema from the database, or from its snapshot in the
+        `schema-snapshot-dir` directory if the schema didn't change since it has
+        been taken
+        """
+        from cubicweb.server.schemaserial import (
+            deserialize_schema, schema_snapshot_key, load_schema_snapshot,
+            dump_schema_snapshot)
+        snapshot_key = None
         with self.internal_cnx() as cnx:
+            if self.config['schema-snapshot-dir']:
+                snapshot = osp.join(self.config['schema-snapshot-dir'],
+                                    '%s-schema.pickle' % self.config.appid)
+                snapshot_key = schema_snapshot_key(cnx)
+            if snapshot_key is not None:
+                try:
+                    appschema = load_schema_snapshot(snapshot, snapshot_key)
+                except Exception:
+                    self.warning('unable to load schema snapshot %s', snapshot,
+                                 exc_info=True)
+                    appschema = None
+                if appschema is not None:
+                    self.info('schema loaded from snapshot %s', snapshot)
+                    return appschema
+            appschema = schema.CubicWebSchema(self.config.appid)
+            self.debug('deserializing db schema into %s %#x', appschema.name, id(appschema))
             try:
                 deserialize_schema(appschema, cnx)
             except BadSchemaDefinition:
@@ -388,6 +618,14 @@ class Repository(object):
                 import traceback
                 traceback.print_exc()
                 raise Exception('Is the database initialised ? (cause: %s)' % ex)
+        if snapshot_key is not None:
+            try:
+                dump_schema_snapshot(appschema, snapshot, snapshot_key)
+            except Exception:
+                self.warning('unable to write schema snapshot %s', snapshot,
+                             exc_info=True)
+            else:
+                self.info('schema snapshot written to %s', snapshot)
         return appschema
 
     def has_scheduler(self):
@@ -455,6 +693,8 @@ class Repository(object):
             thread.join()
             self.info('thread %s finished', thread.getName())
         self.cnxsets.close()
+        if self.mail_outbox is not None:
+            self.mail_outbox.close()
         hits, misses = self.querier.rql_cache.cache_hit, self.querier.rql_cache.cache_miss
         try:
             self.info('rql st cache hit/miss: %s/%s (%s%% hits)', hits, misses,
@@ -465,6 +705,9 @@ class Repository(object):
             nocache = self.system_source.no_cache
             self.info('sql cache usage: %s/%s (%s%%)', hits + misses, nocache,
                       ((hits + misses) * 100) / (hits + misses + nocache))
+            hits, misses = self.querier.plan_cache.cache_hit, self.querier.plan_cache.cache_miss
+            self.info('compiled plan cache hit/miss: %s/%s (%s%% hits)', hits, misses,
+                      (hits * 100) / (hits + misses))
         except ZeroDivisionError:
             pass
 
@@ -640,7 +883,7 @@ class Repository(object):
 
     def clear_caches(self, eids=None):
         if eids is None:
-            self._type_cache = {}
+            self._type_cache.clear()
             etypes = None
         else:
             etypes = []
@@ -667,6 +910,29 @@ class Repository(object):
             self._type_cache[eid] = etype
             return etype
 
+    def types_from_eids(self, eids, cnx):
+        """Return a dictionary with the type of entities with id in `eids`,
+        querying the system source once for eids whose type isn't cached.
+
+        Unknown eids are missing from the returned dictionary.
+        """
+        etypes = {}
+        missing = set()
+        type_cache = self._type_cache
+        for eid in eids:
+            try:
+                eid = int(eid)
+            except ValueError:
+                continue
+            try:
+                etypes[eid] = type_cache[eid]
+            except KeyError:
+                missing.add(eid)
+        if missing:
+            for eid, etype in self.system_source.eid_types(cnx, missing):
+                type_cache[eid] = etypes[eid] = etype
+        return etypes
+
     def add_info(self, cnx, entity, source):
         """add type and source info for an eid into the system table,
         and index the entity with the full text index
@@ -911,16 +1177,25 @@ class Repository(object):
 
     def glob_delete_relation(self, cnx, subject, rtype, object):
         """delete a relation from the repository"""
+        self.glob_delete_relations(cnx, rtype, [(subject, object)])
+
+    def glob_delete_relations(self, cnx, rtype, eids_from_to):
+        """delete several relations of the same type from the repository
+
+        eids_from_to is a list of (subj_eid, obj_eid) tuples
+        """
         if server.DEBUG & server.DBG_REPO:
-            print('DELETE relation', subject, rtype, object)
+            for subject, object in eids_from_to:
+                print('DELETE relation', subject, rtype, object)
         source = self.system_source
         self.hm.call_hooks('before_delete_relation', cnx,
-                           eidfrom=subject, rtype=rtype, eidto=object)
-        source.delete_relation(cnx, subject, rtype, object)
-        rschema = self.schema.rschema(rtype)
-        cnx.update_rel_cache_del(subject, rtype, object, rschema.symmetric)
+                           rtype=rtype, eids_from_to=eids_from_to)
+        symmetric = self.schema.rschema(rtype).symmetric
+        for subject, object in eids_from_to:
+            source.delete_relation(cnx, subject, rtype, object)
+            cnx.update_rel_cache_del(subject, rtype, object, symmetric)
         self.hm.call_hooks('after_delete_relation', cnx,
-                           eidfrom=subject, rtype=rtype, eidto=object)
+                           rtype=rtype, eids_from_to=eids_from_to)
 
     # these are overridden by set_log_methods below
     # only defining here to prevent pylint from complaining
@@ -928,3 +1203,4 @@ class Repository(object):
 
 
 set_log_methods(Repository, getLogger('cubicweb.repository'))
+set_log_methods(_CnxSetPool, getLogger('cubicweb.repository'))
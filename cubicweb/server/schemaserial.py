@@ -18,13 +18,20 @@
 """functions for schema / permissions (de)serialization using RQL"""
 
 import json
+import os
+import os.path as osp
+import pickle
 import sys
 import sqlite3
+from contextlib import contextmanager
+
+import pkg_resources
 
 from logilab.common.shellutils import ProgressBar, DummyProgressBar
 
 from yams import BadSchemaDefinition, schema as schemamod, buildobjs as ybo, constraints
 
+from cubicweb import __version__ as cw_version
 from cubicweb import Binary, ETYPE_NAME_MAP
 from cubicweb.schema import (KNOWN_RPROPERTIES, CONSTRAINTS,
                              VIRTUAL_RTYPES)
@@ -289,6 +296,67 @@ def deserialize_schema(schema, cnx):
     schema.reading_from_database = False
 
 
+# schema snapshots ############################################################
+
+def schema_snapshot_key(cnx):
+    """return the key of a snapshot of the schema stored in the database, or None
+    if the database doesn't keep track of schema changes.
+
+    The key changes whenever the schema is modified (see
+    `NativeSQLSource.incr_schema_version`) or when the code building the
+    schema objects is upgraded.
+    """
+    version = cnx.repo.system_source.schema_version(cnx)
+    if version is None:
+        return None
+    return (version, cw_version, pkg_resources.get_distribution('yams').version,
+            tuple(sys.version_info[:2]))
+
+
+@contextmanager
+def _deep_pickling():
+    # schema objects are deeply nested
+    recursionlimit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(recursionlimit, 10000))
+    try:
+        yield
+    finally:
+        sys.setrecursionlimit(recursionlimit)
+
+
+def load_schema_snapshot(path, key):
+    """return the schema stored in the snapshot file `path`, or None if there is
+    no such file or if it's not a snapshot with the given `key`
+    """
+    try:
+        stream = open(path, 'rb')
+    except FileNotFoundError:
+        return None
+    with stream:
+        # the key is pickled first, so the schema is only read if it's current
+        if pickle.load(stream) != key:
+            return None
+        with _deep_pickling():
+            return pickle.load(stream)
+
+
+def dump_schema_snapshot(schema, path, key):
+    """store `schema` in the snapshot file `path`, using the given `key`"""
+    directory = osp.dirname(path)
+    if directory and not osp.isdir(directory):
+        os.makedirs(directory)
+    # several processes may write the snapshot at once
+    tmppath = '%s.%s.tmp' % (path, os.getpid())
+    try:
+        with open(tmppath, 'wb') as stream, _deep_pickling():
+            pickle.dump(key, stream, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(schema, stream, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmppath, path)
+    finally:
+        if osp.exists(tmppath):
+            os.unlink(tmppath)
+
+
 def deserialize_ertype_permissions(cnx):
     """return sect action:groups associations for the given
     entity or relation schema with its eid, according to schema's
@@ -135,8 +135,38 @@ the repository rather than the user running the command',
         ('connections-pool-size',
          {'type' : 'int',
           'default': 4,
-          'help': 'size of the connections pool. Each source supporting multiple \
-connections will have this number of opened connections.',
+          'help': 'maximum size of the connections pool. Each source supporting \
+multiple connections will have at most this number of opened connections.',
+          'group': 'main', 'level': 3,
+          }),
+        ('connections-pool-min-size',
+         {'type' : 'int',
+          'default': None,
+          'help': 'number of connections kept opened in the connections pool, \
+defaulting to connections-pool-size. Up to connections-pool-size connections \
+are opened on demand, those above this number being closed once idle for \
+connections-pool-idle-timeout.',
+          'group': 'main', 'level': 3,
+          }),
+        ('connections-pool-idle-timeout',
+         {'type' : 'time',
+          'default': '10min',
+          'help': 'time after which an idle connection above \
+connections-pool-min-size is closed.',
+          'group': 'main', 'level': 3,
+          }),
+        ('connections-pool-timeout',
+         {'type' : 'time',
+          'default': '5s',
+          'help': 'maximum time to wait for a connection of the pool to be \
+available before failing.',
+          'group': 'main', 'level': 3,
+          }),
+        ('connections-pool-pre-ping',
+         {'type' : 'yn',
+          'default': False,
+          'help': 'check connections are alive before handing them out from \
+the pool, reopening them if not (costs a database round trip).',
           'group': 'main', 'level': 3,
           }),
         ('rql-cache-size',
@@ -145,6 +175,32 @@ connections will have this number of opened connections.',
           'help': 'size of the parsed rql cache size.',
           'group': 'main', 'level': 3,
           }),
+        ('type-cache-size',
+         {'type' : 'int',
+          'default': 300000,
+          'help': 'maximum number of entity types by eid kept in cache, the '
+          'least recently used ones being dropped first.',
+          'group': 'main', 'level': 3,
+          }),
+        ('schema-snapshot-dir',
+         {'type' : 'string',
+          'default': None,
+          'help': 'directory where a snapshot of the schema read from the '
+          'database is stored, to be loaded on next startups instead of '
+          'reading the schema from the database again, until the schema is '
+          'changed.',
+          'group': 'main', 'level': 3,
+          }),
+        ('eid-range-size',
+         {'type' : 'int',
+          'default': 0,
+          'help': 'when greater than 1, number of eids reserved at once by \
+each repository process and then given locally to new entities, avoiding a \
+database round trip for each of them. Eids are then not ordered by creation \
+time among processes anymore and reserved eids not used when a process stops \
+are lost. Not supported with sqlite.',
+          'group': 'main', 'level': 3,
+          }),
         ('undo-enabled',
          {'type' : 'yn', 'default': False,
           'help': 'enable undo support',
@@ -172,6 +228,26 @@ detect updates / deletions.',
           'system (using cron for instance).',
           'group': 'main', 'level': 3,
           }),
+        ('deferred-full-text-indexation',
+         {'type' : 'yn', 'default': False,
+          'help': 'When activated, entities to index are only recorded in a '
+          'queue on commit, and are indexed later by a looping task of the '
+          'repository scheduler. Full-text search results may then be slightly '
+          'out of date.',
+          'group': 'main', 'level': 3,
+          }),
+        ('deferred-full-text-indexation-interval',
+         {'type' : 'time', 'default': '10s',
+          'help': 'interval between two runs of the deferred full-text '
+          'indexation task.',
+          'group': 'main', 'level': 3,
+          }),
+        ('deferred-full-text-indexation-batch-size',
+         {'type' : 'int', 'default': 1000,
+          'help': 'number of entities indexed in a transaction by the deferred '
+          'full-text indexation task.',
+          'group': 'main', 'level': 3,
+          }),
 
         # email configuration
         ('default-recipients-mode',
@@ -200,6 +276,38 @@ specific recipient rules.',
 notified of every changes.',
           'group': 'email', 'level': 2,
           }),
+        ('mail-queue-dir',
+         {'type' : 'string',
+          'default': None,
+          'help': 'directory where mails sent by the repository are spooled on '
+          'commit, to be sent by a looping task of the repository scheduler. '
+          'If not set, mails are sent by a thread started on commit.',
+          'group': 'email', 'level': 2,
+          }),
+        ('mail-queue-interval',
+         {'type' : 'time', 'default': '10s',
+          'help': 'interval between two runs of the task sending spooled mails.',
+          'group': 'email', 'level': 3,
+          }),
+        ('mail-queue-batch-size',
+         {'type' : 'int', 'default': 100,
+          'help': 'number of spooled mails sent in a row by the mail queue task.',
+          'group': 'email', 'level': 3,
+          }),
+        ('mail-queue-max-attempts',
+         {'type' : 'int', 'default': 10,
+          'help': 'number of attempts to send a spooled mail before giving up, '
+          'the delay between two attempts being doubled each time (starting '
+          'from mail-queue-retry-delay). Mails which could not be sent are '
+          'moved to the "failed" sub-directory of mail-queue-dir.',
+          'group': 'email', 'level': 3,
+          }),
+        ('mail-queue-retry-delay',
+         {'type' : 'time', 'default': '1min',
+          'help': 'delay before trying to send again a spooled mail which '
+          'could not be sent.',
+          'group': 'email', 'level': 3,
+          }),
          ('zmq-address-sub',
           {'type' : 'csv',
            'default' : (),
@@ -681,20 +681,21 @@ def _remote_dump(host, appid, output, sudo=False):
         raise ExecutionError('Error while deleting remote dump at /tmp/%s' % filename)
 
 
-def _local_dump(appid, output, format='native'):
+def _local_dump(appid, output, format='native', workers=1):
     config = ServerConfiguration.config_for(appid)
     config.quick_start = True
     mih = config.migration_handler(verbosity=1)
-    mih.backup_database(output, askconfirm=False, format=format)
+    mih.backup_database(output, askconfirm=False, format=format, workers=workers)
     mih.shutdown()
 
 
-def _local_restore(appid, backupfile, drop, format='native'):
+def _local_restore(appid, backupfile, drop, format='native', workers=1):
     config = ServerConfiguration.config_for(appid)
     config.verbosity = 1  # else we won't be asked for confirmation on problems
     config.quick_start = True
     mih = config.migration_handler(connect=False, verbosity=1)
-    mih.restore_database(backupfile, drop, askconfirm=False, format=format)
+    mih.restore_database(backupfile, drop, askconfirm=False, format=format,
+                         workers=workers)
     repo = mih.repo
     # version of the database
     dbversions = repo.get_versions()
@@ -776,6 +777,10 @@ class DBDumpCommand(Command):
           'help': '"native" format uses db backend utilities to dump the database. '
                   '"portable" format uses a database independent format'}
          ),
+        ('workers',
+         {'short': 'w', 'type': 'int', 'metavar': '<number>', 'default': 1,
+          'help': 'number of tables dumped in parallel with the "portable" format.'}
+         ),
     )
 
     def run(self, args):
@@ -784,7 +789,8 @@ class DBDumpCommand(Command):
             host, appid = appid.split(':')
             _remote_dump(host, appid, self.config.output, self.config.sudo)
         else:
-            _local_dump(appid, self.config.output, format=self.config.format)
+            _local_dump(appid, self.config.output, format=self.config.format,
+                        workers=self.config.workers)
 
 
 class DBRestoreCommand(Command):
@@ -807,6 +813,10 @@ class DBRestoreCommand(Command):
          {'short': 'f', 'default': 'native', 'type': 'choice',
           'choices': ('native', 'portable'),
           'help': 'the format used when dumping the database'}),
+        ('workers',
+         {'short': 'w', 'type': 'int', 'metavar': '<number>', 'default': 1,
+          'help': 'number of tables restored in parallel with the "portable" format.'}
+         ),
     )
 
     def run(self, args):
@@ -822,7 +832,8 @@ class DBRestoreCommand(Command):
                         raise
         _local_restore(appid, backupfile,
                        drop=not self.config.no_drop,
-                       format=self.config.format)
+                       format=self.config.format,
+                       workers=self.config.workers)
         if self.config.format == 'portable':
             try:
                 CWCTL.run(['db-rebuild-fti', appid])
@@ -867,6 +878,10 @@ class DBCopyCommand(Command):
           'help': '"native" format uses db backend utilities to dump the database. '
                   '"portable" format uses a database independent format'}
          ),
+        ('workers',
+         {'short': 'w', 'type': 'int', 'metavar': '<number>', 'default': 1,
+          'help': 'number of tables dumped and restored in parallel with the "portable" format.'}
+         ),
     )
 
     def run(self, args):
@@ -878,9 +893,10 @@ class DBCopyCommand(Command):
             host, srcappid = srcappid.split(':')
             _remote_dump(host, srcappid, output, self.config.sudo)
         else:
-            _local_dump(srcappid, output, format=self.config.format)
+            _local_dump(srcappid, output, format=self.config.format,
+                        workers=self.config.workers)
         _local_restore(destappid, output, not self.config.no_drop,
-                       self.config.format)
+                       self.config.format, workers=self.config.workers)
         if self.config.keep_dump:
             print('-> you can get the dump file at', output)
         else:
@@ -960,20 +976,63 @@ class RebuildFTICommand(Command):
 
     If no etype is specified, cubicweb will reindex everything, otherwise
     only specified etypes will be considered.
+
+    With postgres, the `--shadow` option rebuilds the index into a shadow table,
+    swapped with the current index once complete, so that full-text search
+    keeps working meanwhile. Such a rebuild may be resumed if interrupted, or
+    discarded using the `--abort` option.
     """
     name = 'db-rebuild-fti'
     arguments = '<instance>'
     min_args = 1
+    options = (
+        ('shadow',
+         {'short': 's', 'action': 'store_true', 'default': False,
+          'help': 'rebuild the index into a shadow table, swapped with the '
+          'current index once complete (postgres only).'}
+         ),
+        ('resume',
+         {'short': 'r', 'action': 'store_true', 'default': False,
+          'help': 'resume an interrupted shadow rebuild (implies --shadow).'}
+         ),
+        ('abort',
+         {'action': 'store_true', 'default': False,
+          'help': 'discard an interrupted shadow rebuild, dropping its '
+          'tables and trigger, without rebuilding the index.'}
+         ),
+        ('workers',
+         {'short': 'w', 'type': 'int', 'metavar': '<number>', 'default': 1,
+          'help': 'number of processes indexing entity types in parallel for '
+          'a shadow rebuild.'}
+         ),
+        ('batch-size',
+         {'type': 'int', 'metavar': '<number>', 'default': 1000,
+          'help': 'number of entities indexed between two checkpoints of a '
+          'shadow rebuild.'}
+         ),
+    )
 
     def run(self, args):
-        from cubicweb.server.checkintegrity import reindex_entities
+        from cubicweb.server.checkintegrity import (
+            reindex_entities, rebuild_fti, abort_fti_rebuild)
         appid = args.pop(0)
         etypes = args or None
         config = ServerConfiguration.config_for(appid)
         repo, cnx = repo_cnx(config)
         with cnx:
-            reindex_entities(repo.schema, cnx, etypes=etypes)
-            cnx.commit()
+            if self.config.abort:
+                if abort_fti_rebuild(cnx):
+                    print('-> interrupted full-text index rebuild discarded')
+                else:
+                    print('-> no full-text index rebuild to discard')
+            elif self.config.shadow or self.config.resume:
+                rebuild_fti(repo.schema, cnx, etypes=etypes,
+                            nb_workers=self.config.workers,
+                            resume=self.config.resume,
+                            batch_size=self.config.batch_size)
+            else:
+                reindex_entities(repo.schema, cnx, etypes=etypes)
+                cnx.commit()
 
 
 class RepositorySchedulerCommand(Command):
@@ -23,6 +23,7 @@ from uuid import uuid4
 from contextlib import contextmanager
 from logging import getLogger
 
+from logilab.common.deprecation import deprecated
 from logilab.common.registry import objectify_predicate
 
 from cubicweb import QueryError, ProgrammingError, schema, server
@@ -240,7 +241,6 @@ class Connection(RequestSessionBase):
         # when :attr:`_hooks_mode` is `HOOKS_ALLOW_ALL`, it contains hooks
         # categories that are disabled.
         self._hooks_categories = set()
-        self.pruned_hooks_cache = {}
 
         # security control attributes
         self._read_security = DEFAULT_SECURITY  # handled by a property
@@ -376,7 +376,6 @@ class Connection(RequestSessionBase):
         self.pending_operations = []
         #: (None, 'precommit', 'postcommit', 'uncommitable')
         self.commit_state = None
-        self.pruned_hooks_cache = {}
         self.local_perm_cache.clear()
         self.rewriter = RQLRewriter(self)
 
@@ -608,6 +607,13 @@ class Connection(RequestSessionBase):
         """
         return self.is_hook_category_activated(hook.category)
 
+    @property
+    @deprecated('[3.28] pruned hooks are cached by hooks registries, shared '
+                'by all connections')
+    def pruned_hooks_cache(self):
+        """cache of pruned hooks, now shared by all connections"""
+        return self.vreg.pruned_hooks_cache
+
     # Security management #####################################################
 
     @_open_only
@@ -667,6 +673,18 @@ class Connection(RequestSessionBase):
         rset.req = self
         return rset
 
+    @_open_only
+    def execute_iter(self, rql, kwargs=None, build_descr=True, chunk_size=1000):
+        """execute a SELECT query and return an iterator on result sets of at
+        most `chunk_size` rows, to process large results in constant memory.
+
+        See :meth:`cubicweb.server.querier.QuerierHelper.execute_iter`.
+        """
+        for rset in self.repo.querier.execute_iter(self, rql, kwargs, build_descr,
+                                                   chunk_size):
+            rset.req = self
+            yield rset
+
     @_open_only
     def rollback(self):
         """rollback the current transaction"""
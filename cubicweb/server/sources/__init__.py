@@ -25,7 +25,7 @@ from logilab.common.textutils import unormalize
 
 from yams.schema import role_name
 
-from cubicweb import ValidationError, set_log_methods, server, _
+from cubicweb import ValidationError, UnknownEid, set_log_methods, server, _
 from cubicweb.server import SOURCE_TYPES
 from cubicweb.misc.source_highlight import highlight_terminal
 
@@ -121,11 +121,11 @@ class AbstractSource(object):
     def __ne__(self, other):
         return not (self == other)
 
-    def backup(self, backupfile, confirm, format='native'):
+    def backup(self, backupfile, confirm, format='native', workers=1):
         """method called to create a backup of source's data"""
         pass
 
-    def restore(self, backupfile, confirm, drop, format='native'):
+    def restore(self, backupfile, confirm, drop, format='native', workers=1):
         """method called to restore a backup of source's data"""
         pass
 
@@ -297,6 +297,18 @@ class AbstractSource(object):
         """Return the type of entity `eid`."""
         raise NotImplementedError(self)
 
+    def eid_types(self, cnx, eids):
+        """Return an iterator on (eid, type) for entities in `eids`, unknown
+        eids being skipped.
+        """
+        # override in derived classes if you feel you can
+        # optimize
+        for eid in eids:
+            try:
+                yield eid, self.eid_type(cnx, eid)
+            except UnknownEid:
+                continue
+
     def create_eid(self, cnx):
         raise NotImplementedError(self)
 
@@ -18,16 +18,23 @@
 """Adapters for native cubicweb sources."""
 
 from threading import Lock
-from datetime import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time as dtime, timedelta
+from decimal import Decimal
 from contextlib import contextmanager
 from os.path import basename
+import json
 import pickle
 import re
 import itertools
 import traceback
 import time
 import zipfile
+import zlib
+import uuid
 import logging
+import sqlite3
 import sys
 
 from logilab.common.decorators import cached, clear_cache
@@ -41,7 +48,7 @@ from cubicweb import (UnknownEid, AuthenticationError, ValidationError, Binary,
                       UniqueTogetherError, UndoTransactionException, ViolatedConstraint)
 from cubicweb import transaction as tx, server, neg_role, _
 from cubicweb.utils import QueryCache
-from cubicweb.debug import emit_to_debug_channel
+from cubicweb.debug import emit_to_debug_channel, should_emit_to_debug_channel, DebugMessage
 from cubicweb.schema import VIRTUAL_RTYPES
 from cubicweb.cwconfig import CubicWebNoAppConfiguration
 from cubicweb.server import hook
@@ -238,6 +245,62 @@ class DefaultEidGenerator(object):
             return eid
 
 
+class PreallocatedEidGenerator(DefaultEidGenerator):
+    """Eid generator reserving ranges of `range_size` eids from the database
+    and handing them out locally, so that most single eid creations don't need
+    a database round trip nor to wait for other threads doing one. The next
+    range is reserved in a separated thread once the current one is three
+    quarters used.
+
+    Eids are not given in creation order among processes anymore, and those
+    remaining in reserved ranges are lost when the process stops.
+    """
+    __slots__ = ('range_size', 'range_lock', '_next', '_last', '_reserved',
+                 '_reserving')
+
+    def __init__(self, source, range_size):
+        super(PreallocatedEidGenerator, self).__init__(source)
+        self.range_size = range_size
+        self.range_lock = Lock()
+        # next eid to give and last eid of the current range
+        self._next, self._last = 1, 0
+        # last eid of the next range, once reserved
+        self._reserved = None
+        self._reserving = False
+
+    def create_eid(self, _cnx, count=1):
+        if count != 1:
+            # ranges of eids have to be contiguous, reserve them directly
+            return super(PreallocatedEidGenerator, self).create_eid(_cnx, count)
+        with self.range_lock:
+            if self._next > self._last:
+                if self._reserved is None:
+                    self._reserved = super(PreallocatedEidGenerator, self).create_eid(
+                        _cnx, self.range_size)
+                self._next = self._reserved - self.range_size + 1
+                self._last, self._reserved = self._reserved, None
+            eid = self._next
+            self._next += 1
+            reserve = (self._reserved is None and not self._reserving
+                       and (self._last - eid) * 4 <= self.range_size)
+            if reserve:
+                self._reserving = True
+        if reserve:
+            self.source.repo.threaded_task(self._reserve_range)
+        return eid
+
+    def _reserve_range(self):
+        try:
+            last = DefaultEidGenerator.create_eid(self, None, self.range_size)
+        except Exception:
+            with self.range_lock:
+                self._reserving = False
+            raise
+        with self.range_lock:
+            self._reserved = last
+            self._reserving = False
+
+
 class SQLITEEidGenerator(object):
     __slots__ = ('source', 'lock')
 
@@ -261,6 +324,11 @@ class NativeSQLSource(SQLAdapterMixIn, AbstractSource):
     """adapter for source using the native cubicweb schema (see below)
     """
     sqlgen_class = SQLGenerator
+    # maximum number of eids given to a single query by eid_types
+    eid_types_chunk_size = 1000
+    # number of entities whose computed attribute is recomputed by a single
+    # query by update_computed_attribute
+    computed_attribute_batch_size = 100
     options = (
         ('db-driver',
          {'type': 'string',
@@ -324,6 +392,13 @@ class NativeSQLSource(SQLAdapterMixIn, AbstractSource):
           'help': 'sql statement timeout, in milliseconds (postgres only)',
           'group': 'native-source', 'level': 2,
           }),
+        ('db-fetch-size',
+         {'type': 'int',
+          'default': 1000,
+          'help': 'number of rows fetched at once from the database when '
+          'processing query results',
+          'group': 'native-source', 'level': 2,
+          }),
     )
 
     def __init__(self, repo, source_config, *args, **kwargs):
@@ -337,13 +412,25 @@ class NativeSQLSource(SQLAdapterMixIn, AbstractSource):
                                              ATTR_MAP.copy())
         # full text index helper
         self.do_fti = not repo.config['delay-full-text-indexation']
+        # record entities to index in a queue, indexed by a looping task
+        self.fti_deferred = repo.config['deferred-full-text-indexation']
         # sql queries cache
         self._cache = QueryCache(repo.config['rql-cache-size'])
         # (etype, attr) / storage mapping
         self._storages = {}
         self.binary_to_str = self.dbhelper.dbapi_module.binary_to_str
+        self.init_eid_generator()
+
+    def init_eid_generator(self):
+        """create the eid generator, also called in processes forked from the
+        one where the source has been initialized so that they don't share
+        reserved eids
+        """
         if self.dbdriver == 'sqlite':
             self.eid_generator = SQLITEEidGenerator(self)
+        elif self.repo.config['eid-range-size'] > 1:
+            self.eid_generator = PreallocatedEidGenerator(
+                self, self.repo.config['eid-range-size'])
         else:
             self.eid_generator = DefaultEidGenerator(self)
         self.create_eid = self.eid_generator.create_eid
@@ -397,8 +484,11 @@ class NativeSQLSource(SQLAdapterMixIn, AbstractSource):
                 _cnxset.cnxset_freed()
                 self.repo.cnxsets.release(_cnxset)
 
-    def backup(self, backupfile, confirm, format='native'):
-        """method called to create a backup of the source's data"""
+    def backup(self, backupfile, confirm, format='native', workers=1):
+        """method called to create a backup of the source's data, `workers`
+        being the number of tables dumped in parallel with the 'portable'
+        format
+        """
         if format == 'portable':
             # ensure the schema is the one stored in the database: if repository
             # started in quick_start mode, the file system's one has been loaded
@@ -406,7 +496,7 @@ class NativeSQLSource(SQLAdapterMixIn, AbstractSource):
             if self.repo.config.quick_start:
                 self.repo.set_schema(self.repo.deserialize_schema(),
                                      resetvreg=False)
-            helper = DatabaseIndependentBackupRestore(self)
+            helper = DatabaseIndependentBackupRestore(self, workers)
             self.close_source_connections()
             try:
                 helper.backup(backupfile)
@@ -421,10 +511,13 @@ class NativeSQLSource(SQLAdapterMixIn, AbstractSource):
         else:
             raise ValueError('Unknown format %r' % format)
 
-    def restore(self, backupfile, confirm, drop, format='native'):
-        """method called to restore a backup of source's data"""
+    def restore(self, backupfile, confirm, drop, format='native', workers=1):
+        """method called to restore a backup of source's data, `workers`
+        being the number of tables restored in parallel with the 'portable'
+        format
+        """
         if format == 'portable':
-            helper = DatabaseIndependentBackupRestore(self)
+            helper = DatabaseIndependentBackupRestore(self, workers)
             helper.restore(backupfile)
         elif format == 'native':
             self.restore_from_file(backupfile, confirm, drop=drop)
@@ -480,6 +573,8 @@ class NativeSQLSource(SQLAdapterMixIn, AbstractSource):
     def set_schema(self, schema):
         """set the instance'schema"""
         self._cache = QueryCache(self.repo.config['rql-cache-size'])
+        # compiled computed attributes formulas {(rdef, formula, restricted): sql}
+        self._computed_attributes_sql = {}
         self.cache_hit, self.cache_miss, self.no_cache = 0, 0, 0
         self.schema = schema
         try:
@@ -490,6 +585,96 @@ class NativeSQLSource(SQLAdapterMixIn, AbstractSource):
             authentifier.set_schema(self.schema)
         clear_cache(self, 'need_fti_indexation')
 
+    def computed_attribute_sql(self, cnx, rdef, restricted=False):
+        """return SQL selecting (eid, value) couples of computed attribute
+        `rdef` for entities of its subject type, or None if its formula can't
+        be computed by a single query without post-processing.
+
+        If `restricted` is true, entities are restricted to those whose eid is
+        given by one of the `e0` to `e<n>` query arguments, n being
+        :attr:`computed_attribute_batch_size` - 1.
+        """
+        # formula may be changed by migration
+        key = (rdef, rdef.formula, restricted)
+        try:
+            return self._computed_attributes_sql[key]
+        except KeyError:
+            pass
+        sql = None
+        if u'%s.%s' % (rdef.subject, rdef.rtype) not in self._rql_sqlgen.attr_map:
+            rqlst = self.repo.vreg.rqlhelper.parse(rdef.formula)
+            select = rqlst.children[0]
+            xvar = select.get_variable('X')
+            select.add_selected(xvar, index=0)
+            select.add_group_var(xvar, index=0)
+            select.add_type_restriction(xvar, str(rdef.subject))
+            self.repo.vreg.solutions(cnx, rqlst, {})
+            if restricted:
+                select.add_eid_restriction(
+                    xvar, ['e%s' % i for i in range(self.computed_attribute_batch_size)],
+                    'Substitute')
+            rqlst.restricted_vars = ()
+            self.repo.querier.sqlgen_annotate(rqlst)
+            set_qdata(self.schema.rschema, rqlst, ())
+            sql, qargs, needs_source_cb = self._rql_sqlgen.generate(rqlst)
+            if qargs or needs_source_cb:
+                sql = None
+        self._computed_attributes_sql[key] = sql
+        return sql
+
+    def update_computed_attribute(self, cnx, rdef, eids=None,
+                                  modification_date=None):
+        """recompute the value of computed attribute `rdef` for entities of
+        `eids` (or all entities of its subject type if None) using a single
+        query per batch of :attr:`computed_attribute_batch_size` eids, also
+        setting `modification_date` of modified entities if specified. Eids are
+        restricted in the query computing the formula, so that its cost
+        doesn't depend on the number of entities of the subject type.
+
+        Entities are updated without calling hooks nor recording undo
+        information: see :meth:`RecomputeAttributeOperation.bulk_recompute` in
+        :mod:`cubicweb.hooks.synccomputed` for what's done instead.
+
+        Return the list of eids of modified entities, or None if this is not
+        supported by the backend (UPDATE ... FROM and RETURNING require sqlite
+        3.35) or for this attribute.
+        """
+        if self.dbdriver == 'sqlite':
+            if sqlite3.sqlite_version_info < (3, 35):
+                return None
+        elif self.dbdriver != 'postgres':
+            return None
+        sql = self.computed_attribute_sql(cnx, rdef, restricted=eids is not None)
+        if sql is None:
+            return None
+        table, column = rdef_table_column(rdef)
+        assignments = ['%s=_ca.value' % column]
+        args = {}
+        if modification_date is not None:
+            assignments.append('%smodification_date=%%(mdate)s' % SQL_PREFIX)
+            args['mdate'] = modification_date
+        distinct = 'IS DISTINCT FROM' if self.dbdriver == 'postgres' else 'IS NOT'
+        sql = ('WITH _ca(eid, value) AS (%s) UPDATE %s SET %s FROM _ca '
+               'WHERE %s.%seid=_ca.eid AND %s.%s %s _ca.value' % (
+                   sql, table, ', '.join(assignments),
+                   table, SQL_PREFIX, table, column, distinct))
+        sql += ' RETURNING %seid' % SQL_PREFIX
+        if eids is None:
+            cu = self.doexec(cnx, sql, self.merge_args(args, {}))
+            return [eid for eid, in cu.fetchall()]
+        modified = []
+        eids = sorted(eids)
+        batch_size = self.computed_attribute_batch_size
+        for i in range(0, len(eids), batch_size):
+            batch = eids[i:i + batch_size]
+            # fill the batch with its last eid, so the query has a fixed shape
+            batch += batch[-1:] * (batch_size - len(batch))
+            batchargs = dict(('e%s' % j, eid) for j, eid in enumerate(batch))
+            batchargs.update(args)
+            cu = self.doexec(cnx, sql, self.merge_args(batchargs, {}))
+            modified += [eid for eid, in cu.fetchall()]
+        return modified
+
     @statsd_timeit
     def authenticate(self, cnx, login, **kwargs):
         """return CWUser eid for the given login and other authentication
@@ -511,20 +696,32 @@ class NativeSQLSource(SQLAdapterMixIn, AbstractSource):
         may be cached using this key.
         """
         assert dbg_st_search(self.uri, union, args, cachekey)
+        sql, qargs, cbs = self.compile_syntax_tree(union, args, cachekey)
+        return self.sql_search(cnx, sql, qargs, cbs, args,
+                               rql_query_tracing_token=rql_query_tracing_token)
+
+    def compile_syntax_tree(self, union, args=None, cachekey=None):
+        """return a (sql, sql arguments, column callbacks) tuple for the given
+        rql syntax tree. If cachekey is given, the result may be cached using
+        this key.
+        """
         # remember number of actually selected term (sql generation may append some)
         if cachekey is None:
             self.no_cache += 1
             # generate sql query if we are able to do so (not supported types...)
+            return self._rql_sqlgen.generate(union, args)
+        # sql may be cached
+        try:
+            sql, qargs, cbs = self._cache[cachekey]
+            self.cache_hit += 1
+        except KeyError:
+            self.cache_miss += 1
             sql, qargs, cbs = self._rql_sqlgen.generate(union, args)
-        else:
-            # sql may be cached
-            try:
-                sql, qargs, cbs = self._cache[cachekey]
-                self.cache_hit += 1
-            except KeyError:
-                self.cache_miss += 1
-                sql, qargs, cbs = self._rql_sqlgen.generate(union, args)
-                self._cache[cachekey] = sql, qargs, cbs
+            self._cache[cachekey] = sql, qargs, cbs
+        return sql, qargs, cbs
+
+    def sql_search(self, cnx, sql, qargs, cbs, args=None, rql_query_tracing_token=None):
+        """return result of a sql query generated by `compile_syntax_tree`"""
         args = self.merge_args(args, qargs)
         assert isinstance(sql, str), repr(sql)
         cursor = cnx.system_sql(sql, args, rql_query_tracing_token=rql_query_tracing_token)
@@ -532,6 +729,69 @@ class NativeSQLSource(SQLAdapterMixIn, AbstractSource):
         assert dbg_results(results)
         return results
 
+    def sql_search_iter(self, cnx, sql, qargs, cbs, args=None, chunk_size=1000,
+                        rql_query_tracing_token=None):
+        """return an iterator on lists of at most `chunk_size` results of a sql
+        query generated by `compile_syntax_tree`. Results are fetched using a
+        server-side cursor on postgres.
+
+        The server-side cursor is declared WITH HOLD so that the transaction
+        may be committed while iterating, remaining results being then
+        materialized by the database. It doesn't survive a rollback though.
+        """
+        args = self.merge_args(args, qargs)
+        assert isinstance(sql, str), repr(sql)
+        # the connections set may have been released or swapped once the
+        # iterator is closed: keep the connection the cursor is opened on
+        dbcnx = cnx.cnxset.cnx
+        if self.dbdriver == 'postgres':
+            # named cursors are server-side ones
+            cursorname = 'cw_%s' % uuid.uuid4().hex
+            cursor = dbcnx.cursor(cursorname, withhold=True)
+            cursor.itersize = chunk_size
+        else:
+            # don't use the shared cursor, which may be used by other queries
+            # while iterating
+            cursorname = None
+            cursor = dbcnx.cursor()
+        try:
+            self.doexec(cnx, sql, args, cursor=cursor,
+                        rql_query_tracing_token=rql_query_tracing_token)
+            results = self.iter_process_result(cursor, cnx, cbs)
+            while True:
+                chunk = list(itertools.islice(results, chunk_size))
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            if cursorname is None:
+                cursor.close()
+            else:
+                self._close_held_cursor(dbcnx, cursor, cursorname)
+
+    def _close_held_cursor(self, dbcnx, cursor, cursorname):
+        """close the server-side `cursor` named `cursorname`, opened on the
+        DB-API connection `dbcnx`, if it still exists
+
+        A cursor held across transactions has to be closed explicitly, unless
+        it has been dropped by a rollback: closing it would then fail and abort
+        the current transaction. Queries are executed on `dbcnx` without going
+        through :meth:`doexec`, so that a failure doesn't roll back the
+        transaction.
+        """
+        try:
+            checkcursor = dbcnx.cursor()
+            try:
+                checkcursor.execute('SELECT 1 FROM pg_cursors WHERE name=%(name)s',
+                                    {'name': cursorname})
+                if checkcursor.fetchone():
+                    cursor.close()
+            finally:
+                checkcursor.close()
+        except Exception:  # let KeyboardInterrupt / SystemExit propagate
+            self.warning('unable to close server-side cursor %s', cursorname,
+                         exc_info=True)
+
     @contextmanager
     def _fixup_cw(self, cnx, entity):
         _cw = entity._cw
@@ -591,25 +851,43 @@ class NativeSQLSource(SQLAdapterMixIn, AbstractSource):
                 changes = self._save_attrs(cnx, entity, attrs)
                 self._record_tx_action(cnx, 'tx_entity_actions', u'U',
                                        etype=entity.cw_etype, eid=entity.eid,
-                                       changes=self._binary(pickle.dumps(changes)))
+                                       changes=self._binary(encode_changes(changes)))
             sql = self.sqlgen.update(SQL_PREFIX + entity.cw_etype, attrs,
                                      ['cw_eid'])
             self.doexec(cnx, sql, attrs)
 
     def delete_entity(self, cnx, entity):
         """delete an entity from the source"""
-        with self._storage_handler(cnx, entity, 'deleted'):
+        self.delete_entities(cnx, [entity])
+
+    def delete_entities(self, cnx, entities):
+        """delete several entities from the source
+
+        When undo is supported, values of deleted entities are fetched using a
+        single query per entity type.
+        """
+        changes = {}
+        undoable = {}
+        for entity in entities:
             if cnx.ertype_supports_undo(entity.cw_etype):
-                attrs = [SQL_PREFIX + r.type
-                         for r in entity.e_schema.subject_relations()
-                         if (r.final or r.inlined) and r not in VIRTUAL_RTYPES]
-                changes = self._save_attrs(cnx, entity, attrs)
-                self._record_tx_action(cnx, 'tx_entity_actions', u'D',
-                                       etype=entity.cw_etype, eid=entity.eid,
-                                       changes=self._binary(pickle.dumps(changes)))
-            attrs = {'cw_eid': entity.eid}
-            sql = self.sqlgen.delete(SQL_PREFIX + entity.cw_etype, attrs)
-            self.doexec(cnx, sql, attrs)
+                undoable.setdefault(entity.cw_etype, []).append(entity)
+        for etype, etype_entities in undoable.items():
+            eschema = etype_entities[0].e_schema
+            attrs = [SQL_PREFIX + r.type
+                     for r in eschema.subject_relations()
+                     if (r.final or r.inlined) and r not in VIRTUAL_RTYPES]
+            changes.update(self._save_attrs_multi(
+                cnx, eschema, [entity.eid for entity in etype_entities], attrs))
+        for entity in entities:
+            with self._storage_handler(cnx, entity, 'deleted'):
+                if entity.cw_etype in undoable:
+                    self._record_tx_action(
+                        cnx, 'tx_entity_actions', u'D',
+                        etype=entity.cw_etype, eid=entity.eid,
+                        changes=self._binary(encode_changes(changes[entity.eid])))
+                attrs = {'cw_eid': entity.eid}
+                sql = self.sqlgen.delete(SQL_PREFIX + entity.cw_etype, attrs)
+                self.doexec(cnx, sql, attrs)
 
     def add_relation(self, cnx, subject, rtype, object, inlined=False):
         """add a relation to the source"""
@@ -684,22 +962,19 @@ class NativeSQLSource(SQLAdapterMixIn, AbstractSource):
         self.doexec(cnx, sql, attrs)
 
     @statsd_timeit
-    def doexec(self, cnx, query, args=None, rollback=True, rql_query_tracing_token=None):
-        """Execute a query.
+    def doexec(self, cnx, query, args=None, rollback=True, rql_query_tracing_token=None,
+               cursor=None):
+        """Execute a query, using the connections set's cursor unless another
+        one is given.
         it's a function just so that it shows up in profiling
         """
 
-        query_debug_informations = {
-            "sql": query,
-            "args": args,
-            "rollback": False,
-            "callstack": "".join(traceback.format_stack()[:-1]),
-            "rql_query_tracing_token": rql_query_tracing_token,
-        }
-
+        emit_debug = should_emit_to_debug_channel("sql")
+        rolled_back = False
         start = time.time()
 
-        cursor = cnx.cnxset.cu
+        if cursor is None:
+            cursor = cnx.cnxset.cu
         if server.DEBUG & server.DBG_SQL:
             print('exec', highlight_terminal(query, "SQL"), args, cnx.cnxset.cnx)
         try:
@@ -714,7 +989,7 @@ class NativeSQLSource(SQLAdapterMixIn, AbstractSource):
             if rollback:
                 try:
                     cnx.cnxset.rollback()
-                    query_debug_informations["rollback"] = True
+                    rolled_back = True
                     if self.repo.config.mode != 'test':
                         self.debug('transaction has been rolled back')
                 except Exception as rollback_exc:
@@ -759,8 +1034,14 @@ class NativeSQLSource(SQLAdapterMixIn, AbstractSource):
                                                  query=query)
             raise
         finally:
-            query_debug_informations["time"] = (time.time() - start) * 1000
-            emit_to_debug_channel("sql", query_debug_informations)
+            if emit_debug:
+                emit_to_debug_channel("sql", DebugMessage(
+                    sql=query,
+                    args=args,
+                    rollback=rolled_back,
+                    time=(time.time() - start) * 1000,
+                    rql_query_tracing_token=rql_query_tracing_token,
+                ))
         return cursor
 
     @statsd_timeit
@@ -853,6 +1134,18 @@ class NativeSQLSource(SQLAdapterMixIn, AbstractSource):
             self.exception('failed to query entities table for eid %s', eid)
         raise UnknownEid(eid)
 
+    def eid_types(self, cnx, eids):
+        """Return an iterator on (eid, type) for entities in `eids`, unknown
+        eids being skipped.
+        """
+        eids = sorted(int(eid) for eid in eids)
+        for i in range(0, len(eids), self.eid_types_chunk_size):
+            chunk = eids[i:i + self.eid_types_chunk_size]
+            sql = 'SELECT eid, type FROM entities WHERE eid IN (%s)' % ','.join(
+                str(eid) for eid in chunk)
+            for eid, etype in self.doexec(cnx, sql).fetchall():
+                yield eid, etype
+
     def _handle_is_relation_sql(self, cnx, sql, attrs):
         """ Handler for specific is_relation sql that may be
         overwritten in some stores"""
@@ -912,6 +1205,35 @@ class NativeSQLSource(SQLAdapterMixIn, AbstractSource):
             attrs = {'eid': '(%s)' % (in_eid,)}
             self.doexec(cnx, self.sqlgen.delete_many('entities', attrs), attrs)
 
+    # schema version ###########################################################
+
+    def _has_schema_version(self, cnx):
+        # the table doesn't exist until the 3.28 migration has been run
+        tables = set(t.lower() for t in self.dbhelper.list_tables(cnx.cnxset.cu))
+        if self.dbhelper.backend_name == 'postgres':
+            tables.update(t.lower() for t in self.dbhelper.list_tables(cnx.cnxset.cu,
+                                                                       'public'))
+        return 'schema_version' in tables
+
+    def schema_version(self, cnx):
+        """return (counter, uuid) identifying the version of the schema stored in
+        the database, or None if the database doesn't keep track of it.
+
+        The counter is incremented and the uuid regenerated on each change of
+        the schema, the uuid telling apart databases created independently.
+        """
+        if not self._has_schema_version(cnx):
+            return None
+        cu = self.doexec(cnx, 'SELECT version, uuid FROM schema_version')
+        row = cu.fetchone()
+        return None if row is None else (row[0], row[1].strip())
+
+    def incr_schema_version(self, cnx):
+        """record in the database that the schema has changed"""
+        if self._has_schema_version(cnx):
+            self.doexec(cnx, 'UPDATE schema_version SET version=version+1, '
+                        'uuid=%(uuid)s', {'uuid': uuid.uuid4().hex})
+
     # undo support #############################################################
 
     def undoable_transactions(self, cnx, ueid=None, **actionfilters):
@@ -1001,7 +1323,7 @@ class NativeSQLSource(SQLAdapterMixIn, AbstractSource):
                                  ('txa_action', 'txa_public', 'txa_order',
                                   'etype', 'eid', 'changes'))
         cu = self.doexec(cnx, sql, restr)
-        actions = [tx.EntityAction(a, p, o, et, e, c and pickle.loads(self.binary_to_str(c)))
+        actions = [tx.EntityAction(a, p, o, et, e, c and decode_changes(self.binary_to_str(c)))
                    for a, p, o, et, e, c in cu.fetchall()]
         sql = self.sqlgen.select('tx_relation_actions', restr,
                                  ('txa_action', 'txa_public', 'txa_order',
@@ -1043,32 +1365,68 @@ class NativeSQLSource(SQLAdapterMixIn, AbstractSource):
         """return a pickleable dictionary containing current values for given
         attributes of the entity
         """
-        restr = {'cw_eid': entity.eid}
-        sql = self.sqlgen.select(SQL_PREFIX + entity.cw_etype, restr, attrs)
-        cu = self.doexec(cnx, sql, restr)
-        values = dict(zip(attrs, cu.fetchone()))
-        # ensure backend specific binary are converted back to string
-        eschema = entity.e_schema
-        for column in attrs:
-            # [3:] remove 'cw_' prefix
-            attr = column[3:]
-            if not eschema.subjrels[attr].final:
-                continue
-            if eschema.destination(attr) in ('Password', 'Bytes'):
-                value = values[column]
-                if value is not None:
-                    values[column] = self.binary_to_str(value)
-        return values
+        return self._save_attrs_multi(cnx, entity.e_schema, [entity.eid],
+                                      attrs)[entity.eid]
+
+    def _save_attrs_multi(self, cnx, eschema, eids, attrs):
+        """return a dictionary mapping each eid of `eids`, entities of type
+        `eschema`, to a pickleable dictionary containing current values for
+        given attributes
+        """
+        table = SQL_PREFIX + eschema.type
+        binary_columns = [column for column in attrs
+                          # [3:] remove 'cw_' prefix
+                          if eschema.subjrels[column[3:]].final
+                          and eschema.destination(column[3:]) in ('Password', 'Bytes')]
+        result = {}
+        # process by batch of 10000, as done by delete_info_multi
+        batch_size = 10000
+        for i in range(0, len(eids), batch_size):
+            if len(eids) == 1:
+                restr = {'cw_eid': eids[0]}
+                sql = self.sqlgen.select(table, restr, attrs)
+            else:
+                restr = None
+                sql = 'SELECT %s FROM %s WHERE cw_eid IN (%s)' % (
+                    ', '.join(['cw_eid'] + attrs), table,
+                    ','.join(str(int(eid)) for eid in eids[i:i + batch_size]))
+            cu = self.doexec(cnx, sql, restr)
+            for row in cu.fetchall():
+                if restr is None:
+                    eid, row = row[0], row[1:]
+                else:
+                    eid = eids[0]
+                values = dict(zip(attrs, row))
+                # ensure backend specific binary are converted back to string
+                for column in binary_columns:
+                    value = values[column]
+                    if value is not None:
+                        values[column] = self.binary_to_str(value)
+                result[eid] = values
+        return result
 
     def _record_tx_action(self, cnx, table, action, **kwargs):
         """record a transaction action in the given table (either
         'tx_entity_actions' or 'tx_relation_action')
+
+        Actions are buffered in the connection, then written by a single query
+        per table on commit by :class:`TxActionsOp`.
         """
         kwargs['tx_uuid'] = cnx.transaction_uuid()
         kwargs['txa_action'] = action
         kwargs['txa_order'] = cnx.transaction_inc_action_counter()
         kwargs['txa_public'] = not cnx.hooks_in_progress
-        self.doexec(cnx, self.sqlgen.insert(table, kwargs), kwargs)
+        if table == 'tx_entity_actions':
+            kwargs.setdefault('changes', None)
+        TxActionsOp.get_instance(cnx).add_data((table, kwargs))
+
+    def _write_tx_actions(self, cnx, actions):
+        """write buffered transaction actions, a list of (table, values)"""
+        by_table = {}
+        for table, values in actions:
+            by_table.setdefault(table, []).append(values)
+        for table, rows in sorted(by_table.items()):
+            self.doexecmany(cnx, self.sqlgen.insert(table, rows[0]), rows)
 
     def _tx_info(self, cnx, txuuid):
         """return transaction's time and user of the transaction with the given uuid.
@@ -1288,26 +1646,103 @@ class NativeSQLSource(SQLAdapterMixIn, AbstractSource):
         if self.do_fti:
             FTIndexEntityOp.get_instance(cnx).add_data(entity.eid)
 
+    def fti_index_eids(self, cnx, eids):
+        """[re]index textual content of entities with the given eids, or of
+        their full-text containers
+        """
+        eids_by_etype = {}
+        for eid in eids:
+            eids_by_etype.setdefault(cnx.entity_type(eid), []).append(eid)
+        to_reindex = set()
+        for etype, eids in eids_by_etype.items():
+            etype_class = cnx.vreg['etypes'].etype_class(etype)
+            if any(etype_class.e_schema.fulltext_containers()):
+                for eid in eids:
+                    iftindexable = cnx.entity_from_eid(eid, etype).cw_adapt_to('IFTIndexable')
+                    to_reindex |= set(iftindexable.fti_containers())
+            else:
+                # entity should be its own container: load indexable attributes
+                # of all entities of this type at once, but still ask the
+                # adapter, which may be overridden
+                with cnx.security_enabled(read=False):
+                    for rset in etype_class.cw_fti_index_rql_eids(cnx, eids):
+                        for entity in rset.entities():
+                            iftindexable = entity.cw_adapt_to('IFTIndexable')
+                            to_reindex |= set(iftindexable.fti_containers())
+        self.fti_unindex_entities(cnx, to_reindex)
+        self.fti_index_entities(cnx, to_reindex)
+
+    def fti_queue_eids(self, cnx, eids):
+        """record entities with the given eids in the full-text indexation
+        queue, to be indexed later by :meth:`fti_index_queued`
+        """
+        if eids:
+            queued = datetime.utcnow()
+            self.doexecmany(cnx, 'INSERT INTO fti_queue(eid, queued) '
+                            'VALUES (%(eid)s, %(queued)s)',
+                            [{'eid': eid, 'queued': queued} for eid in eids])
+
+    def fti_index_queued(self, cnx, limit=1000):
+        """index at most `limit` entities from the full-text indexation queue,
+        the oldest first, and return the number of entities removed from the
+        queue
+        """
+        cu = self.doexec(cnx, 'SELECT eid FROM fti_queue GROUP BY eid '
+                         'ORDER BY MIN(queued) LIMIT %s' % int(limit))
+        eids = [eid for eid, in cu.fetchall()]
+        if not eids:
+            return 0
+        # remove entities from the queue before reading them, so that changes
+        # queued by transactions committed meanwhile aren't lost
+        eids_sql = ','.join(str(eid) for eid in eids)
+        self.doexec(cnx, 'DELETE FROM fti_queue WHERE eid IN (%s)' % eids_sql)
+        cu = self.doexec(cnx, 'SELECT eid FROM entities WHERE eid IN (%s)' % eids_sql)
+        # deleted entities are unindexed on deletion
+        self.fti_index_eids(cnx, [eid for eid, in cu.fetchall()])
+        return len(eids)
+
+    def fti_queue_stats(self, cnx):
+        """return the number of entities in the full-text indexation queue and
+        the age in seconds of the oldest one
+        """
+        cu = self.doexec(cnx, 'SELECT COUNT(DISTINCT eid), MIN(queued) FROM fti_queue')
+        length, oldest = cu.fetchone()
+        if oldest is None:
+            return length, 0
+        if isinstance(oldest, str):  # sqlite
+            oldest = datetime.strptime(oldest[:19], '%Y-%m-%d %H:%M:%S')
+        return length, max(0, (datetime.utcnow() - oldest).total_seconds())
+
     def fti_unindex_entities(self, cnx, entities):
         """remove text content for entities from the full text index
         """
         if not cnx.repo.system_source.do_fti:
             return
         cursor = cnx.cnxset.cu
-        cursor_unindex_object = self.dbhelper.cursor_unindex_object
+        eids = sorted(entity.eid for entity in entities)
         try:
-            for entity in entities:
-                cursor_unindex_object(entity.eid, cursor)
+            for i in range(0, len(eids), 1000):
+                cursor.execute('DELETE FROM %s WHERE %s IN (%s)' % (
+                    self.dbhelper.fti_table, self.dbhelper.fti_uid_attr,
+                    ','.join(str(int(eid)) for eid in eids[i:i + 1000])))
         except Exception:  # let KeyboardInterrupt / SystemExit propagate
-            self.exception('error while unindexing %s', entity)
+            self.exception('error while unindexing %s entities', len(eids))
 
-    def fti_index_entities(self, cnx, entities):
+    def fti_index_entities(self, cnx, entities, table=None):
         """add text content of created/modified entities to the full text index
+
+        With postgres, entities are inserted using a single query, in `table`
+        if specified instead of the full text index table (which is expected to
+        have the same columns).
         """
         if not cnx.repo.system_source.do_fti:
             return
-        cursor_index_object = self.dbhelper.cursor_index_object
         cursor = cnx.cnxset.cu
+        if self.dbdriver == 'postgres' and hasattr(cursor, 'mogrify'):
+            self._fti_index_entities_batch(cursor, entities, table)
+            return
+        assert table is None, 'index table may only be specified with postgres'
+        cursor_index_object = self.dbhelper.cursor_index_object
         try:
             # use cursor_index_object, not cursor_reindex_object since
             # unindexing done in the FTIndexEntityOp
@@ -1318,6 +1753,48 @@ class NativeSQLSource(SQLAdapterMixIn, AbstractSource):
         except Exception:  # let KeyboardInterrupt / SystemExit propagate
             self.exception('error while indexing %s', entity)
 
+    def _fti_index_entities_batch(self, cursor, entities, table=None):
+        """index `entities` using a single INSERT query, built from queries
+        executed by the database helper for each entity
+        """
+        prefix = 'INSERT INTO %s(uid, words, weight) VALUES ' % self.dbhelper.fti_table
+        recorder = _FTIQueriesRecorder()
+        values = []
+        for entity in entities:
+            try:
+                self.dbhelper.cursor_index_object(
+                    entity.eid, entity.cw_adapt_to('IFTIndexable'), recorder)
+            except Exception:  # let KeyboardInterrupt / SystemExit propagate
+                self.exception('error while indexing %s', entity)
+                recorder.queries.clear()
+                continue
+            for sql, args in recorder.queries:
+                if not sql.startswith(prefix):
+                    # unexpected query, don't try to merge it
+                    cursor.execute(sql, args)
+                    continue
+                values.append(cursor.mogrify(sql[len(prefix):].rstrip().rstrip(';'), args))
+            recorder.queries.clear()
+        if values:
+            table = table or self.dbhelper.fti_table
+            try:
+                cursor.execute(b'INSERT INTO ' + table.encode('ascii')
+                               + b'(uid, words, weight) VALUES ' + b', '.join(values))
+            except Exception:  # let KeyboardInterrupt / SystemExit propagate
+                self.exception('error while indexing %s entities', len(values))
+
+
+class _FTIQueriesRecorder(object):
+    """cursor like object recording queries executed by the database helper to
+    index entities, so that they may be merged into a single query
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def execute(self, sql, args=None):
+        self.queries.append((sql, args))
+
 
 class FTIndexEntityOp(hook.DataOperationMixIn, hook.LateOperation):
     """operation to delay entity full text indexation to commit
@@ -1334,17 +1811,52 @@ class FTIndexEntityOp(hook.DataOperationMixIn, hook.LateOperation):
             return
         pendingeids = cnx.transaction_data.get('pendingeids', ())
         done = cnx.transaction_data.setdefault('indexedeids', set())
-        to_reindex = set()
+        eids = []
         for eid in self.get_data():
             if eid in pendingeids or eid in done:
                 # entity added and deleted in the same transaction or already
                 # processed
                 continue
             done.add(eid)
-            iftindexable = cnx.entity_from_eid(eid).cw_adapt_to('IFTIndexable')
-            to_reindex |= set(iftindexable.fti_containers())
-        source.fti_unindex_entities(cnx, to_reindex)
-        source.fti_index_entities(cnx, to_reindex)
+            eids.append(eid)
+        if source.fti_deferred:
+            source.fti_queue_eids(cnx, eids)
+        else:
+            source.fti_index_eids(cnx, eids)
+
+
+class TxActionsOp(hook.DataOperationMixIn, hook.SingleLastOperation):
+    """operation writing actions of an undoable transaction on precommit
+
+    it is run after other operations so that actions they trigger are written
+    at once. If some action is recorded once this operation has been processed,
+    a new instance is registered.
+    """
+    containercls = list
+
+    def precommit_event(self):
+        self.cnx.repo.system_source._write_tx_actions(self.cnx, self.get_data())
+
+
+def encode_changes(changes):
+    """return attribute values of an entity recorded by undo support, as bytes
+
+    Pickles are compressed unless that doesn't make them smaller.
+    """
+    data = pickle.dumps(changes, pickle.HIGHEST_PROTOCOL)
+    compressed = zlib.compress(data)
+    if len(compressed) < len(data):
+        return compressed
+    return data
+
+
+def decode_changes(data):
+    """return attribute values encoded by :func:`encode_changes`"""
+    # pickles start with the PROTO opcode (protocol >= 2) or with a mark (older
+    # protocols), never with 'x' as zlib streams do
+    if data[:1] == b'x':
+        data = zlib.decompress(data)
+    return pickle.loads(data)
 
 
 def sql_schema(driver):
@@ -1383,6 +1895,18 @@ CREATE INDEX tx_entity_actions_eid_idx ON tx_entity_actions(eid);;
 CREATE INDEX tx_entity_actions_etype_idx ON tx_entity_actions(etype);;
 CREATE INDEX tx_entity_actions_tx_uuid_idx ON tx_entity_actions(tx_uuid);;
 
+CREATE TABLE fti_queue (
+  eid INTEGER NOT NULL,
+  queued %s NOT NULL
+);;
+CREATE INDEX fti_queue_eid_idx ON fti_queue(eid);;
+
+CREATE TABLE schema_version (
+  version INTEGER NOT NULL,
+  uuid CHAR(32) NOT NULL
+);;
+INSERT INTO schema_version (version, uuid) VALUES (0, '%s');;
+
 CREATE TABLE tx_relation_actions (
   tx_uuid CHAR(32) REFERENCES transactions(tx_uuid) ON DELETE CASCADE,
   txa_action CHAR(1) NOT NULL,
@@ -1398,7 +1922,8 @@ CREATE INDEX tx_relation_actions_eid_from_idx ON tx_relation_actions(eid_from);;
 CREATE INDEX tx_relation_actions_eid_to_idx ON tx_relation_actions(eid_to);;
 CREATE INDEX tx_relation_actions_tx_uuid_idx ON tx_relation_actions(tx_uuid)
 """ % (typemap['Datetime'],
-       typemap['Boolean'], typemap['Bytes'], typemap['Boolean'])).split(';'):
+       typemap['Boolean'], typemap['Bytes'], typemap['Datetime'],
+       uuid.uuid4().hex, typemap['Boolean'])).split(';'):
         yield sql
     if helper.backend_name == 'sqlite':
         # sqlite support the ON DELETE CASCADE syntax but do nothing
@@ -1416,7 +1941,7 @@ def grant_schema(user, set_owner=True):
     """Yield SQL statements to give all access (and ownership if `set_owner` is True) on the
     database system tables to `user`.
     """
-    for table in ('entities', 'entities_id_seq',
+    for table in ('entities', 'entities_id_seq', 'fti_queue', 'schema_version',
                   'transactions', 'tx_entity_actions', 'tx_relation_actions'):
         if set_owner:
             yield 'ALTER TABLE %s OWNER TO %s;' % (table, user)
@@ -1505,6 +2030,139 @@ class EmailPasswordAuthentifier(BaseAuthentifier):
         return self.source.repo.check_auth_info(cnx, login, authinfo)
 
 
+# chunk encoding of the database independent backup format ####################
+
+# (type tag, python types) of columns in table chunks, in order of precedence
+_CHUNK_COLUMN_TYPES = (
+    ('bool', bool),
+    ('int', int),
+    ('float', float),
+    ('str', str),
+    ('decimal', Decimal),
+    ('datetime', datetime),
+    ('date', date),
+    ('time', dtime),
+    ('timedelta', timedelta),
+    ('bytes', (Binary, bytes, bytearray, memoryview)),
+)
+_CHUNK_IDENTITY_TYPES = frozenset(('bool', 'int', 'float', 'str'))
+_CHUNK_BLOB_TYPES = frozenset(('bytes', 'pickle'))
+
+
+def _chunk_column_type(values):
+    """return the type tag of a column given its values, None if they are all
+    None and 'pickle' if they are not of the same type
+    """
+    for value in values:
+        if value is not None:
+            break
+    else:
+        return None
+    for tag, types in _CHUNK_COLUMN_TYPES:
+        if isinstance(value, types):
+            break
+    else:
+        return 'pickle'
+    if tag == 'datetime' and value.tzinfo is not None:
+        tag = 'tzdatetime'
+    for value in values:
+        if value is not None and not isinstance(value, types):
+            return 'pickle'
+    return tag
+
+
+def _encode_chunk_value(tag, value):
+    if tag == 'decimal':
+        return str(value)
+    if tag == 'timedelta':
+        return value // timedelta(microseconds=1)
+    # date, time and datetime types
+    return value.isoformat()
+
+
+def _decode_chunk_value(tag, value):
+    if tag == 'decimal':
+        return Decimal(value)
+    if tag == 'timedelta':
+        return timedelta(microseconds=value)
+    if tag == 'date':
+        return date.fromisoformat(value)
+    if tag == 'time':
+        return dtime.fromisoformat(value)
+    return datetime.fromisoformat(value)
+
+
+def encode_chunk(name, columns, rows, compresslevel=6):
+    """return `rows` of table (or sequence) `name` encoded in the columnar
+    format of database independent backups.
+
+    The encoded data is compressed using zlib. Once decompressed, it is made of
+    a JSON header followed by a newline and a blob. The header is an object
+    with the following keys:
+
+    * name: the table name
+    * columns: the list of column names
+    * types: the list of column type tags
+    * values: the list of encoded values of each column
+
+    Values of 'bytes' and 'pickle' (python values of an unexpected type)
+    columns are stored in the blob, the header holding their length.
+    """
+    types, values, blob = [], [], []
+    for colvalues in zip(*rows) if rows else [()] * len(columns):
+        tag = _chunk_column_type(colvalues)
+        if tag is None or tag in _CHUNK_IDENTITY_TYPES:
+            encoded = list(colvalues)
+        else:
+            encoded = []
+            for value in colvalues:
+                if value is None:
+                    encoded.append(None)
+                    continue
+                if tag == 'bytes':
+                    value = value.getvalue() if isinstance(value, Binary) else bytes(value)
+                elif tag == 'pickle':
+                    value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+                else:
+                    encoded.append(_encode_chunk_value(tag, value))
+                    continue
+                blob.append(value)
+                encoded.append(len(value))
+        types.append(tag)
+        values.append(encoded)
+    header = json.dumps({'name': name, 'columns': list(columns),
+                         'types': types, 'values': values})
+    return zlib.compress(header.encode('utf-8') + b'\n' + b''.join(blob),
+                         compresslevel)
+
+
+def decode_chunk(data):
+    """return (name, columns, types, rows) from data encoded by
+    :func:`encode_chunk`
+    """
+    data = zlib.decompress(data)
+    headerlen = data.index(b'\n')
+    header = json.loads(data[:headerlen].decode('utf-8'))
+    offset = headerlen + 1
+    values = []
+    for tag, colvalues in zip(header['types'], header['values']):
+        if tag is None or tag in _CHUNK_IDENTITY_TYPES:
+            values.append(colvalues)
+            continue
+        decoded = []
+        for value in colvalues:
+            if value is None:
+                decoded.append(None)
+            elif tag in _CHUNK_BLOB_TYPES:
+                value, offset = data[offset:offset + value], offset + value
+                decoded.append(Binary(value) if tag == 'bytes' else pickle.loads(value))
+            else:
+                decoded.append(_decode_chunk_value(tag, value))
+        values.append(decoded)
+    return (header['name'], tuple(header['columns']), header['types'],
+            list(zip(*values)))
+
+
 class DatabaseIndependentBackupRestore(object):
     """Helper class to perform db backend agnostic backup and restore
 
@@ -1512,27 +2170,49 @@ class DatabaseIndependentBackupRestore(object):
     system database in a database independent format. The file is a
     Zip archive containing the following files:
 
-    * format.txt: the format of the archive. Currently '1.1'
+    * format.txt: the format of the archive. Currently '2.0'
     * tables.txt: list of filenames in the archive tables/ directory
     * sequences.txt: list of filenames in the archive sequences/ directory
     * numranges.txt: list of filenames in the archive numrange/ directory
     * versions.txt: the list of cube versions from CWProperty
-    * tables/<tablename>.<chunkno>: pickled data
-    * sequences/<sequencename>: pickled data
+    * tables/<tablename>.<chunkno>: encoded data
+    * sequences/<sequencename>: encoded data
+    * numrange/<numrangename>: encoded data
+
+    Data of tables, numranges and sequences are encoded using
+    :func:`encode_chunk`. In archives of the former '1.1' format, which can
+    still be restored, they are pickled tuples of 3 elements:
 
-    The pickled data format for tables, numranges and sequences is a tuple of 3 elements:
     * the table name
     * a tuple of column names
     * a list of rows (as tuples with one element per column)
 
     Tables are saved in chunks in different files in order to prevent
-    a too high memory consumption.
+    a too high memory consumption. The number of rows of chunks is adapted
+    so that their encoded size is around `chunksize` bytes.
+
+    Tables are dumped and restored by `workers` threads, each one using its
+    own database connection. With postgres, connections dumping tables share
+    the snapshot of the main connection's transaction, so that the archive is
+    consistent; other backends are dumped using the main connection only.
+    Tables are restored sequentially with sqlite, which doesn't support
+    concurrent writes. Since other tables reference them, the `entities` and
+    `transactions` tables are restored before the others. Indexes of restored
+    tables are dropped and created once their data are inserted.
     """
-    blocksize = 100
-
-    def __init__(self, source):
+    format = '2.0'
+    # tables referenced by foreign keys of other tables, restored first
+    referenced_tables = ('entities', 'transactions')
+    # number of rows of the first chunk of tables
+    blocksize = 1000
+    # target encoded size of table chunks
+    chunksize = 4 * 1024 * 1024
+    max_blocksize = 1000000
+
+    def __init__(self, source, workers=1):
         """
         :param: source an instance of the system source
+        :param: workers number of threads dumping / restoring tables
         """
         self._source = source
         self.logger = logging.getLogger('cubicweb.ctl')
@@ -1540,9 +2220,12 @@ class DatabaseIndependentBackupRestore(object):
         self.logger.addHandler(logging.StreamHandler(sys.stdout))
         self.schema = self._source.schema
         self.dbhelper = self._source.dbhelper
+        self.workers = workers
         self.cnx = None
         self.cursor = None
         self.sql_generator = sqlgen.SQLGenerator()
+        self.archive_format = self.format
+        self._archive_lock = Lock()
 
     def get_connection(self):
         return self._source.get_connection()
@@ -1552,7 +2235,7 @@ class DatabaseIndependentBackupRestore(object):
         self.cnx = self.get_connection()
         try:
             self.cursor = self.cnx.cursor()
-            self.cursor.arraysize = 100
+            snapshot = self._export_snapshot()
             self.logger.info('writing metadata')
             self.write_metadata(archive)
             for seq in self.get_sequences():
@@ -1561,16 +2244,80 @@ class DatabaseIndependentBackupRestore(object):
             for numrange in self.get_numranges():
                 self.logger.info('processing numrange %s', numrange)
                 self.write_numrange(archive, numrange)
-            for table in self.get_tables():
-                self.logger.info('processing table %s', table)
-                self.write_table(archive, table)
+            if snapshot is None:
+                # dumping tables using independent connections wouldn't give
+                # a consistent archive
+                self._for_each_table(self.write_table, archive,
+                                     self.get_tables(), 1)
+            else:
+                self._for_each_table(
+                    self.write_table, archive, self.get_tables(), self.workers,
+                    init_cnx=lambda cnx: self._import_snapshot(cnx, snapshot))
         finally:
             archive.close()
             self.cnx.close()
         self.logger.info('done')
 
+    def _export_snapshot(self):
+        """start a transaction on the main connection and return an identifier
+        of its snapshot of the database, to be used by other connections, or
+        None if the backend doesn't support this
+        """
+        if self.dbhelper.backend_name != 'postgres':
+            return None
+        self.cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+        self.cursor.execute('SELECT pg_export_snapshot()')
+        return self.cursor.fetchone()[0]
+
+    def _import_snapshot(self, cnx, snapshot):
+        """start a transaction on `cnx` using the `snapshot` exported by the main
+        connection
+        """
+        cursor = cnx.cursor()
+        cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+        cursor.execute("SET TRANSACTION SNAPSHOT '%s'" % snapshot)
+
+    def _for_each_table(self, func, archive, tables, workers, init_cnx=None):
+        """call `func(archive, table, cnx)` for each table of `tables`, using
+        `workers` threads with their own database connection, given to
+        `init_cnx` once opened if specified
+        """
+        if workers <= 1:
+            for table in tables:
+                func(archive, table, self.cnx)
+            return
+        local = threading.local()
+        cnxs = []
+
+        def work(table):
+            cnx = getattr(local, 'cnx', None)
+            if cnx is None:
+                cnx = local.cnx = self.get_connection()
+                cnxs.append(cnx)
+                if init_cnx is not None:
+                    init_cnx(cnx)
+            func(archive, table, cnx)
+
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                # consume results to propagate errors
+                list(executor.map(work, tables))
+        finally:
+            for cnx in cnxs:
+                cnx.close()
+
+    def _write_archive(self, archive, filename, data):
+        with self._archive_lock:
+            # data are already compressed
+            archive.writestr(filename, data, zipfile.ZIP_STORED)
+
+    def _read_archive(self, archive, filename):
+        with self._archive_lock:
+            return archive.read(filename)
+
     def get_tables(self):
         non_entity_tables = ['entities',
+                             'schema_version',
                              'transactions',
                              'tx_entity_actions',
                              'tx_relation_actions',
@@ -1585,7 +2332,8 @@ class DatabaseIndependentBackupRestore(object):
             etype_tables.append('%s%s' % (prefix, etype))
         for rtype in self.schema.relations():
             rschema = self.schema.rschema(rtype)
-            if rschema.final or rschema.inlined or rschema in VIRTUAL_RTYPES:
+            if (rschema.final or rschema.inlined or rschema.rule
+                    or rschema in VIRTUAL_RTYPES):
                 continue
             relation_tables.append('%s_relation' % rtype)
         return non_entity_tables + etype_tables + relation_tables
@@ -1597,7 +2345,7 @@ class DatabaseIndependentBackupRestore(object):
         return ['entities_id_seq']
 
     def write_metadata(self, archive):
-        archive.writestr('format.txt', '1.1')
+        archive.writestr('format.txt', self.format)
         archive.writestr('tables.txt', '\n'.join(self.get_tables()))
         archive.writestr('sequences.txt', '\n'.join(self.get_sequences()))
         archive.writestr('numranges.txt', '\n'.join(self.get_numranges()))
@@ -1608,49 +2356,59 @@ class DatabaseIndependentBackupRestore(object):
 
     def write_sequence(self, archive, seq):
         sql = self.dbhelper.sql_sequence_current_state(seq)
-        columns, rows_iterator = self._get_cols_and_rows(sql)
+        columns, rows_iterator = self._get_cols_and_rows(self.cursor, sql)
         rows = list(rows_iterator)
         serialized = self._serialize(seq, columns, rows)
-        archive.writestr('sequences/%s' % seq, serialized)
+        self._write_archive(archive, 'sequences/%s' % seq, serialized)
 
     def write_numrange(self, archive, numrange):
         sql = self.dbhelper.sql_numrange_current_state(numrange)
-        columns, rows_iterator = self._get_cols_and_rows(sql)
+        columns, rows_iterator = self._get_cols_and_rows(self.cursor, sql)
         rows = list(rows_iterator)
         serialized = self._serialize(numrange, columns, rows)
-        archive.writestr('numrange/%s' % numrange, serialized)
+        self._write_archive(archive, 'numrange/%s' % numrange, serialized)
 
-    def write_table(self, archive, table):
-        nb_lines_sql = 'SELECT COUNT(*) FROM %s' % table
-        self.cursor.execute(nb_lines_sql)
-        rowcount = self.cursor.fetchone()[0]
+    def write_table(self, archive, table, cnx=None):
+        cursor = (cnx or self.cnx).cursor()
         sql = 'SELECT * FROM %s' % table
-        columns, rows_iterator = self._get_cols_and_rows(sql)
-        self.logger.info('number of rows: %d', rowcount)
+        columns, rows_iterator = self._get_cols_and_rows(cursor, sql)
         blocksize = self.blocksize
-        if rowcount > 0:
-            for i, start in enumerate(range(0, rowcount, blocksize)):
-                rows = list(itertools.islice(rows_iterator, blocksize))
-                serialized = self._serialize(table, columns, rows)
-                archive.writestr('tables/%s.%04d' % (table, i), serialized)
-                self.logger.debug('wrote rows %d to %d (out of %d) to %s.%04d',
-                                  start, start + len(rows) - 1,
-                                  rowcount,
-                                  table, i)
-        else:
-            rows = []
+        rowcount = 0
+        for i in itertools.count():
+            rows = list(itertools.islice(rows_iterator, blocksize))
+            if not rows and i > 0:
+                break
             serialized = self._serialize(table, columns, rows)
-            archive.writestr('tables/%s.%04d' % (table, 0), serialized)
-
-    def _get_cols_and_rows(self, sql):
+            self._write_archive(archive, 'tables/%s.%04d' % (table, i), serialized)
+            self.logger.debug('wrote rows %d to %d to %s.%04d',
+                              rowcount, rowcount + len(rows) - 1, table, i)
+            rowcount += len(rows)
+            if len(rows) < blocksize:
+                break
+            # adapt the number of rows of the next chunk to its expected size
+            blocksize = max(1, min(self.max_blocksize,
+                                   blocksize * self.chunksize // len(serialized)))
+        self.logger.info('processed table %s, number of rows: %d', table, rowcount)
+
+    def _get_cols_and_rows(self, cursor, sql):
         process_result = self._source.iter_process_result
-        self.cursor.execute(sql)
-        columns = (d[0] for d in self.cursor.description)
-        rows = process_result(self.cursor)
+        cursor.arraysize = self.blocksize
+        cursor.execute(sql)
+        columns = (d[0] for d in cursor.description)
+        rows = process_result(cursor)
         return tuple(columns), rows
 
     def _serialize(self, name, columns, rows):
-        return pickle.dumps((name, columns, rows), pickle.HIGHEST_PROTOCOL)
+        return encode_chunk(name, columns, rows)
+
+    def _deserialize(self, data):
+        """return (name, columns, types, rows) from serialized data, types
+        being None for archives in format 1.1
+        """
+        if self.archive_format == '1.1':
+            name, columns, rows = pickle.loads(data)
+            return name, columns, None, rows
+        return decode_chunk(data)
 
     def restore(self, backupfile):
         archive = zipfile.ZipFile(backupfile, 'r', allowZip64=True)
@@ -1663,23 +2421,34 @@ class DatabaseIndependentBackupRestore(object):
         for numrange in numranges:
             self.logger.info('restoring numrange %s', numrange)
             self.read_numrange(archive, numrange)
-        for table in tables:
-            self.logger.info('restoring table %s', table)
-            self.read_table(archive, table, sorted(table_chunks[table]))
+        # sqlite doesn't support concurrent writes
+        workers = 1 if self.dbhelper.backend_name == 'sqlite' else self.workers
+
+        def read_table(archive, table, cnx):
+            self.read_table(archive, table, sorted(table_chunks[table]), cnx)
+
+        # rows of other tables reference rows of these ones, which have to be
+        # committed first
+        referenced = [table for table in tables if table in self.referenced_tables]
+        self._for_each_table(read_table, archive, referenced, workers)
+        self._for_each_table(read_table, archive,
+                             [table for table in tables if table not in referenced],
+                             workers)
         self.cnx.close()
         archive.close()
         self.logger.info('done')
 
     def read_metadata(self, archive, backupfile):
-        formatinfo = archive.read('format.txt')
+        formatinfo = archive.read('format.txt').decode('ascii').strip()
         self.logger.info('checking metadata')
-        if formatinfo.strip() != "1.1":
+        if formatinfo not in ('1.1', self.format):
             self.logger.critical('Unsupported format in archive: %s', formatinfo)
             raise ValueError('Unknown format in %s: %s' % (backupfile, formatinfo))
-        tables = archive.read('tables.txt').splitlines()
-        sequences = archive.read('sequences.txt').splitlines()
-        numranges = archive.read('numranges.txt').splitlines()
-        archive_versions = self._parse_versions(archive.read('versions.txt'))
+        self.archive_format = formatinfo
+        tables = archive.read('tables.txt').decode('utf-8').splitlines()
+        sequences = archive.read('sequences.txt').decode('utf-8').splitlines()
+        numranges = archive.read('numranges.txt').decode('utf-8').splitlines()
+        archive_versions = self._parse_versions(archive.read('versions.txt').decode('utf-8'))
         db_versions = set(self._get_versions())
         if archive_versions != db_versions:
             self.logger.critical('Restore warning: versions do not match')
@@ -1703,7 +2472,8 @@ class DatabaseIndependentBackupRestore(object):
         return sequences, numranges, tables, table_chunks
 
     def read_sequence(self, archive, seq):
-        seqname, columns, rows = pickle.loads(archive.read('sequences/%s' % seq))
+        seqname, columns, types, rows = self._deserialize(
+            archive.read('sequences/%s' % seq))
         assert seqname == seq
         assert len(rows) == 1
         assert len(rows[0]) == 1
@@ -1713,7 +2483,8 @@ class DatabaseIndependentBackupRestore(object):
         self.cnx.commit()
 
     def read_numrange(self, archive, numrange):
-        rangename, columns, rows = pickle.loads(archive.read('numrange/%s' % numrange))
+        rangename, columns, types, rows = self._deserialize(
+            archive.read('numrange/%s' % numrange))
         assert rangename == numrange
         assert len(rows) == 1
         assert len(rows[0]) == 1
@@ -1722,23 +2493,72 @@ class DatabaseIndependentBackupRestore(object):
         self.cursor.execute(sql)
         self.cnx.commit()
 
-    def read_table(self, archive, table, filenames):
-        merge_args = self._source.merge_args
-        self.cursor.execute('DELETE FROM %s' % table)
-        self.cnx.commit()
+    def read_table(self, archive, table, filenames, cnx=None):
+        cnx = cnx or self.cnx
+        cursor = cnx.cursor()
+        cursor.execute('DELETE FROM %s' % table)
+        indexes = self._drop_indexes(cursor, table)
+        cnx.commit()
         row_count = 0
-        for filename in filenames:
-            tablename, columns, rows = pickle.loads(archive.read(filename))
-            assert tablename == table
-            if not rows:
-                continue
-            insert = self.sql_generator.insert(table,
-                                               dict(zip(columns, rows[0])))
-            for row in rows:
-                self.cursor.execute(insert, merge_args(dict(zip(columns, row)), {}))
-            row_count += len(rows)
-            self.cnx.commit()
-        self.logger.info('inserted %d rows', row_count)
+        try:
+            for filename in filenames:
+                tablename, columns, types, rows = self._deserialize(
+                    self._read_archive(archive, filename))
+                assert tablename == table
+                if not rows:
+                    continue
+                self._insert_rows(cursor, table, columns, types, rows)
+                row_count += len(rows)
+                cnx.commit()
+        except Exception:
+            cnx.rollback()
+            raise
+        finally:
+            for sql in indexes:
+                cursor.execute(sql)
+            cnx.commit()
+        self.logger.info('restored table %s, inserted %d rows', table, row_count)
+
+    # column types which may be inserted using postgres 'COPY FROM' text format
+    _copy_from_types = frozenset((None, 'bool', 'int', 'float', 'str',
+                                  'datetime', 'date'))
+
+    def _insert_rows(self, cursor, table, columns, types, rows):
+        if (self.dbhelper.backend_name == 'postgres' and types is not None
+                and self._copy_from_types.issuperset(types)):
+            from cubicweb.dataimport.pgstore import _copy_from_stream
+            _copy_from_stream(cursor, table, rows, columns=range(len(columns)),
+                              table_columns=columns, null=u'\\N')
+        else:
+            merge_args = self._source.merge_args
+            insert = self.sql_generator.insert(table, dict.fromkeys(columns))
+            cursor.executemany(insert, [merge_args(dict(zip(columns, row)), {})
+                                        for row in rows])
+
+    def _drop_indexes(self, cursor, table):
+        """drop indexes of `table` which are not backing a constraint, and
+        return queries to create them back
+        """
+        if self.dbhelper.backend_name == 'postgres':
+            cursor.execute(
+                'SELECT c.relname, pg_get_indexdef(i.indexrelid) '
+                'FROM pg_index i JOIN pg_class c ON c.oid=i.indexrelid '
+                'JOIN pg_class t ON t.oid=i.indrelid '
+                'WHERE t.relname=%(t)s AND pg_table_is_visible(t.oid) '
+                'AND NOT EXISTS (SELECT 1 FROM pg_constraint co '
+                '                WHERE co.conindid=i.indexrelid)',
+                {'t': table.lower()})
+        elif self.dbhelper.backend_name == 'sqlite':
+            # indexes created for constraints have no sql
+            cursor.execute("SELECT name, sql FROM sqlite_master "
+                           "WHERE type='index' AND sql IS NOT NULL "
+                           "AND lower(tbl_name)=%(t)s", {'t': table.lower()})
+        else:
+            return []
+        indexes = cursor.fetchall()
+        for name, sql in indexes:
+            cursor.execute('DROP INDEX %s' % name)
+        return [sql for name, sql in indexes]
 
     def _parse_versions(self, version_str):
         versions = set()
@@ -24,6 +24,7 @@ import subprocess
 from os.path import abspath
 from logging import getLogger
 from datetime import time, datetime, timedelta
+from functools import partial
 
 from pytz import utc
 
@@ -213,6 +214,20 @@ class ConnectionWrapper(object):
         except Exception:
             pass
 
+    def ping(self):
+        """check the connection is alive, reopening it if not. Return False if
+        the connection had to be reopened.
+        """
+        try:
+            self.cu.execute('SELECT 1')
+            self.cu.fetchall()
+            self.cnx.rollback()
+        except Exception:
+            self._source.warning('connection is broken', exc_info=sys.exc_info())
+            self.reconnect()
+            return False
+        return True
+
     # internals ###############################################################
 
     def cnxset_freed(self):
@@ -242,6 +257,10 @@ class SqliteConnectionWrapper(ConnectionWrapper):
 
     _cnx = None
 
+    def ping(self):
+        # the connection is opened on demand and closed when freed
+        return True
+
     def cnxset_freed(self):
         self.cu.close()
         self.cnx.close()
@@ -304,7 +323,10 @@ class SQLAdapterMixIn(object):
         self.DbapiError = dbapi_module.Error
         self._binary = self.dbhelper.binary_value
         self._process_value = dbapi_module.process_value
+        self._transformation_callback = dbapi_module._transformation_callback
         self._dbencoding = dbencoding
+        # number of rows fetched at once when processing results
+        self.fetch_size = int(source_config.get('db-fetch-size') or 1000)
 
         if self.dbdriver == 'sqlite':
             self.cnx_wrap = SqliteConnectionWrapper
@@ -382,45 +404,58 @@ class SQLAdapterMixIn(object):
         """
         return list(self.iter_process_result(cursor, cnx, column_callbacks))
 
-    def iter_process_result(self, cursor, cnx, column_callbacks=None):
+    def iter_process_result(self, cursor, cnx=None, column_callbacks=None):
         """return a iterator on tuples of CubicWeb compliant values from data
         in the given cursor
         """
-        # use two different implementations to avoid paying the price of
-        # callback lookup for each *cell* in results when there is nothing to
-        # lookup
-        if not column_callbacks:
-            return self.dbhelper.dbapi_module.process_cursor(cursor, self._dbencoding,
-                                                             Binary)
-        assert cnx
+        assert cnx or not column_callbacks
         return self._cb_process_result(cursor, column_callbacks, cnx)
 
+    def _column_converters(self, description, column_callbacks, cnx):
+        """return a list of (column index, function) for columns whose values
+        have to be converted, given the cursor's description and column
+        callbacks. Callbacks replace the default database value processing.
+        """
+        converters = []
+        for col, coldescr in enumerate(description):
+            cbstack = column_callbacks.get(col) if column_callbacks else None
+            if cbstack is None:
+                convert = self._transformation_callback(
+                    coldescr, self._dbencoding, Binary)
+                if convert is None:
+                    # nothing to do for this column
+                    continue
+            elif len(cbstack) == 1:
+                convert = partial(cbstack[0], self, cnx)
+            else:
+                def convert(value, cbstack=cbstack):
+                    for cb in cbstack:
+                        value = cb(self, cnx, value)
+                    return value
+            converters.append((col, convert))
+        return converters
+
     def _cb_process_result(self, cursor, column_callbacks, cnx):
-        # begin bind to locals for optimization
-        descr = cursor.description
-        encoding = self._dbencoding
-        process_value = self._process_value
-        binary = Binary
-        # /end
-        cursor.arraysize = 100
+        cursor.arraysize = self.fetch_size
+        converters = None
         while True:
             results = cursor.fetchmany()
             if not results:
                 break
-            for line in results:
-                result = []
-                for col, value in enumerate(line):
-                    if value is None:
-                        result.append(value)
-                        continue
-                    cbstack = column_callbacks.get(col, None)
-                    if cbstack is None:
-                        value = process_value(value, descr[col], encoding, binary)
-                    else:
-                        for cb in cbstack:
-                            value = cb(self, cnx, value)
-                    result.append(value)
-                yield result
+            if converters is None:
+                # description of server-side cursors is only available once
+                # some rows have been fetched
+                converters = self._column_converters(cursor.description,
+                                                     column_callbacks, cnx)
+            rows = [list(line) for line in results]
+            # process values column by column, to get the converter once per
+            # column and fetched batch
+            for col, convert in converters:
+                for row in rows:
+                    value = row[col]
+                    if value is not None:
+                        row[col] = convert(value)
+            yield from rows
 
     def preprocess_entity(self, entity):
         """return a dictionary to use as extra argument to cursor.execute
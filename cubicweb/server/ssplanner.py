@@ -354,22 +354,26 @@ class OneFetchStep(Step):
         cnx = self.plan.cnx
         args = self.plan.args
         union = self.union
-        if self.plan.cache_key is None:
-            cachekey = None
-        # union may have been splited into subqueries, in which case we can't
-        # use plan.cache_key, rebuild a cache key
-        elif isinstance(self.plan.cache_key, tuple):
-            cachekey = list(self.plan.cache_key)
-            cachekey[0] = union.as_string()
-            cachekey = tuple(cachekey)
-        else:
-            cachekey = union.as_string()
         # get results for query
         source = cnx.repo.system_source
-        result = source.syntax_tree_search(cnx, union, args, cachekey,
+        result = source.syntax_tree_search(cnx, union, args, self.sql_cache_key(),
                                            rql_query_tracing_token=self.rql_query_tracing_token)
         return result
 
+    def sql_cache_key(self):
+        """return the key under which the SQL generated for this step may be
+        cached, or None
+        """
+        if self.plan.cache_key is None:
+            return None
+        # union may have been splited into subqueries, in which case we can't
+        # use plan.cache_key, rebuild a cache key
+        if isinstance(self.plan.cache_key, tuple):
+            cachekey = list(self.plan.cache_key)
+            cachekey[0] = self.union.as_string()
+            return tuple(cachekey)
+        return self.union.as_string()
+
     def mytest_repr(self):
         """return a representation of this step suitable for test"""
         return (self.__class__.__name__,
@@ -471,9 +475,9 @@ class DeleteRelationsStep(Step):
     def execute(self):
         """execute this step"""
         cnx = self.plan.cnx
-        delete = cnx.repo.glob_delete_relation
-        for subj, obj in self.execute_child():
-            delete(cnx, subj, self.rtype, obj)
+        eids_from_to = [(subj, obj) for subj, obj in self.execute_child()]
+        if eids_from_to:
+            cnx.repo.glob_delete_relations(cnx, self.rtype, eids_from_to)
 
 
 class UpdateStep(Step):
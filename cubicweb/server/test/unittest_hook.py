@@ -123,6 +123,150 @@ class HooksRegistryTC(unittest.TestCase):
         self.o.call_hooks('before_add_entity', cw) # nothing to call
 
 
+class PrunedHooksCacheTC(CubicWebTC):
+
+    def test_shared_cache(self):
+        registry = self.vreg['before_add_entity_hooks']
+        registry._pruned_cache.clear()
+
+        def group_keys():
+            # the cache is shared by hooks registries of all events
+            return set(key for key in registry._pruned_cache
+                       if key[:3] == ('before_add_entity', None, 'CWGroup'))
+
+        with self.admin_access.repo_cnx() as cnx:
+            cnx.create_entity('CWGroup', name=u'g1')
+            keys = group_keys()
+            self.assertEqual(len(keys), 1)
+        with self.admin_access.repo_cnx() as cnx:
+            # another connection reuses pruned hooks
+            cnx.create_entity('CWGroup', name=u'g2')
+            self.assertEqual(group_keys(), keys)
+            with cnx.allow_all_hooks_but('integrity'):
+                cnx.create_entity('CWGroup', name=u'g3')
+            newkeys = group_keys() - keys
+            self.assertEqual(len(newkeys), 1)
+            # disabled hooks are pruned
+            pruned = (registry._pruned_cache[newkeys.pop()][0]
+                      - registry._pruned_cache[keys.pop()][0])
+            self.assertTrue(pruned)
+            self.assertEqual(set(hook.category for hook in pruned), {'integrity'})
+
+    def test_deprecated_connection_cache(self):
+        with self.admin_access.repo_cnx() as cnx:
+            with self.assertWarns(DeprecationWarning):
+                cache = cnx.pruned_hooks_cache
+            self.assertIs(cache, self.vreg['before_add_entity_hooks']._pruned_cache)
+            self.assertIs(cache, self.vreg['after_add_entity_hooks']._pruned_cache)
+
+    def test_hooks_order(self):
+        called = []
+
+        class Hook1(hook.Hook):
+            __regid__ = 'test.hook1'
+            events = ('before_add_entity',)
+            order = 1
+
+            def __call__(self):
+                called.append(self.__regid__)
+
+        class Hook0(Hook1):
+            __regid__ = 'test.hook0'
+            order = 0
+
+        with self.temporary_appobjects(Hook1, Hook0):
+            with self.admin_access.repo_cnx() as cnx:
+                cnx.create_entity('CWGroup', name=u'g1')
+        self.assertEqual(called, ['test.hook0', 'test.hook1'])
+        # cache is cleared when hooks are unregistered
+        with self.admin_access.repo_cnx() as cnx:
+            cnx.create_entity('CWGroup', name=u'g2')
+        self.assertEqual(called, ['test.hook0', 'test.hook1'])
+
+
+class BulkHooksTC(CubicWebTC):
+
+    def setup_database(self):
+        with self.admin_access.repo_cnx() as cnx:
+            self.tag = cnx.create_entity('Tag', name=u'tag').eid
+            self.groups = [cnx.create_entity('CWGroup', name=u'g%s' % i).eid
+                           for i in range(3)]
+            cnx.commit()
+
+    def test_bulk_relations(self):
+        called = []
+
+        class BulkHook(hook.Hook):
+            __regid__ = 'test.bulk'
+            __select__ = hook.Hook.__select__ & hook.match_rtype('tags')
+            events = ('after_add_relation', 'after_delete_relation')
+            category = 'test.bulk'
+            bulk = True
+
+            def __call__(self):
+                called.append((self.event, sorted(self.eids_from_to)))
+
+        expected = sorted((self.tag, geid) for geid in self.groups)
+        with self.temporary_appobjects(BulkHook):
+            with self.admin_access.repo_cnx() as cnx:
+                with cnx.deny_all_hooks_but('test.bulk', 'integrity', 'security',
+                                           'metadata'):
+                    cnx.add_relations([('tags', expected)])
+                    cnx.execute('DELETE T tags G WHERE T eid %(t)s', {'t': self.tag})
+        self.assertEqual(called, [('after_add_relation', expected),
+                                  ('after_delete_relation', expected)])
+
+    def test_bulk_entities(self):
+        called = []
+
+        class BulkHook(hook.Hook):
+            __regid__ = 'test.bulk'
+            __select__ = hook.Hook.__select__ & hook.is_instance('CWGroup')
+            events = ('before_delete_entity',)
+            category = 'test.bulk'
+            bulk = True
+
+            def __call__(self):
+                called.append(sorted(entity.eid for entity in self.entities))
+
+        with self.temporary_appobjects(BulkHook):
+            with self.admin_access.repo_cnx() as cnx:
+                with cnx.deny_all_hooks_but('test.bulk', 'integrity', 'security',
+                                           'metadata'):
+                    cnx.execute('DELETE CWGroup G WHERE G eid IN (%s)'
+                                % ','.join(str(eid) for eid in self.groups))
+        self.assertEqual(called, [sorted(self.groups)])
+
+    def test_mixed_hooks(self):
+        called = []
+
+        class BulkHook(hook.Hook):
+            __regid__ = 'test.bulk'
+            __select__ = hook.Hook.__select__ & hook.match_rtype('tags')
+            events = ('after_add_relation',)
+            bulk = True
+
+            def __call__(self):
+                called.append((self.__regid__, self.eids_from_to))
+
+        class SingleHook(BulkHook):
+            __regid__ = 'test.single'
+            bulk = False
+
+            def __call__(self):
+                called.append((self.__regid__, self.eidto))
+
+        relations = [(self.tag, geid) for geid in self.groups]
+        with self.temporary_appobjects(BulkHook, SingleHook):
+            with self.admin_access.repo_cnx() as cnx:
+                cnx.add_relations([('tags', relations)])
+        # bulk hooks are called for each relation, along with regular hooks
+        self.assertCountEqual(
+            called,
+            [('test.bulk', [relation]) for relation in relations]
+            + [('test.single', geid) for geid in self.groups])
+
+
 class SystemHooksTC(CubicWebTC):
 
     def test_startup_shutdown(self):
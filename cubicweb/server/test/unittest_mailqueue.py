@@ -0,0 +1,122 @@
+# copyright 2026 LOGILAB S.A. (Paris, FRANCE), all rights reserved.
+# contact http://www.logilab.fr/ -- mailto:contact@logilab.fr
+#
+# This file is part of CubicWeb.
+#
+# CubicWeb is free software: you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# CubicWeb is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License along
+# with CubicWeb.  If not, see <http://www.gnu.org/licenses/>.
+"""Tests for cubicweb.server.mailqueue module."""
+
+import os
+import shutil
+import smtplib
+import tempfile
+from email.mime.text import MIMEText
+
+from logilab.common import tempattr
+
+from cubicweb import cwconfig
+from cubicweb.devtools import testlib
+from cubicweb.server.mailqueue import MailOutbox
+
+
+class FakeSMTP(object):
+    """SMTP connection recording sent mails, refusing connections when
+    `available` is False"""
+    available = True
+    connections = 0
+    sent = []
+
+    def __init__(self, server, port):
+        if not FakeSMTP.available:
+            raise ConnectionRefusedError(server)
+        FakeSMTP.connections += 1
+
+    def close(self):
+        pass
+
+    def sendmail(self, fromaddr, recipients, msg):
+        FakeSMTP.sent.append((fromaddr, recipients, msg))
+
+
+CONFIG = {'smtp-host': 'localhost', 'smtp-port': 25,
+          'sender-name': 'cubicweb', 'sender-addr': 'cw@example.org'}
+
+
+class MailOutboxTC(testlib.BaseTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        FakeSMTP.available = True
+        FakeSMTP.connections = 0
+        FakeSMTP.sent = []
+        smtp_patch = tempattr(cwconfig, 'SMTP', FakeSMTP)
+        smtp_patch.__enter__()
+        self.addCleanup(smtp_patch.__exit__, None, None, None)
+
+    def enqueue(self, outbox, nb):
+        outbox.enqueue([(MIMEText(u'mail %s' % i), ['user%s@example.org' % i])
+                        for i in range(nb)])
+
+    def test_send_by_batch(self):
+        outbox = MailOutbox(CONFIG, self.directory, batch_size=2)
+        self.enqueue(outbox, 5)
+        self.assertEqual(outbox.stats()[0], 5)
+        self.assertEqual(outbox.send_queued(), 5)
+        self.assertEqual(outbox.stats(), (0, 0))
+        self.assertEqual([recipients for fromaddr, recipients, msg in FakeSMTP.sent],
+                         [['user%s@example.org' % i] for i in range(5)])
+        self.assertEqual(FakeSMTP.sent[0][0], 'cubicweb <cw@example.org>')
+        # the connection to the SMTP server is reused
+        self.enqueue(outbox, 1)
+        self.assertEqual(outbox.send_queued(), 1)
+        self.assertEqual(FakeSMTP.connections, 1)
+
+    def test_retry(self):
+        outbox = MailOutbox(CONFIG, self.directory, max_attempts=2, retry_delay=0)
+        self.enqueue(outbox, 2)
+        FakeSMTP.available = False
+        self.assertEqual(outbox.send_queued(), 0)
+        # only one attempt is done while the server isn't reachable
+        self.assertEqual(outbox.stats()[0], 2)
+        FakeSMTP.available = True
+        self.assertEqual(outbox.send_queued(), 2)
+        self.assertEqual(len(FakeSMTP.sent), 2)
+
+    def test_give_up(self):
+        outbox = MailOutbox(CONFIG, self.directory, max_attempts=2, retry_delay=0)
+        self.enqueue(outbox, 1)
+        FakeSMTP.available = False
+        outbox.send_queued()
+        outbox.send_queued()
+        self.assertEqual(outbox.stats()[0], 0)
+        self.assertEqual(outbox.failed, 1)
+        self.assertEqual(len(os.listdir(outbox.failed_directory)), 1)
+
+    def test_reconnect(self):
+        outbox = MailOutbox(CONFIG, self.directory)
+        self.enqueue(outbox, 1)
+        outbox.send_queued()
+
+        def disconnected(fromaddr, recipients, msg):
+            raise smtplib.SMTPServerDisconnected()
+        outbox._smtp.sendmail = disconnected
+        self.enqueue(outbox, 1)
+        self.assertEqual(outbox.send_queued(), 1)
+        self.assertEqual(FakeSMTP.connections, 2)
+
+
+if __name__ == '__main__':
+    import unittest
+    unittest.main()
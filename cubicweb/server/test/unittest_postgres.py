@@ -16,6 +16,8 @@
 # You should have received a copy of the GNU Lesser General Public License along
 # with CubicWeb.  If not, see <http://www.gnu.org/licenses/>.
 
+import tempfile
+import zipfile
 from datetime import datetime
 from threading import Thread
 
@@ -25,6 +27,7 @@ from cubicweb.devtools import PostgresApptestConfiguration, startpgcluster, stop
 from cubicweb.devtools.testlib import CubicWebTC
 from cubicweb.predicates import is_instance
 from cubicweb.entities.adapters import IFTIndexableAdapter
+from cubicweb.server.sources.native import DatabaseIndependentBackupRestore, decode_chunk
 
 from unittest_querier import FixedOffset
 
@@ -115,6 +118,151 @@ class PostgresFTITC(CubicWebTC):
                                              'WHERE X has_text "cubicweb"').rows,
                                   [[c1.eid,], [c3.eid,], [c2.eid,]])
 
+    def test_rebuild_fti(self):
+        from cubicweb.server.checkintegrity import rebuild_fti
+        with self.admin_access.repo_cnx() as cnx:
+            c1 = cnx.create_entity('Card', title=u'c1', content=u'cubicweb')
+            c2 = cnx.create_entity('Card', title=u'c2', content=u'cubicweb')
+            cnx.commit()
+            cnx.system_sql('DELETE FROM appears WHERE uid=%s' % c2.eid)
+            cnx.commit()
+            rebuild_fti(self.schema, cnx, batch_size=1, withpb=False)
+            self.assertEqual(cnx.execute('Card X ORDERBY X WHERE X has_text "cubicweb"').rows,
+                             [[c1.eid], [c2.eid]])
+            tables = cnx.repo.system_source.dbhelper.list_tables(cnx.cnxset.cu)
+            self.assertNotIn('appears_rebuild', tables)
+            self.assertNotIn('cw_fti_rebuild', tables)
+            self.assertNotIn('cw_fti_rebuild_changes', tables)
+
+    def test_rebuild_fti_resume(self):
+        from cubicweb.server import checkintegrity
+        with self.admin_access.repo_cnx() as cnx:
+            c1 = cnx.create_entity('Card', title=u'c1', content=u'cubicweb')
+            c2 = cnx.create_entity('Card', title=u'c2', content=u'cubicweb')
+            cnx.commit()
+            # simulate a crash during the swap
+            swap = checkintegrity._fti_rebuild_swap
+            checkintegrity._fti_rebuild_swap = lambda *args: None
+            try:
+                checkintegrity.rebuild_fti(self.schema, cnx, etypes=('Card',),
+                                           batch_size=1, withpb=False)
+            finally:
+                checkintegrity._fti_rebuild_swap = swap
+            # modified during the rebuild
+            c1.cw_set(content=u'logilab')
+            cnx.commit()
+            self.assertEqual(cnx.system_sql('SELECT uid FROM cw_fti_rebuild_changes '
+                                            'GROUP BY uid').fetchall(),
+                             [(c1.eid,)])
+            checkintegrity.rebuild_fti(self.schema, cnx, resume=True, withpb=False)
+            self.assertEqual(cnx.execute('Card X WHERE X has_text "cubicweb"').rows,
+                             [[c2.eid]])
+            self.assertEqual(cnx.execute('Card X WHERE X has_text "logilab"').rows,
+                             [[c1.eid]])
+
+    def test_rebuild_fti_abort(self):
+        from cubicweb.server import checkintegrity
+        with self.admin_access.repo_cnx() as cnx:
+            c1 = cnx.create_entity('Card', title=u'c1', content=u'cubicweb')
+            cnx.commit()
+            swap = checkintegrity._fti_rebuild_swap
+            checkintegrity._fti_rebuild_swap = lambda *args: None
+            try:
+                checkintegrity.rebuild_fti(self.schema, cnx, etypes=('Card',),
+                                           withpb=False)
+            finally:
+                checkintegrity._fti_rebuild_swap = swap
+            self.assertEqual(len(checkintegrity._fti_rebuild_leftovers(
+                cnx, 'appears', 'appears_rebuild')), 5)
+            self.assertTrue(checkintegrity.abort_fti_rebuild(cnx))
+            self.assertEqual(checkintegrity._fti_rebuild_leftovers(
+                cnx, 'appears', 'appears_rebuild'), [])
+            self.assertFalse(checkintegrity.abort_fti_rebuild(cnx))
+            # modifications are not recorded anymore
+            c1.cw_set(content=u'logilab')
+            cnx.commit()
+            self.assertEqual(cnx.execute('Card X WHERE X has_text "logilab"').rows,
+                             [[c1.eid]])
+
+    def test_rebuild_fti_resume_incomplete(self):
+        from cubicweb.server import checkintegrity
+        with self.admin_access.repo_cnx() as cnx:
+            c1 = cnx.create_entity('Card', title=u'c1', content=u'cubicweb')
+            cnx.commit()
+            swap = checkintegrity._fti_rebuild_swap
+            checkintegrity._fti_rebuild_swap = lambda *args: None
+            try:
+                checkintegrity.rebuild_fti(self.schema, cnx, etypes=('Card',),
+                                           withpb=False)
+            finally:
+                checkintegrity._fti_rebuild_swap = swap
+            # the trigger alone is not enough to resume the rebuild
+            cnx.system_sql('DROP TABLE cw_fti_rebuild_changes CASCADE')
+            cnx.commit()
+            checkintegrity.rebuild_fti(self.schema, cnx, resume=True, withpb=False)
+            self.assertEqual(checkintegrity._fti_rebuild_leftovers(
+                cnx, 'appears', 'appears_rebuild'), [])
+            self.assertEqual(cnx.execute('Card X WHERE X has_text "cubicweb"').rows,
+                             [[c1.eid]])
+
+    def test_execute_iter_commit(self):
+        with self.admin_access.repo_cnx() as cnx:
+            for i in range(3):
+                cnx.create_entity('Card', title=u'c%s' % i)
+            cnx.commit()
+            titles = []
+            for rset in cnx.execute_iter('Any T ORDERBY T WHERE X is Card, X title T',
+                                         chunk_size=1):
+                titles.append(rset[0][0])
+                # the server-side cursor is held across transactions
+                cnx.create_entity('Card', title=u'd%s' % len(titles))
+                cnx.commit()
+            self.assertEqual(titles, [u'c0', u'c1', u'c2'])
+            self.assertFalse(cnx.system_sql('SELECT name FROM pg_cursors').fetchall())
+
+    def test_execute_iter_released_cnxset(self):
+        with self.admin_access.repo_cnx() as cnx:
+            for i in range(3):
+                cnx.create_entity('Card', title=u'c%s' % i)
+            cnx.commit()
+            dbcnx = cnx.cnxset.cnx
+            rsets = cnx.execute_iter('Any T ORDERBY T WHERE X is Card, X title T',
+                                     chunk_size=1)
+            self.assertEqual(next(rsets)[0][0], u'c0')
+            cnx.commit()
+        # the connections set has been released when the iterator is closed
+        rsets.close()
+        cursor = dbcnx.cursor()
+        cursor.execute('SELECT name FROM pg_cursors')
+        self.assertFalse(cursor.fetchall())
+        dbcnx.rollback()
+
+    def test_portable_backup_snapshot(self):
+        with self.admin_access.repo_cnx() as cnx:
+            cnx.create_entity('Card', title=u'early')
+            cnx.commit()
+        helper = DatabaseIndependentBackupRestore(self.repo.system_source, workers=2)
+        write_metadata = helper.write_metadata
+
+        def write_metadata_then_add(archive):
+            write_metadata(archive)
+            # committed after the snapshot has been exported
+            with self.admin_access.repo_cnx() as cnx:
+                cnx.create_entity('Card', title=u'late')
+                cnx.commit()
+
+        helper.write_metadata = write_metadata_then_add
+        with tempfile.NamedTemporaryFile(suffix='.zip') as backupfile:
+            helper.backup(backupfile.name)
+            with zipfile.ZipFile(backupfile.name) as archive:
+                titles = []
+                for name in archive.namelist():
+                    if name.startswith('tables/cw_Card.'):
+                        _, columns, _, rows = decode_chunk(archive.read(name))
+                        index = columns.index('cw_title')
+                        titles += [row[index] for row in rows]
+        self.assertEqual(titles, [u'early'])
+
     def test_tz_datetime(self):
         with self.admin_access.repo_cnx() as cnx:
             bob = cnx.create_entity('Personne', nom=u'bob',
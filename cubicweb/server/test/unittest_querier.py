@@ -332,6 +332,40 @@ class QuerierTC(BaseQuerierTC):
         self.assertIsInstance(fdata, Binary)
         self.assertEqual(fdata.getvalue(), b'xxx')
 
+    def test_execute_iter(self):
+        with self.admin_access.cnx() as cnx:
+            rset = cnx.execute('Any X,N ORDERBY N WHERE X is CWGroup, X name N')
+            rsets = list(cnx.execute_iter('Any X,N ORDERBY N WHERE X is CWGroup, X name N',
+                                          chunk_size=3))
+            self.assertEqual([len(r) for r in rsets], [3, 1])
+            self.assertEqual(rsets[0].rows + rsets[1].rows, rset.rows)
+            self.assertEqual(rsets[0].description, [('CWGroup', 'String')] * 3)
+            self.assertIs(rsets[0].req, cnx)
+            self.assertEqual(rsets[1].get_entity(0, 0).name, rset.rows[-1][1])
+
+    def test_execute_iter_other_query(self):
+        with self.admin_access.cnx() as cnx:
+            results = []
+            for rset in cnx.execute_iter('Any X WHERE X is IN (CWUser, CWGroup)',
+                                         chunk_size=1):
+                # query executed while iterating doesn't disturb the iteration
+                eid = rset[0][0]
+                etype = cnx.execute('Any ETN WHERE X eid %(x)s, X is ET, ET name ETN',
+                                    {'x': eid})[0][0]
+                self.assertEqual(rset.description, [(etype,)])
+                results.append(eid)
+            rset = cnx.execute('Any X WHERE X is IN (CWUser, CWGroup)')
+            self.assertEqual(sorted(results), sorted(row[0] for row in rset))
+
+    def test_execute_iter_unknown_eid(self):
+        with self.admin_access.cnx() as cnx:
+            self.assertEqual(list(cnx.execute_iter('Any X WHERE X eid 99999999')), [])
+
+    def test_execute_iter_not_select(self):
+        with self.admin_access.cnx() as cnx:
+            with self.assertRaises(QueryError):
+                list(cnx.execute_iter('SET X name "x" WHERE X is CWGroup'))
+
     # selection queries tests #################################################
 
     def test_select_1(self):
@@ -21,19 +21,21 @@
 import time
 import logging
 import unittest
+import unittest.mock
 
 from yams.constraints import UniqueConstraint
 from yams import register_base_type, unregister_base_type
 
 from logilab.database import get_db_helper
 
-from cubicweb import (ValidationError,
+from cubicweb import (ValidationError, NoCnxSetAvailable,
                       UnknownEid, AuthenticationError, Unauthorized, QueryError)
 from cubicweb.predicates import is_instance
+from cubicweb.entities.adapters import IFTIndexableAdapter
 from cubicweb.schema import RQLConstraint
 from cubicweb.devtools.testlib import CubicWebTC
 from cubicweb.devtools.repotest import tuplify
-from cubicweb.server import hook
+from cubicweb.server import hook, repository
 from cubicweb.server.sqlutils import SQL_PREFIX
 from cubicweb.server.hook import Hook
 from cubicweb.server.sources import native
@@ -372,6 +374,97 @@ class RepositoryTC(CubicWebTC):
             cnx.commit()
 
 
+class FakeCnxSet(object):
+
+    def __init__(self):
+        self.closed = False
+        self.pinged = 0
+
+    def ping(self):
+        self.pinged += 1
+        return True
+
+    def close(self, i_know_what_i_do=False):
+        self.closed = True
+
+
+class FakeSource(object):
+
+    def __init__(self):
+        self.opened = []
+
+    def wrapped_connection(self):
+        cnxset = FakeCnxSet()
+        self.opened.append(cnxset)
+        return cnxset
+
+
+class CnxSetPoolTC(unittest.TestCase):
+
+    def test_elastic(self):
+        source = FakeSource()
+        pool = repository._CnxSetPool(source, 3, min_size=1, timeout=0)
+        self.assertEqual(len(source.opened), 1)
+        self.assertEqual(pool.qsize(), 3)
+        cnxsets = [pool.get() for i in range(3)]
+        self.assertEqual(len(source.opened), 3)
+        self.assertEqual(pool.in_use(), 3)
+        self.assertEqual(pool.qsize(), 0)
+        with self.assertRaises(NoCnxSetAvailable):
+            pool.get()
+        self.assertEqual(pool.timeouts, 1)
+        for cnxset in cnxsets:
+            pool.release(cnxset)
+        self.assertEqual(pool.in_use(), 0)
+        # the most recently released connections set is reused first
+        self.assertIs(pool.get(), cnxsets[-1])
+        self.assertEqual(len(source.opened), 3)
+
+    def test_min_size_default(self):
+        source = FakeSource()
+        pool = repository._CnxSetPool(source, 3, idle_timeout=0)
+        # without min_size, the pool isn't elastic
+        self.assertEqual(len(source.opened), 3)
+        cnxset = pool.get()
+        pool.release(cnxset)
+        self.assertFalse(cnxset.closed)
+        self.assertEqual(len(list(pool)), 3)
+
+    def test_reap_idle(self):
+        source = FakeSource()
+        pool = repository._CnxSetPool(source, 3, min_size=1, idle_timeout=0)
+        cnxsets = [pool.get() for i in range(3)]
+        for cnxset in cnxsets:
+            pool.release(cnxset)
+        # connections sets above min_size have been closed
+        self.assertEqual([cnxset.closed for cnxset in cnxsets],
+                         [True, True, False])
+        self.assertEqual(list(pool), [cnxsets[-1]])
+        self.assertEqual(pool.qsize(), 3)
+
+    def test_pre_ping(self):
+        source = FakeSource()
+        pool = repository._CnxSetPool(source, 1, pre_ping=True)
+        cnxset = pool.get()
+        self.assertEqual(cnxset.pinged, 1)
+        pool.release(cnxset)
+        cnxset.ping = lambda: 1 / 0
+        with self.assertRaises(ZeroDivisionError):
+            pool.get()
+        # the broken connections set is dropped, a new one is opened
+        self.assertTrue(cnxset.closed)
+        self.assertEqual(pool.qsize(), 1)
+        self.assertIsNot(pool.get(), cnxset)
+
+    def test_no_pool(self):
+        source = FakeSource()
+        pool = repository._CnxSetPool(source, None)
+        cnxset = pool.get()
+        pool.release(cnxset)
+        self.assertTrue(cnxset.closed)
+        self.assertIsNone(pool.qsize())
+
+
 class SchemaDeserialTC(CubicWebTC):
 
     appid = 'data-schemaserial'
@@ -467,6 +560,31 @@ class DataHelpersTC(CubicWebTC):
         with self.admin_access.repo_cnx() as cnx:
             self.assertRaises(UnknownEid, self.repo.type_from_eid, -2, cnx)
 
+    def test_types_from_eids(self):
+        with self.admin_access.repo_cnx() as cnx:
+            self.repo._type_cache.clear()
+            self.assertEqual(self.repo.type_from_eid(2, cnx), 'CWGroup')
+            with unittest.mock.patch.object(self.repo.system_source, 'doexec',
+                                            wraps=self.repo.system_source.doexec) as doexec:
+                etypes = self.repo.types_from_eids([2, cnx.user.eid, '3', -2], cnx)
+                self.assertEqual(doexec.call_count, 1)
+            self.assertEqual(etypes, {2: 'CWGroup', 3: 'CWGroup',
+                                      cnx.user.eid: 'CWUser'})
+            self.assertEqual(self.repo._type_cache[cnx.user.eid], 'CWUser')
+
+    def test_type_cache_bounded(self):
+        cache = repository._EidTypeCache(2)
+        cache[1] = 'CWUser'
+        cache[2] = 'CWGroup'
+        self.assertEqual(cache[1], 'CWUser')
+        cache[3] = 'CWGroup'
+        # 2 is the least recently used entry
+        self.assertNotIn(2, cache)
+        self.assertEqual(sorted(cache.items()), [(1, 'CWUser'), (3, 'CWGroup')])
+        with self.assertRaises(KeyError):
+            cache[2]
+        self.assertEqual((cache.cache_hit, cache.cache_miss), (1, 1))
+
     def test_add_delete_info(self):
         with self.admin_access.repo_cnx() as cnx:
             entity = self.repo.vreg['etypes'].etype_class('Personne')(cnx)
@@ -513,6 +631,87 @@ class FTITC(CubicWebTC):
             rset = cnx.execute('Any X WHERE X has_text %(t)s', {'t': 'hip'})
             self.assertEqual(rset.rows, [[cnx.user.eid]])
 
+    def test_bulk_index(self):
+        with self.admin_access.repo_cnx() as cnx:
+            people = [cnx.create_entity('Personne', nom=u'dupont%s' % i, prenom=u'jean')
+                      for i in range(5)]
+            cnx.commit()
+            rset = cnx.execute('Any X WHERE X has_text %(t)s', {'t': 'dupont3'})
+            self.assertEqual(rset.rows, [[people[3].eid]])
+            rset = cnx.execute('Any X WHERE X has_text %(t)s', {'t': 'jean'})
+            self.assertEqual(len(rset), 5)
+            for person in people:
+                person.cw_set(nom=u'durand%s' % person.eid)
+            cnx.commit()
+            rset = cnx.execute('Any X WHERE X has_text %(t)s', {'t': 'dupont3'})
+            self.assertEqual(rset.rows, [])
+            for person in people:
+                rset = cnx.execute('Any X WHERE X has_text %(t)s',
+                                   {'t': 'durand%s' % person.eid})
+                self.assertEqual(rset.rows, [[person.eid]])
+
+    def test_deferred_index(self):
+        source = self.repo.system_source
+        source.fti_deferred = True
+        try:
+            with self.admin_access.repo_cnx() as cnx:
+                person = cnx.create_entity('Personne', nom=u'dupont')
+                cnx.commit()
+                rset = cnx.execute('Any X WHERE X has_text %(t)s', {'t': 'dupont'})
+                self.assertEqual(rset.rows, [])
+                person.cw_set(nom=u'durand')
+                cnx.commit()
+                length, lag = source.fti_queue_stats(cnx)
+                self.assertEqual(length, 1)
+                self.assertGreaterEqual(lag, 0)
+                self.assertEqual(source.fti_index_queued(cnx), 1)
+                cnx.commit()
+                self.assertEqual(source.fti_queue_stats(cnx), (0, 0))
+                rset = cnx.execute('Any X WHERE X has_text %(t)s', {'t': 'durand'})
+                self.assertEqual(rset.rows, [[person.eid]])
+                # deleted entities are skipped
+                person.cw_set(nom=u'dupond')
+                cnx.commit()
+                person.cw_delete()
+                cnx.commit()
+                self.assertEqual(source.fti_index_queued(cnx), 1)
+                cnx.commit()
+                rset = cnx.execute('Any X WHERE X has_text %(t)s', {'t': 'durand'})
+                self.assertEqual(rset.rows, [])
+        finally:
+            source.fti_deferred = False
+
+    def test_bulk_index_query_shapes(self):
+        def fti_queries():
+            return [key for key in self.repo.querier.rql_cache._cache
+                    if 'X is Personne' in key[0] and 'X eid IN' in key[0]]
+        with self.admin_access.repo_cnx() as cnx:
+            for count in (2, 3, 7):
+                for i in range(count):
+                    cnx.create_entity('Personne', nom=u'dupont%s' % i)
+                cnx.commit()
+            self.assertEqual(len(fti_queries()), 1)
+            cnx.create_entity('Personne', nom=u'durand')
+            cnx.commit()
+            self.assertEqual(len(fti_queries()), 2)
+
+    def test_bulk_index_adapter(self):
+        class PersonneIFTIndexableAdapter(IFTIndexableAdapter):
+            __select__ = is_instance('Personne')
+
+            def fti_containers(self, _done=None):
+                # index the person's creator instead of the person
+                yield self.entity.created_by[0]
+
+        with self.temporary_appobjects(PersonneIFTIndexableAdapter):
+            with self.admin_access.repo_cnx() as cnx:
+                cnx.create_entity('Personne', nom=u'dupont')
+                cnx.commit()
+                rset = cnx.execute('Any X WHERE X has_text %(t)s', {'t': 'dupont'})
+                self.assertEqual(rset.rows, [])
+                rset = cnx.execute('Any X WHERE X has_text %(t)s', {'t': 'admin'})
+                self.assertEqual(rset.rows, [[cnx.user.eid]])
+
     def test_no_uncessary_ftiindex_op(self):
         with self.admin_access.repo_cnx() as cnx:
             cnx.create_entity('Workflow',
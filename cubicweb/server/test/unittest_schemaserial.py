@@ -17,6 +17,10 @@
 # with CubicWeb.  If not, see <http://www.gnu.org/licenses/>.
 """unit tests for schema rql (de)serialization"""
 
+import os.path as osp
+import shutil
+import tempfile
+
 from logilab.database import get_db_helper
 
 from yams import register_base_type, unregister_base_type
@@ -27,7 +31,8 @@ from cubicweb import devtools
 from cubicweb.devtools.testlib import BaseTestCase as TestCase, CubicWebTC
 from cubicweb.server.schemaserial import (updateeschema2rql, updaterschema2rql, rschema2rql,
                                           eschema2rql, rdef2rql, specialize2rql,
-                                          _erperms2rql as erperms2rql)
+                                          _erperms2rql as erperms2rql,
+                                          schema_snapshot_key, load_schema_snapshot)
 
 
 schema = config = None
@@ -444,6 +449,47 @@ class ComputedAttributeAndRelationTC(CubicWebTC):
                          schema['total_salary'].rdefs['Company', 'Int'].formula)
 
 
+class SchemaSnapshotTC(CubicWebTC):
+    appid = 'data-cwep002'
+
+    def setUp(self):
+        super(SchemaSnapshotTC, self).setUp()
+        self.snapshotdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.snapshotdir)
+        self.snapshot = osp.join(self.snapshotdir, '%s-schema.pickle' % self.config.appid)
+
+    def test_snapshot(self):
+        with self.admin_access.repo_cnx() as cnx:
+            key = schema_snapshot_key(cnx)
+        self.assertIsNotNone(key)
+        self.config.global_set_option('schema-snapshot-dir', self.snapshotdir)
+        try:
+            schema = self.repo.deserialize_schema()
+            self.assertTrue(osp.exists(self.snapshot))
+            snapshot_schema = load_schema_snapshot(self.snapshot, key)
+            self.assertIsNotNone(snapshot_schema)
+            self.assertIsNot(snapshot_schema, schema)
+            self.assertEqual(sorted(snapshot_schema.entities()), sorted(schema.entities()))
+            rdef = snapshot_schema['total_salary'].rdefs['Company', 'Int']
+            self.assertEqual(rdef.eid, schema['total_salary'].rdefs['Company', 'Int'].eid)
+            self.assertEqual('Any SUM(SA) GROUPBY X WHERE P works_for X, P salary SA',
+                             rdef.formula)
+            self.assertEqual(snapshot_schema['has_employee'].rule, 'O works_for S')
+            # a change of the schema outdates the snapshot
+            with self.admin_access.repo_cnx() as cnx:
+                cnx.execute('SET X update_permission G WHERE X name "Company", '
+                            'G name "guests"')
+                cnx.commit()
+                newkey = schema_snapshot_key(cnx)
+            self.assertNotEqual(newkey, key)
+            self.assertIsNone(load_schema_snapshot(self.snapshot, newkey))
+            schema = self.repo.deserialize_schema()
+            self.assertIn('guests', schema['Company'].permissions['update'])
+            self.assertIsNotNone(load_schema_snapshot(self.snapshot, newkey))
+        finally:
+            self.config.global_set_option('schema-snapshot-dir', None)
+
+
 if __name__ == '__main__':
     from unittest import main
     main()
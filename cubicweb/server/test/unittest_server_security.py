@@ -131,6 +131,56 @@ class SecurityTC(BaseSecurityTC):
             cnx.execute('INSERT CWGroup X: X name "staff"')
             cnx.commit()
 
+    def test_shared_plan_cache_rql_expression(self):
+        with self.admin_access.repo_cnx() as cnx:
+            user2 = self.create_user(cnx, u'user2')
+            user1 = cnx.find('CWUser', login=u'iaminusersgrouponly').one()
+            affaire1 = cnx.create_entity('Affaire', sujet=u'affaire1', owned_by=user1)
+            affaire2 = cnx.create_entity('Affaire', sujet=u'affaire2', owned_by=user2)
+            cnx.commit()
+        plan_cache = self.repo.querier.plan_cache
+        rql = 'Any X WHERE X is Affaire'
+
+        def cached_plans():
+            return [key for key in plan_cache._cache if key[0] == (rql,)]
+
+        with self.new_access(u'iaminusersgrouponly').repo_cnx() as cnx:
+            self.assertEqual(cnx.execute(rql).rows, [[affaire1.eid]])
+        self.assertEqual(len(cached_plans()), 1)
+        with self.new_access(u'user2').repo_cnx() as cnx:
+            # same groups, the compiled plan is reused but with the right
+            # user
+            self.assertEqual(cnx.execute(rql).rows, [[affaire2.eid]])
+        self.assertEqual(len(cached_plans()), 1)
+        with self.admin_access.repo_cnx() as cnx:
+            # different groups, another plan is compiled
+            self.assertEqual(len(cnx.execute(rql)), 3)
+        self.assertEqual(len(cached_plans()), 2)
+
+    def test_execute_iter_rql_expression(self):
+        with self.admin_access.repo_cnx() as cnx:
+            user1 = cnx.find('CWUser', login=u'iaminusersgrouponly').one()
+            affaire1 = cnx.create_entity('Affaire', sujet=u'affaire1', owned_by=user1)
+            cnx.create_entity('Affaire', sujet=u'affaire2')
+            cnx.commit()
+        with self.new_access(u'iaminusersgrouponly').repo_cnx() as cnx:
+            # security is inserted whether the plan is cached or not
+            for i in range(2):
+                rsets = list(cnx.execute_iter('Any X WHERE X is Affaire'))
+                self.assertEqual([rset.rows for rset in rsets], [[[affaire1.eid]]])
+
+    def test_shared_plan_cache_eid_dependant_security(self):
+        with self.admin_access.repo_cnx() as cnx:
+            user1 = cnx.find('CWUser', login=u'iaminusersgrouponly').one()
+            affaire1 = cnx.create_entity('Affaire', sujet=u'affaire1', owned_by=user1)
+            affaire2 = cnx.create_entity('Affaire', sujet=u'affaire2')
+            cnx.commit()
+        rql = 'Any S WHERE X eid %(x)s, X sujet S'
+        with self.new_access(u'iaminusersgrouponly').repo_cnx() as cnx:
+            self.assertEqual(cnx.execute(rql, {'x': affaire1.eid}).rows,
+                             [[u'affaire1']])
+            self.assertRaises(Unauthorized, cnx.execute, rql, {'x': affaire2.eid})
+
     def test_insert_security(self):
         with self.new_access(u'anon').repo_cnx() as cnx:
             cnx.execute("INSERT Personne X: X nom 'bidule'")
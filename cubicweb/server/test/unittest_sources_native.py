@@ -16,10 +16,21 @@
 # You should have received a copy of the GNU Lesser General Public License along
 # with CubicWeb.  If not, see <http://www.gnu.org/licenses/>.
 
+import tempfile
+import time
+import zipfile
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import TestCase
+
 from logilab.common import tempattr
 
+from cubicweb import Binary
 from cubicweb.devtools.testlib import CubicWebTC
-from cubicweb.server.sources.native import FTIndexEntityOp
+from cubicweb.server.sources.native import (FTIndexEntityOp,
+                                            PreallocatedEidGenerator,
+                                            DatabaseIndependentBackupRestore,
+                                            encode_chunk, decode_chunk)
 
 class NativeSourceTC(CubicWebTC):
 
@@ -33,6 +44,138 @@ class NativeSourceTC(CubicWebTC):
                 self.assertNotIn(cnx.user.eid, FTIndexEntityOp.get_instance(cnx).get_data())
 
 
+class FakeRepo(object):
+
+    def __init__(self):
+        self.tasks = []
+
+    def threaded_task(self, func):
+        self.tasks.append(func)
+
+
+class FakeSource(object):
+
+    def __init__(self):
+        self.repo = FakeRepo()
+
+
+class FakeEidGenerator(PreallocatedEidGenerator):
+    """generator reserving eids from a counter instead of the database"""
+
+    def __init__(self, source, range_size):
+        super(FakeEidGenerator, self).__init__(source, range_size)
+        self.seq = 0
+        self.reservations = []
+
+    def _create_eid(self, count):
+        self.seq += count
+        self.reservations.append(count)
+        return self.seq
+
+
+class PreallocatedEidGeneratorTC(TestCase):
+
+    def test_create_eid(self):
+        source = FakeSource()
+        gen = FakeEidGenerator(source, 4)
+        self.assertEqual([gen.create_eid(None) for i in range(3)], [1, 2, 3])
+        self.assertEqual(gen.reservations, [4])
+        # next range reservation has been scheduled
+        self.assertEqual(len(source.repo.tasks), 1)
+        source.repo.tasks.pop()()
+        self.assertEqual(gen.reservations, [4, 4])
+        self.assertEqual([gen.create_eid(None) for i in range(3)], [4, 5, 6])
+        self.assertEqual(gen.reservations, [4, 4])
+
+    def test_create_eid_no_reserved_range(self):
+        source = FakeSource()
+        gen = FakeEidGenerator(source, 4)
+        self.assertEqual([gen.create_eid(None) for i in range(5)], [1, 2, 3, 4, 5])
+        # the scheduled reservation didn't run, the range has been reserved
+        # synchronously and only one reservation is scheduled at a time
+        self.assertEqual(gen.reservations, [4, 4])
+        self.assertEqual(len(source.repo.tasks), 1)
+        # eids of ranges reserved in the meantime are not given twice
+        source.repo.tasks.pop()()
+        self.assertEqual([gen.create_eid(None) for i in range(4)], [6, 7, 8, 9])
+
+    def test_create_eid_range(self):
+        source = FakeSource()
+        gen = FakeEidGenerator(source, 4)
+        self.assertEqual(gen.create_eid(None), 1)
+        self.assertEqual(gen.create_eid(None, 10), 14)
+        self.assertEqual(gen.create_eid(None), 2)
+
+
+class ChunkEncodingTC(TestCase):
+
+    def test_roundtrip(self):
+        columns = ('eid', 'name', 'flag', 'created', 'day', 'delay',
+                   'amount', 'data', 'mixed', 'empty')
+        rows = [(1, u'\xe9t\xe9', True, datetime(2020, 1, 2, 3, 4, 5, 6),
+                 date(2020, 1, 2), timedelta(days=1, microseconds=3),
+                 Decimal('1.10'), Binary(b'\x00\n\xff'), 1, None),
+                (2, None, False, None, None, None, None, None, u'x', None)]
+        name, cols, types, decoded = decode_chunk(encode_chunk('t', columns, rows))
+        self.assertEqual(name, 't')
+        self.assertEqual(cols, columns)
+        self.assertEqual(types, ['int', 'str', 'bool', 'datetime', 'date',
+                                 'timedelta', 'decimal', 'bytes', 'pickle', None])
+        self.assertEqual(len(decoded), 2)
+        self.assertEqual(decoded[0][7].getvalue(), b'\x00\n\xff')
+        self.assertEqual(decoded[0][:7] + decoded[0][8:], rows[0][:7] + rows[0][8:])
+        self.assertEqual(decoded[1], rows[1])
+
+    def test_no_rows(self):
+        name, cols, types, rows = decode_chunk(encode_chunk('t', ('a', 'b'), []))
+        self.assertEqual((name, cols, types, rows), ('t', ('a', 'b'), [None, None], []))
+
+
+
+class FakeConnection(object):
+
+    def cursor(self):
+        return None
+
+    def close(self):
+        pass
+
+
+class OrderedRestore(DatabaseIndependentBackupRestore):
+    """record the order in which tables are restored"""
+
+    def __init__(self, tables, workers):
+        self.tables = tables
+        self.workers = workers
+        self.dbhelper = type('dbhelper', (), {'backend_name': 'postgres'})
+        self.logger = type('logger', (), {'info': lambda *args: None})
+        self.restored = []
+
+    def get_connection(self):
+        return FakeConnection()
+
+    def read_metadata(self, archive, backupfile):
+        return [], [], self.tables, dict((table, []) for table in self.tables)
+
+    def read_table(self, archive, table, filenames, cnx=None):
+        if table in self.referenced_tables:
+            # give other tables a chance to be restored meanwhile
+            time.sleep(0.05)
+        self.restored.append(table)
+
+
+class DatabaseIndependentRestoreTC(TestCase):
+
+    def test_referenced_tables_first(self):
+        tables = ['entities', 'transactions', 'tx_entity_actions',
+                  'cw_CWUser', 'in_group_relation']
+        helper = OrderedRestore(tables, workers=4)
+        with tempfile.NamedTemporaryFile(suffix='.zip') as backupfile:
+            zipfile.ZipFile(backupfile.name, 'w').close()
+            helper.restore(backupfile.name)
+        self.assertEqual(set(helper.restored[:2]), set(['entities', 'transactions']))
+        self.assertEqual(set(helper.restored[2:]), set(tables[2:]))
+
 if __name__ == '__main__':
     from logilab.common.testlib import unittest_main
     unittest_main()
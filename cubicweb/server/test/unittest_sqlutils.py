@@ -47,6 +47,30 @@ class SQLAdapterMixInTC(TestCase):
         o = SQLAdapterMixIn(config)
         self.assertEqual(o.dbhelper.dbencoding, 'ISO-8859-1')
 
+    def test_iter_process_result(self):
+        config = BASE_CONFIG.copy()
+        config['db-fetch-size'] = 2
+        o = SQLAdapterMixIn(config)
+        dbapi_module = o.dbhelper.dbapi_module
+
+        class FakeCursor(object):
+            description = [('a', dbapi_module.NUMBER), ('b', dbapi_module.BOOLEAN),
+                           ('c', dbapi_module.STRING)]
+            arraysize = 1
+            rows = [(1, 0, 'x'), (2, 1, None), (3, None, 'y')]
+
+            def fetchmany(self):
+                rows = self.rows[:self.arraysize]
+                del self.rows[:self.arraysize]
+                return rows
+
+        cursor = FakeCursor()
+        cbs = {2: [lambda o, cnx, v: v.upper(), lambda o, cnx, v: (cnx, v)]}
+        self.assertEqual(list(o.iter_process_result(cursor, 'cnx', cbs)),
+                         [[1, False, ('cnx', 'X')], [2, True, None], [3, None, ('cnx', 'Y')]])
+        self.assertEqual(cursor.arraysize, 2)
+
+
 
 class SQLUtilsTC(CubicWebTC):
 
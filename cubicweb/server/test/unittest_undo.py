@@ -17,11 +17,15 @@
 # You should have received a copy of the GNU Lesser General Public License along
 # with CubicWeb.  If not, see <http://www.gnu.org/licenses/>.
 
+import pickle
+import unittest
+
 from cubicweb import ValidationError
 from cubicweb.devtools.testlib import CubicWebTC
 from cubicweb.server.session import Connection
 
-from cubicweb.server.sources.native import UndoTransactionException, _UndoException
+from cubicweb.server.sources.native import (UndoTransactionException, _UndoException,
+                                            encode_changes, decode_changes)
 
 from cubicweb.transaction import NoSuchTransaction
 
@@ -452,6 +456,50 @@ class UndoableTransactionTC(CubicWebTC):
             self.assertUndoTransaction(cnx, txuuid, [
                 u"can't restore state of entity %s, it has been deleted inbetween" % p.eid])
 
+    def test_undo_multiple_deletion(self):
+        with self.admin_access.client_cnx() as cnx:
+            eids = [cnx.create_entity('Personne', nom=u'toto%s' % i, prenom=u'p').eid
+                    for i in range(3)]
+            cnx.commit()
+            cnx.execute('DELETE Personne P WHERE P prenom "p"')
+            txuuid = cnx.commit()
+            actions = cnx.transaction_actions(txuuid)
+            self.assertEqual(sorted((a.action, a.eid) for a in actions),
+                             [('D', eid) for eid in eids])
+            self.assertEqual(sorted(a.changes['cw_nom'] for a in actions),
+                             [u'toto0', u'toto1', u'toto2'])
+            self.assertUndoTransaction(cnx, txuuid)
+            cnx.commit()
+            rset = cnx.execute('Any N ORDERBY N WHERE P nom N, P prenom "p"')
+            self.assertEqual([n for n, in rset], [u'toto0', u'toto1', u'toto2'])
+
+    def test_actions_written_on_commit(self):
+        with self.admin_access.repo_cnx() as cnx:
+            p = cnx.create_entity('Personne', nom=u'toto')
+            txuuid = cnx.transaction_uuid(set=False)
+            cu = cnx.system_sql(
+                "SELECT * from tx_entity_actions WHERE tx_uuid='%s'" % txuuid)
+            self.assertFalse(cu.fetchall())
+            cnx.commit()
+            self.assertEqual([(a.action, a.eid) for a in cnx.transaction_actions(txuuid)],
+                             [('C', p.eid)])
+
+
+class ChangesEncodingTC(unittest.TestCase):
+
+    def test_roundtrip(self):
+        for changes in ({'cw_nom': u'toto'},
+                        {'cw_nom': u'toto' * 100, 'cw_data': b'\x00' * 100}):
+            self.assertEqual(decode_changes(encode_changes(changes)), changes)
+        self.assertLess(len(encode_changes({'cw_nom': u'toto' * 100})),
+                        len(pickle.dumps({'cw_nom': u'toto' * 100})))
+
+    def test_decode_pickle(self):
+        # changes recorded by previous versions of cubicweb
+        changes = {'cw_nom': u'toto'}
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            self.assertEqual(decode_changes(pickle.dumps(changes, protocol)), changes)
+
 
 class UndoExceptionInUnicode(CubicWebTC):
 
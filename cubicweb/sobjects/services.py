@@ -41,16 +41,34 @@ class StatsService(Service):
              querier.rql_cache.cache_hit, querier.rql_cache.cache_miss, 'rqlt_st'),
             (len(source._cache), repo.config['rql-cache-size'],
              source.cache_hit, source.cache_miss, 'sql'),
+            (len(querier.plan_cache), repo.config['rql-cache-size'],
+             querier.plan_cache.cache_hit, querier.plan_cache.cache_miss, 'plan'),
         ):
             results['%s_cache_size' % title] = {'size': size, 'maxsize': maxsize}
             results['%s_cache_hit' % title] = hits
             results['%s_cache_miss' % title] = misses
-            results['%s_cache_hit_percent' % title] = (hits * 100) / (hits + misses)
-        results['type_cache_size'] = len(repo._type_cache)
+            if hits + misses:
+                results['%s_cache_hit_percent' % title] = (hits * 100) / (hits + misses)
+            else:
+                results['%s_cache_hit_percent' % title] = 0
+        results['type_cache_size'] = {'size': len(repo._type_cache),
+                                      'maxsize': repo._type_cache.maxsize}
+        results['type_cache_hit'] = repo._type_cache.cache_hit
+        results['type_cache_miss'] = repo._type_cache.cache_miss
         results['sql_no_cache'] = repo.system_source.no_cache
         results['nb_active_threads'] = threading.activeCount()
         results['available_cnxsets'] = repo.cnxsets.qsize()
+        results['used_cnxsets'] = repo.cnxsets.in_use()
+        results['cnxsets_timeouts'] = repo.cnxsets.timeouts
         results['threads'] = [t.name for t in threading.enumerate()]
+        if source.fti_deferred:
+            length, lag = source.fti_queue_stats(self._cw)
+            results['fti_queue_length'] = length
+            results['fti_queue_lag'] = lag
+        if repo.mail_outbox is not None:
+            length, lag = repo.mail_outbox.stats()
+            results['mail_queue_length'] = length
+            results['mail_queue_lag'] = lag
         return results
 
 
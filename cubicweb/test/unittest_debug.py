@@ -0,0 +1,111 @@
+# copyright 2019 LOGILAB S.A. (Paris, FRANCE), all rights reserved.
+# contact http://www.logilab.fr/ -- mailto:contact@logilab.fr
+#
+# This file is part of CubicWeb.
+#
+# CubicWeb is free software: you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# CubicWeb is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License along
+# with CubicWeb.  If not, see <http://www.gnu.org/licenses/>.
+"""unit tests for module cubicweb.debug"""
+
+from unittest import TestCase
+
+from cubicweb.debug import (subscribe_to_debug_channel, unsubscribe_to_debug_channel,
+                            set_debug_channel_sampling, should_emit_to_debug_channel,
+                            DebugMessage)
+from cubicweb.devtools.testlib import CubicWebTC
+
+
+def build_message():
+    return DebugMessage(rql="Any X")
+
+
+class DebugChannelTC(TestCase):
+
+    def tearDown(self):
+        set_debug_channel_sampling("rql", 1)
+
+    def test_no_subscriber(self):
+        self.assertFalse(should_emit_to_debug_channel("rql"))
+
+    def test_sampling(self):
+        subscriber = lambda message: None  # noqa
+        subscribe_to_debug_channel("rql", subscriber)
+        try:
+            self.assertTrue(should_emit_to_debug_channel("rql"))
+            set_debug_channel_sampling("rql", 3)
+            emitted = [should_emit_to_debug_channel("rql") for _ in range(9)]
+            self.assertEqual(emitted, [True, False, False] * 3)
+        finally:
+            unsubscribe_to_debug_channel("rql", subscriber)
+
+    def test_bad_sampling(self):
+        with self.assertRaises(ValueError):
+            set_debug_channel_sampling("rql", 0)
+        with self.assertRaises(Exception):
+            set_debug_channel_sampling("unknown", 2)
+
+    def test_lazy_callstack(self):
+        message = build_message()
+        self.assertNotIn("callstack", message)
+        callstack = message["callstack"]
+        self.assertIn("test_lazy_callstack", callstack)
+        self.assertIn("message = build_message()", callstack)
+        # the frame building the message is not part of the stack
+        self.assertNotIn("build_message\n", callstack)
+        self.assertIs(message.get("callstack"), callstack)
+        with self.assertRaises(KeyError):
+            message["unknown"]
+
+
+class QuerierDebugChannelTC(CubicWebTC):
+
+    def test_rql_and_sql_messages(self):
+        rql_messages, sql_messages = [], []
+        subscribe_to_debug_channel("rql", rql_messages.append)
+        subscribe_to_debug_channel("sql", sql_messages.append)
+        try:
+            with self.admin_access.repo_cnx() as cnx:
+                cnx.execute("Any X WHERE X is CWUser")
+        finally:
+            unsubscribe_to_debug_channel("rql", rql_messages.append)
+            unsubscribe_to_debug_channel("sql", sql_messages.append)
+        rql_message = rql_messages[-1]
+        self.assertEqual(rql_message["rql"], "Any X WHERE X is CWUser")
+        self.assertIn("test_rql_and_sql_messages", rql_message["callstack"])
+        token = rql_message["rql_query_tracing_token"]
+        self.assertIsNotNone(token)
+        self.assertIn(token, [msg["rql_query_tracing_token"] for msg in sql_messages])
+        self.assertIn("test_rql_and_sql_messages", sql_messages[-1]["callstack"])
+
+    def test_execute_iter_messages(self):
+        rql_messages, sql_messages = [], []
+        subscribe_to_debug_channel("rql", rql_messages.append)
+        subscribe_to_debug_channel("sql", sql_messages.append)
+        try:
+            with self.admin_access.repo_cnx() as cnx:
+                rsets = list(cnx.execute_iter("Any X WHERE X is CWGroup", chunk_size=2))
+        finally:
+            unsubscribe_to_debug_channel("rql", rql_messages.append)
+            unsubscribe_to_debug_channel("sql", sql_messages.append)
+        rql_message = rql_messages[-1]
+        self.assertEqual(rql_message["rql"], "Any X WHERE X is CWGroup")
+        self.assertEqual(rql_message["result"], "%s rows fetched by chunks of 2"
+                         % sum(len(rset) for rset in rsets))
+        token = rql_message["rql_query_tracing_token"]
+        self.assertIsNotNone(token)
+        self.assertIn(token, [msg["rql_query_tracing_token"] for msg in sql_messages])
+
+
+if __name__ == '__main__':
+    from unittest import main
+    main()
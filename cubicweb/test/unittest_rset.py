@@ -19,6 +19,7 @@
 """unit tests for module cubicweb.rset"""
 
 import pickle
+from unittest import mock
 from urllib.parse import urlsplit
 
 from rql import parse
@@ -680,6 +681,101 @@ class ResultSetTC(CubicWebTC):
                          [[12000, 'adim', u'Jardiner facile'],
                          [14000, 'nico', u'La tarte tatin en 15 minutes']])
 
+    def _create_prefetch_data(self, cnx):
+        usine = cnx.create_entity('Usine', lieu=u'paris')
+        produits = [cnx.create_entity('Produit', fabrique_par=usine)
+                    for i in range(3)]
+        societe = cnx.create_entity('Societe', nom=u'logilab', fournit=produits)
+        for i in range(5):
+            cnx.create_entity('Personne', nom=u'p%s' % i, prenom=u'pp%s' % i,
+                              travaille=societe if i % 2 else None)
+        cnx.commit()
+
+    def test_prefetch_attributes(self):
+        with self.admin_access.client_cnx() as cnx:
+            self._create_prefetch_data(cnx)
+            cnx.drop_entity_cache()
+            rset = cnx.execute('Any X WHERE X is IN (Personne, Societe, Produit)')
+            with mock.patch.object(cnx, 'execute', wraps=cnx.execute) as execute:
+                rset.prefetch(attributes=('nom',))
+                # one query per entity type having the attribute
+                self.assertEqual(execute.call_count, 2)
+                for entity in rset.entities():
+                    if entity.cw_etype == 'Personne':
+                        self.assertTrue(entity.nom.startswith('p'))
+                        self.assertNotIn('prenom', entity.cw_attr_cache)
+                        self.assertFalse(entity._cw_completed)
+                    elif entity.cw_etype == 'Societe':
+                        self.assertEqual(entity.nom, u'logilab')
+                    else:
+                        self.assertNotIn('nom', entity.cw_attr_cache)
+                self.assertEqual(execute.call_count, 2)
+
+    def test_prefetch_complete(self):
+        with self.admin_access.client_cnx() as cnx:
+            self._create_prefetch_data(cnx)
+            cnx.drop_entity_cache()
+            rset = cnx.execute('Any X WHERE X is Produit')
+            with mock.patch.object(cnx, 'execute', wraps=cnx.execute) as execute:
+                rset.prefetch()
+                self.assertEqual(execute.call_count, 1)
+                for entity in rset.entities():
+                    self.assertTrue(entity._cw_completed)
+                    self.assertIn('modification_date', entity.cw_attr_cache)
+                    usine, = entity.fabrique_par
+                    self.assertEqual(usine.cw_etype, 'Usine')
+                    entity.complete()
+                self.assertEqual(execute.call_count, 1)
+
+    def test_prefetch_complete_deleted(self):
+        with self.admin_access.client_cnx() as cnx:
+            self._create_prefetch_data(cnx)
+            cnx.drop_entity_cache()
+            rset = cnx.execute('Any X ORDERBY X WHERE X is Produit')
+            deleted = rset.get_entity(0, 0)
+            cnx.execute('DELETE Produit X WHERE X eid %(x)s', {'x': deleted.eid})
+            rset.prefetch()
+            # entity whose row wasn't returned isn't marked as completed
+            self.assertFalse(deleted._cw_completed)
+            self.assertNotIn('modification_date', deleted.cw_attr_cache)
+            for entity in list(rset.entities())[1:]:
+                self.assertTrue(entity._cw_completed)
+                self.assertIn('modification_date', entity.cw_attr_cache)
+
+    def test_prefetch_relations(self):
+        with self.admin_access.client_cnx() as cnx:
+            self._create_prefetch_data(cnx)
+            cnx.drop_entity_cache()
+            rset = cnx.execute('Any X,N ORDERBY N WHERE X is Personne, X nom N')
+            with mock.patch.object(cnx, 'execute', wraps=cnx.execute) as execute:
+                rset.prefetch(attributes=(), relations=[('travaille', 'subject')])
+                self.assertEqual(execute.call_count, 1)
+                related = [entity.related('travaille', entities=True)
+                           for entity in rset.entities()]
+                self.assertEqual(execute.call_count, 1)
+            self.assertEqual([len(entities) for entities in related], [0, 1, 0, 1, 0])
+            self.assertEqual(related[1][0].nom, u'logilab')
+            # cached rset is the one that Entity.related would have returned
+            entity = rset.get_entity(1, 0)
+            cached_rset = entity.related('travaille')
+            entity.cw_clear_relation_cache('travaille', 'subject')
+            rset = entity.related('travaille')
+            self.assertEqual(cached_rset.rql, rset.rql)
+            self.assertEqual(cached_rset.args, rset.args)
+            self.assertEqual(cached_rset.rows, rset.rows)
+            self.assertEqual(cached_rset.description, rset.description)
+
+    def test_complete_siblings(self):
+        with self.admin_access.client_cnx() as cnx:
+            self._create_prefetch_data(cnx)
+            cnx.drop_entity_cache()
+            rset = cnx.execute('Any X WHERE X is Personne')
+            with mock.patch.object(cnx, 'execute', wraps=cnx.execute) as execute:
+                for entity in rset.entities():
+                    entity.complete(siblings=True)
+                    self.assertTrue(entity._cw_completed)
+                self.assertEqual(execute.call_count, 1)
+
     def test_nonregr_symmetric_relation(self):
         # see https://www.cubicweb.org/ticket/4739253
         with self.admin_access.client_cnx() as cnx:
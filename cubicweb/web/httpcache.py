@@ -15,12 +15,22 @@
 #
 # You should have received a copy of the GNU Lesser General Public License along
 # with CubicWeb.  If not, see <http://www.gnu.org/licenses/>.
-"""HTTP cache managers"""
+"""HTTP cache managers and server-side render cache"""
 
 
 
+import os
+import os.path as osp
+import pickle
 from calendar import timegm
-from datetime import datetime
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timezone
+from hashlib import sha1
+from logging import getLogger
+from threading import Lock
+
+from logilab.common.decorators import cached
+from logilab.common.logging_ext import set_log_methods
 
 class NoHTTPCacheManager(object):
     """default cache manager: set no-cache cache control policy"""
@@ -54,6 +64,9 @@ class EtagHTTPCacheManager(NoHTTPCacheManager):
     def etag(self):
         if not self.req.cnx: # session without established connection to the repo
             return self.view.__regid__
+        etag = self.view.render_cache_etag()
+        if etag is not None:
+            return etag
         return self.view.__regid__ + '/' + ','.join(sorted(self.req.user.groups))
 
     def max_age(self):
@@ -92,6 +105,9 @@ class EntityHTTPCacheManager(EtagHTTPCacheManager):
     def etag(self):
         if self.cw_rset is None or len(self.cw_rset) == 0: # entity startup view for instance
             return super(EntityHTTPCacheManager, self).etag()
+        etag = self.view.render_cache_etag()
+        if etag is not None:
+            return etag
         if len(self.cw_rset) > 1:
             raise NoEtag()
         etag = super(EntityHTTPCacheManager, self).etag()
@@ -105,7 +121,233 @@ class NoEtag(Exception):
     """an etag can't be generated"""
 
 __all__ = ('NoHTTPCacheManager', 'MaxAgeHTTPCacheManager',
-           'EtagHTTPCacheManager', 'EntityHTTPCacheManager')
+           'EtagHTTPCacheManager', 'EntityHTTPCacheManager', 'RenderCache')
+
+
+### Server-side render cache ################################################
+
+#: an entry of the render cache: rendered `content`, its `etag` validator,
+#: its last modification GMT time `mtime` and the `eids` it depends on
+RenderCacheEntry = namedtuple('RenderCacheEntry', 'content etag mtime eids')
+
+
+class RenderCache(object):
+    """Cache of rendered views, holding at most `maxsize` entries in memory.
+
+    When `spooldir` is specified, the least recently used entries are pickled
+    in this directory instead of being dropped, up to `spoolsize` of them, and
+    are moved back in memory when they are used again.
+
+    Entries are indexed by the eids they depend on, so that they may be
+    invalidated when one of them is modified. Each invalidation increments the
+    generation of those eids (see :meth:`generation`).
+
+    The cache and generations are local to the process: only changes committed
+    by this process invalidate entries, changes committed by other ones (other
+    instances or worker processes, a separate scheduler, `cubicweb-ctl shell`)
+    are only noticed through modification dates of entities, which aren't
+    updated when relations are added or deleted.
+    """
+
+    def __init__(self, maxsize, spooldir=None, spoolsize=None):
+        self.maxsize = maxsize
+        self.spooldir = spooldir
+        if spoolsize is None:
+            spoolsize = maxsize * 10
+        self.spoolsize = spoolsize
+        self._data = OrderedDict()
+        # key -> (filename, eids) of spooled entries
+        self._spooled = OrderedDict()
+        self._keys_by_eid = {}
+        # invalidation generation of eids, cleared when it holds more than
+        # `_maxgenerations` eids, in which case `_epoch` is incremented
+        self._generations = {}
+        self._maxgenerations = (maxsize + spoolsize) * 10
+        self._epoch = 0
+        self._lock = Lock()
+        # some cache usage stats
+        self.cache_hit, self.cache_miss = 0, 0
+        if spooldir is not None and not osp.isdir(spooldir):
+            os.makedirs(spooldir)
+
+    def __len__(self):
+        return len(self._data) + len(self._spooled)
+
+    def __contains__(self, key):
+        return key in self._data or key in self._spooled
+
+    def get(self, key):
+        """return the entry cached for `key`, None if there is no such entry"""
+        with self._lock:
+            try:
+                entry = self._data[key]
+            except KeyError:
+                entry = self._unspool(key)
+                if entry is None:
+                    self.cache_miss += 1
+                    return None
+                self._data[key] = entry
+                self._make_room()
+            self._data.move_to_end(key)
+            self.cache_hit += 1
+            return entry
+
+    def generation(self, eids):
+        """return the invalidation generation of entities of `eids`, which
+        changes each time entries depending on one of them are invalidated
+        """
+        with self._lock:
+            return self._generation(eids)
+
+    def set(self, key, entry, generation=None):
+        """cache `entry` for `key`, unless `generation` is specified and some
+        of the entry's eids have been invalidated since it was computed
+        """
+        with self._lock:
+            if generation is not None \
+               and generation != self._generation(entry.eids):
+                return
+            self._remove(key)
+            self._data[key] = entry
+            for eid in entry.eids:
+                self._keys_by_eid.setdefault(eid, set()).add(key)
+            self._make_room()
+
+    def invalidate(self, eids):
+        """drop entries depending on some entity of `eids`"""
+        with self._lock:
+            generations = self._generations
+            for eid in eids:
+                generations[eid] = generations.get(eid, 0) + 1
+                for key in self._keys_by_eid.pop(eid, ()):
+                    self._remove(key)
+            if len(generations) > self._maxgenerations:
+                generations.clear()
+                self._epoch += 1
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._spooled):
+                self._remove(key)
+            self._data.clear()
+            self._keys_by_eid.clear()
+
+    def _make_room(self):
+        while len(self._data) > self.maxsize:
+            key, entry = self._data.popitem(last=False)
+            if self.spooldir is None or not self.spoolsize:
+                self._unindex(key, entry.eids)
+                continue
+            filename = osp.join(self.spooldir, sha1(repr(key).encode('utf-8')).hexdigest())
+            try:
+                with open(filename, 'wb') as stream:
+                    pickle.dump((key, entry), stream, pickle.HIGHEST_PROTOCOL)
+            except Exception:
+                self.exception('unable to spool rendered view in %s', filename)
+                self._unindex(key, entry.eids)
+                continue
+            self._spooled[key] = (filename, entry.eids)
+            while len(self._spooled) > self.spoolsize:
+                key, (filename, eids) = self._spooled.popitem(last=False)
+                self._unindex(key, eids)
+                self._unlink(filename)
+
+    def _unspool(self, key):
+        try:
+            filename, eids = self._spooled.pop(key)
+        except KeyError:
+            return None
+        try:
+            with open(filename, 'rb') as stream:
+                spooledkey, entry = pickle.load(stream)
+        except Exception:
+            self.exception('unable to read rendered view spooled in %s', filename)
+            spooledkey = entry = None
+        self._unlink(filename)
+        if spooledkey != key:
+            self._unindex(key, eids)
+            return None
+        return entry
+
+    def _generation(self, eids):
+        return (self._epoch,) + tuple(self._generations.get(eid, 0)
+                                      for eid in sorted(eids))
+
+    def _remove(self, key):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self._unindex(key, entry.eids)
+        else:
+            try:
+                filename, eids = self._spooled.pop(key)
+            except KeyError:
+                return
+            self._unindex(key, eids)
+            self._unlink(filename)
+
+    def _unindex(self, key, eids):
+        for eid in eids:
+            keys = self._keys_by_eid.get(eid)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_eid[eid]
+
+    def _unlink(self, filename):
+        try:
+            os.unlink(filename)
+        except OSError:
+            pass
+
+set_log_methods(RenderCache, getLogger('cubicweb.web.rendercache'))
+
+
+_RENDER_CACHE_LOCK = Lock()
+
+def get_render_cache(vreg):
+    """return the render cache of the given registry store, None if the
+    `render-cache-size` option is not set
+    """
+    try:
+        return vreg._render_cache
+    except AttributeError:
+        pass
+    with _RENDER_CACHE_LOCK:
+        if not hasattr(vreg, '_render_cache'):
+            config = vreg.config
+            maxsize = config.get('render-cache-size')
+            if maxsize:
+                rcache = RenderCache(maxsize, config.get('render-cache-dir'))
+            else:
+                rcache = None
+            vreg._render_cache = rcache
+        return vreg._render_cache
+
+
+def _gmt(mdate):
+    """return naive GMT date/time from `mdate`"""
+    if mdate.tzinfo is not None:
+        mdate = mdate.astimezone(timezone.utc).replace(tzinfo=None)
+    return mdate
+
+
+def _hashable_items(dictionary):
+    """return a sorted tuple of items of `dictionary` to be used in render
+    cache keys, or raise TypeError if some value isn't a string, a number or
+    a list of them
+    """
+    items = []
+    for key, value in dictionary.items():
+        if isinstance(value, (list, tuple)):
+            value = tuple(value)
+            values = value
+        else:
+            values = (value,)
+        for val in values:
+            if val is not None and not isinstance(val, (str, int, float)):
+                raise TypeError(val)
+        items.append((key, value))
+    return tuple(sorted(items))
 
 # monkey patching, so view doesn't depends on this module and we have all
 # http cache related logic here
@@ -117,6 +359,133 @@ def set_http_cache_headers(self):
 viewmod.View.set_http_cache_headers = set_http_cache_headers
 
 
+@cached
+def render_cache_modification_dates(self):
+    """return a tuple of (eid, GMT modification date) of entities of the view's
+    result set, sorted by eid
+    """
+    rset = self.cw_rset
+    if rset is None or not rset.rowcount:
+        return ()
+    eids_by_etype = {}
+    for row, descr in zip(rset.rows, rset.description):
+        for value, etype in zip(row, descr):
+            if value is not None and etype is not None \
+               and not self._cw.vreg.schema.eschema(etype).final:
+                eids_by_etype.setdefault(etype, set()).add(value)
+    mdates = []
+    for etype, etype_eids in eids_by_etype.items():
+        etype_eids = sorted(etype_eids)
+        for i in range(0, len(etype_eids), 1000):
+            batch = etype_eids[i:i + 1000]
+            # pad eids to the next power of 10 so that only a few distinct
+            # queries end up in the RQL cache
+            size = 1
+            while size < len(batch):
+                size *= 10
+            batch += batch[-1:] * (size - len(batch))
+            args = dict(('x%s' % j, eid) for j, eid in enumerate(batch))
+            mdates += self._cw.execute(
+                'Any X,D WHERE X is %s, X modification_date D, X eid IN (%s)'
+                % (etype, ', '.join('%%(x%s)s' % j for j in range(size))), args)
+    return tuple(sorted((eid, _gmt(mdate)) for eid, mdate in mdates))
+viewmod.View.render_cache_modification_dates = render_cache_modification_dates
+
+
+def render_cache_key(self, **context):
+    """return the key of the view in the render cache given the rendering
+    `context`, or None if it should not be cached.
+
+    The key is built from the view identifier, the result set, the user's
+    groups, the language, the form parameters, the rendering context and the
+    modification dates of entities of the result set. Override this method to
+    take other parameters into account.
+    """
+    if not self.render_cacheable or get_render_cache(self._cw.vreg) is None:
+        return None
+    req = self._cw
+    rset = self.cw_rset
+    try:
+        context = _hashable_items(context)
+        form = _hashable_items(req.form)
+    except TypeError:
+        return None
+    if rset is not None:
+        rset = (rset.rql, tuple(tuple(row) for row in rset.rows))
+    return (self.__regid__, self.__class__.__module__, self.__class__.__name__,
+            rset,
+            tuple(sorted(req.user.groups)), req.lang, form, context,
+            self.render_cache_modification_dates())
+viewmod.View.render_cache_key = render_cache_key
+
+
+def render_cache_entry(self, **context):
+    """return the entry of the view in the render cache given the rendering
+    `context`, or None if it isn't cached
+    """
+    key = self.render_cache_key(**context)
+    if key is None:
+        return None
+    return get_render_cache(self._cw.vreg).get(key)
+viewmod.View.render_cache_entry = render_cache_entry
+
+
+def _render_cache_etag(key, generation):
+    return sha1(repr((key, generation)).encode('utf-8')).hexdigest()
+
+
+def render_cache_etag(self, **context):
+    """return the etag of the view in the render cache given the rendering
+    `context`, or None if it should not be cached.
+
+    The etag is derived from the render cache key and the invalidation
+    generation of entities of the result set, so that it's known before the
+    view is rendered.
+    """
+    key = self.render_cache_key(**context)
+    if key is None:
+        return None
+    eids = [eid for eid, mdate in self.render_cache_modification_dates()]
+    generation = get_render_cache(self._cw.vreg).generation(eids)
+    return _render_cache_etag(key, generation)
+viewmod.View.render_cache_etag = render_cache_etag
+
+
+_uncached_render = viewmod.View.render
+
+def render(self, w=None, **context):
+    req = self._cw
+    # views rendered by a view being cached are part of its cached content
+    if getattr(req, '_render_cache_rendering', False):
+        key = None
+    else:
+        key = self.render_cache_key(**context)
+    if key is None:
+        return _uncached_render(self, w, **context)
+    rcache = get_render_cache(req.vreg)
+    entry = rcache.get(key)
+    if entry is None:
+        mdates = self.render_cache_modification_dates()
+        eids = frozenset(eid for eid, mdate in mdates)
+        generation = rcache.generation(eids)
+        req._render_cache_rendering = True
+        try:
+            content = _uncached_render(self, **context)
+        finally:
+            req._render_cache_rendering = False
+        if mdates:
+            mtime = max(mdate for eid, mdate in mdates)
+        else:
+            mtime = datetime.utcnow()
+        entry = RenderCacheEntry(content, _render_cache_etag(key, generation),
+                                 mtime, eids)
+        rcache.set(key, entry, generation)
+    if w is None:
+        return entry.content
+    w(entry.content)
+viewmod.View.render = render
+
+
 def last_modified(self):
     """return the date/time where this view should be considered as
     modified. Take care of possible related objects modifications.
@@ -124,6 +493,13 @@ def last_modified(self):
     /!\\ must return GMT time /!\\
     """
     # XXX check view module's file modification time in dev mod ?
+    entry = self.render_cache_entry()
+    if entry is not None:
+        return entry.mtime
+    if self.render_cacheable:
+        mdates = self.render_cache_modification_dates()
+        if mdates:
+            return max(mdate for eid, mdate in mdates)
     ctime = datetime.utcnow()
     if self.cache_max_age:
         mtime = self._cw.header_if_modified_since()
@@ -140,6 +516,11 @@ viewmod.View.last_modified = last_modified
 viewmod.View.http_cache_manager = NoHTTPCacheManager
 # max-age=0 to actually force revalidation when needed
 viewmod.View.cache_max_age = 0
+# set to True on views whose rendering may be cached server-side, see
+# `render_cache_key`. Their rendering should only depend on the key's elements
+# and should not have side effects on the request (e.g. adding javascript or
+# css to html headers)
+viewmod.View.render_cacheable = False
 
 viewmod.StartupView.http_cache_manager = MaxAgeHTTPCacheManager
 viewmod.StartupView.cache_max_age = 60*60*2 # stay in http cache for 2 hours by default
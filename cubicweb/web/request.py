@@ -898,6 +898,11 @@ class ConnectionCubicWebRequestBase(_CubicWebRequestBase):
         rset.req = self
         return rset
 
+    def execute_iter(self, *args, **kwargs):
+        for rset in self.cnx.execute_iter(*args, **kwargs):
+            rset.req = self
+            yield rset
+
     entity_metas = _cnx_func('entity_metas')  # XXX deprecated
     entity_type = _cnx_func('entity_type')
     source_defs = _cnx_func('source_defs')
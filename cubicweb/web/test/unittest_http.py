@@ -17,11 +17,18 @@
 # with CubicWeb.  If not, see <http://www.gnu.org/licenses/>.
 
 import contextlib
+import os
+import tempfile
+import shutil
+from datetime import datetime
 
 from logilab.common.testlib import TestCase, unittest_main, tag, Tags
+from logilab.common import tempattr
 
 from cubicweb.devtools.fake import FakeRequest
 from cubicweb.devtools.testlib import CubicWebTC
+from cubicweb.web.httpcache import (RenderCache, RenderCacheEntry,
+                                     EntityHTTPCacheManager)
 
 
 def _test_cache(hin, hout, method='GET'):
@@ -419,5 +426,133 @@ class PreflightAccessHeadersTC(_BaseAccessHeadersTC):
                                  req.get_response_header(exposeheaders))
 
 
+def _entry(content, eids=()):
+    return RenderCacheEntry(content, content, datetime(2020, 1, 1), frozenset(eids))
+
+
+class RenderCacheTC(TestCase):
+
+    def test_lru(self):
+        rcache = RenderCache(2)
+        rcache.set('a', _entry(u'A', (1,)))
+        rcache.set('b', _entry(u'B', (2,)))
+        self.assertEqual(rcache.get('a').content, u'A')
+        rcache.set('c', _entry(u'C', (1, 3)))
+        self.assertIsNone(rcache.get('b'))
+        self.assertEqual(len(rcache), 2)
+        self.assertEqual((rcache.cache_hit, rcache.cache_miss), (1, 1))
+
+    def test_invalidate(self):
+        rcache = RenderCache(10)
+        rcache.set('a', _entry(u'A', (1,)))
+        rcache.set('b', _entry(u'B', (1, 2)))
+        rcache.set('c', _entry(u'C', (3,)))
+        rcache.invalidate([1])
+        self.assertNotIn('a', rcache)
+        self.assertNotIn('b', rcache)
+        self.assertIn('c', rcache)
+
+    def test_generation(self):
+        rcache = RenderCache(10)
+        generation = rcache.generation([1, 2])
+        self.assertEqual(rcache.generation([2, 1]), generation)
+        rcache.invalidate([3])
+        self.assertEqual(rcache.generation([1, 2]), generation)
+        rcache.invalidate([1])
+        self.assertNotEqual(rcache.generation([1, 2]), generation)
+        # entry computed before the invalidation isn't cached
+        rcache.set('a', _entry(u'A', (1, 2)), generation)
+        self.assertNotIn('a', rcache)
+
+    def test_spool(self):
+        spooldir = tempfile.mkdtemp()
+        try:
+            rcache = RenderCache(1, spooldir, spoolsize=1)
+            rcache.set('a', _entry(u'A', (1,)))
+            rcache.set('b', _entry(u'B', (2,)))
+            self.assertEqual(len(os.listdir(spooldir)), 1)
+            # read back from disk, spooling 'b'
+            self.assertEqual(rcache.get('a').content, u'A')
+            self.assertEqual(len(rcache), 2)
+            rcache.invalidate([2])
+            self.assertEqual(os.listdir(spooldir), [])
+            # too many spooled entries
+            rcache.set('c', _entry(u'C', (3,)))
+            rcache.set('d', _entry(u'D', (4,)))
+            self.assertNotIn('a', rcache)
+            self.assertEqual(len(os.listdir(spooldir)), 1)
+        finally:
+            shutil.rmtree(spooldir)
+
+
+class RenderCacheViewTC(CubicWebTC):
+
+    def setUp(self):
+        super(RenderCacheViewTC, self).setUp()
+        self.config.global_set_option('render-cache-size', 10)
+
+    def tearDown(self):
+        self.vreg.__dict__.pop('_render_cache', None)
+        self.config.global_set_option('render-cache-size', 0)
+        super(RenderCacheViewTC, self).tearDown()
+
+    def test_render_and_invalidate(self):
+        with self.admin_access.repo_cnx() as cnx:
+            eid = cnx.create_entity('CWGroup', name=u'cached').eid
+            cnx.commit()
+        viewcls = self.vreg['views']['text'][0]
+        with tempattr(viewcls, 'render_cacheable', True):
+            with self.admin_access.web_request() as req:
+                rset = req.execute('Any X WHERE X eid %(x)s', {'x': eid})
+                self.assertEqual(req.view('text', rset), u'cached')
+                rcache = self.vreg._render_cache
+                self.assertEqual(len(rcache), 1)
+                self.assertEqual(req.view('text', rset), u'cached')
+                self.assertEqual(rcache.cache_hit, 1)
+            with self.admin_access.repo_cnx() as cnx:
+                cnx.execute('SET X name "changed" WHERE X eid %(x)s', {'x': eid})
+                cnx.commit()
+            self.assertEqual(len(rcache), 0)
+            with self.admin_access.web_request() as req:
+                rset = req.execute('Any X WHERE X eid %(x)s', {'x': eid})
+                self.assertEqual(req.view('text', rset), u'changed')
+
+    def test_modification_dates_query_shapes(self):
+        with self.admin_access.repo_cnx() as cnx:
+            eids = [cnx.create_entity('CWGroup', name=u'cached%s' % i).eid
+                    for i in range(3)]
+            cnx.commit()
+        viewcls = self.vreg['views']['text'][0]
+        with tempattr(viewcls, 'render_cacheable', True):
+            with self.admin_access.web_request() as req:
+                for i in range(3):
+                    rset = req.execute('Any X WHERE X eid IN (%s)'
+                                       % ','.join(str(eid) for eid in eids[:i + 1]))
+                    req.view('text', rset)
+        queries = [key for key in self.repo.querier.rql_cache._cache
+                   if 'X modification_date D' in key[0]]
+        self.assertEqual(len(queries), 2)
+
+    def test_not_modified(self):
+        with self.admin_access.repo_cnx() as cnx:
+            eid = cnx.create_entity('CWGroup', name=u'cached').eid
+            cnx.commit()
+        form = {'rql': 'Any X WHERE X eid %s' % eid, 'vid': 'text'}
+        viewcls = self.vreg['views']['text'][0]
+        with tempattr(viewcls, 'render_cacheable', True), \
+                tempattr(viewcls, 'http_cache_manager', EntityHTTPCacheManager):
+            with self.admin_access.web_request(**form) as req:
+                self.app_handle_request(req)
+                self.assertEqual(200, req.status_out)
+                etag = req.get_response_header('Etag', raw=True)
+            rcache = self.vreg._render_cache
+            # the client's cached page is still valid, the view isn't rendered
+            with self.admin_access.web_request(**form) as req:
+                req.set_request_header('If-None-Match', etag, raw=True)
+                self.app_handle_request(req)
+                self.assertEqual(304, req.status_out)
+            self.assertEqual(rcache.cache_hit, 1)
+
+
 if __name__ == '__main__':
     unittest_main()
@@ -91,8 +91,6 @@ class ProcessInformationView(StartupView):
         stats = self._cw.call_service('repo_stats')
         stats['threads'] = ', '.join(sorted(stats['threads']))
         for k in stats:
-            if k == 'type_cache_size':
-                continue
             if k.endswith('_cache_size'):
                 stats[k] = '%s / %s' % (stats[k]['size'], stats[k]['maxsize'])
         def format_stat(sname, sval):
@@ -214,6 +214,26 @@ have the python imaging library installed to use captcha)',
           'group': 'web', 'level': 3,
           }),
 
+        ('render-cache-size',
+         {'type': 'int',
+          'default': 0,
+          'help': 'maximum number of rendered views kept in memory by the '
+          'server-side render cache, the least recently used ones being dropped '
+          'first (or spooled on disk, see render-cache-dir). Only views whose '
+          '`render_cacheable` attribute is true are cached. 0 disables the '
+          'cache. The cache is local to the process and only invalidated by '
+          'changes committed by it, so it should only be enabled when no other '
+          'process modifies relations (it is disabled in pyramid workers when '
+          'there are several of them).',
+          'group': 'web', 'level': 3,
+          }),
+        ('render-cache-dir',
+         {'type': 'string',
+          'default': None,
+          'help': 'directory where rendered views dropped from memory by the '
+          'render cache are spooled. If not set, they are simply dropped.',
+          'group': 'web', 'level': 3,
+          }),
         ('concat-resources',
          {'type': 'yn',
           'default': False,
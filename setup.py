@@ -62,6 +62,7 @@ setup(
     packages=find_packages(),
     package_data=package_data,
     include_package_data=True,
+    python_requires='>=3.7',
     install_requires=[
         'logilab-common >= 1.5.2',
         'logilab-mtconverter >= 0.8.0',
@@ -97,7 +98,7 @@ setup(
         ],
         'pyramid': [
             'pyramid >= 1.5.0',
-            'waitress >= 0.8.9',
+            'waitress >= 1.4.0',
             'wsgicors >= 0.3',
             'pyramid_multiauth',
             'repoze.lru',